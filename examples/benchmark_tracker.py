@@ -0,0 +1,125 @@
+"""
+Throughput of core.tracker.ByteTracker vs the ultralytics BYTETracker on the same detections.
+
+Detections are computed once (YOLO predict, no tracking) and cached in a .npz file, then both
+trackers replay them, so only the tracking cost is measured.
+
+    python examples/benchmark_tracker.py video.mp4 --cache detections.npz
+    python examples/benchmark_tracker.py --cache detections.npz      # replay only
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from models.detection import FrameDetections
+from core.tracker import ByteTracker
+
+
+def extract_detections(video: str, max_frames: int, classes: list[int]) -> tuple[list[np.ndarray], tuple]:
+    """Run the detector once per frame. Returns one (N, 6) [x1, y1, x2, y2, conf, cls] array per frame."""
+    import cv2
+    from core.vehicle_detector import VehicleDetection
+
+    detector = VehicleDetection()
+    cap = cv2.VideoCapture(video)
+    frames, shape = [], None
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        shape = frame.shape[:2]
+        results_generator, _ = detector.detect(frame, classes)
+        data = np.empty((0, 6), dtype=np.float32)
+        for results in results_generator:
+            data = results.boxes.data.cpu().numpy().astype(np.float32)
+        frames.append(data)
+    cap.release()
+    return frames, shape
+
+
+def save_cache(path: str, frames: list[np.ndarray], shape: tuple):
+    lengths = np.array([len(f) for f in frames], dtype=np.int64)
+    data = np.concatenate(frames) if frames else np.empty((0, 6), dtype=np.float32)
+    np.savez(path, data=data, lengths=lengths, shape=np.array(shape))
+
+
+def load_cache(path: str) -> tuple[list[np.ndarray], tuple]:
+    cache = np.load(path)
+    offsets = np.concatenate([[0], np.cumsum(cache["lengths"])])
+    frames = [cache["data"][offsets[i]:offsets[i + 1]] for i in range(len(cache["lengths"]))]
+    return frames, tuple(cache["shape"].tolist())
+
+
+def bench_builtin(frames: list[np.ndarray], **params) -> tuple[float, int]:
+    tracker = ByteTracker(**params)
+    batches = [FrameDetections(f[:, :4], None, f[:, 5], f[:, 4]) for f in frames]
+    start = time.perf_counter()
+    for detections in batches:
+        tracker.update(detections)
+    return time.perf_counter() - start, tracker.next_id - 1
+
+
+def bench_ultralytics(frames: list[np.ndarray], shape: tuple, frame_rate: int = 30) -> tuple[float, int]:
+    from ultralytics.engine.results import Boxes
+    from ultralytics.trackers.byte_tracker import BYTETracker
+    from ultralytics.utils import IterableSimpleNamespace, yaml_load
+    from ultralytics.utils.checks import check_yaml
+
+    args = IterableSimpleNamespace(**yaml_load(check_yaml("bytetrack.yaml")))
+    tracker = BYTETracker(args, frame_rate=frame_rate)
+    batches = [Boxes(f, shape) for f in frames]
+    ids = set()
+    start = time.perf_counter()
+    for boxes in batches:
+        tracks = tracker.update(boxes)
+        if len(tracks):
+            ids.update(tracks[:, 4].astype(int).tolist())
+    return time.perf_counter() - start, len(ids)
+
+
+def report(name: str, elapsed: float, n_frames: int, n_ids: int):
+    fps = n_frames / elapsed if elapsed > 0 else float("inf")
+    print(f"{name:<25}: {fps:9.1f} fps ({elapsed * 1e3 / n_frames:.3f} ms/fotograma), {n_ids} IDs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de trackers sobre detecciones cacheadas")
+    parser.add_argument("video", nargs="?", help="Video del que extraer detecciones")
+    parser.add_argument("--cache", default="detections.npz", help="Archivo .npz de detecciones")
+    parser.add_argument("--max-frames", type=int, default=3000)
+    parser.add_argument("--track-buffer", type=int, default=30)
+    parser.add_argument("--match-iou", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.video:
+        frames, shape = extract_detections(args.video, args.max_frames, [1, 2, 3, 5, 7])
+        if frames:
+            save_cache(args.cache, frames, shape)
+    else:
+        frames, shape = load_cache(args.cache)
+
+    n_frames = len(frames)
+    if n_frames == 0:
+        print("No hay fotogramas que medir")
+        return 1
+    n_dets = sum(len(f) for f in frames)
+    print(f"{n_frames} fotogramas, {n_dets / n_frames:.1f} detecciones/fotograma")
+
+    elapsed, n_ids = bench_builtin(frames, track_buffer=args.track_buffer, match_iou=args.match_iou)
+    report("core.tracker.ByteTracker", elapsed, n_frames, n_ids)
+
+    try:
+        elapsed, n_ids = bench_ultralytics(frames, shape)
+        report("ultralytics BYTETracker", elapsed, n_frames, n_ids)
+    except ImportError as e:
+        print(f"ultralytics no disponible: {e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import logging as log
+from collections import deque
+
+
+class AdaptiveController:
+    # del nivel más barato al más caro
+    DEFAULT_LEVELS = [
+        ("yolo11n.pt", 480),
+        ("yolo11n.pt", 640),
+        ("yolo11s.pt", 640),
+        ("yolo11s.pt", 800),
+    ]
+
+    def __init__(self, source_fps: float = 30.0, levels: list = None, initial_level: int = None,
+                 min_level: int = 0, max_level: int = None, downscale_ratio: float = 0.95,
+                 upscale_ratio: float = 0.6, patience: int = 30, upscale_patience: int = 300,
+                 cooldown: int = 150, smoothing: float = 0.1, log_path: str = None, max_switches: int = 100):
+        """
+        Switch model variant / input size so processing keeps up with the source.
+
+        The per-frame latency is smoothed with an exponential moving average and compared
+        with the frame budget (1 / source_fps). The controller steps down one level after
+        `patience` consecutive frames above `downscale_ratio` * budget, and steps up one
+        level after `upscale_patience` consecutive frames below `upscale_ratio` * budget.
+        The gap between both ratios, the longer wait to step up and the `cooldown` frames
+        after each switch keep it from oscillating. Every switch is logged and, with
+        `log_path`, appended to a JSON lines file; only the last `max_switches` are kept
+        in memory (`switches`), `switch_count` counts all of them.
+
+        Args:
+            source_fps (float): Frame rate of the source (defines the frame budget).
+            levels (list): (model_name, imgsz) pairs from cheapest to most expensive.
+            initial_level (int): Starting level, default the highest allowed one.
+            min_level (int): Lowest level the controller may use.
+            max_level (int): Highest level the controller may use.
+            downscale_ratio (float): Budget fraction above which the load is too high.
+            upscale_ratio (float): Budget fraction below which there is spare capacity.
+            patience (int): Frames over the limit before stepping down.
+            upscale_patience (int): Frames under the limit before stepping up.
+            cooldown (int): Frames ignored after a switch (new model warm-up).
+            smoothing (float): EMA factor for the latency.
+            log_path (str): Optional JSON lines file with every switch.
+            max_switches (int): Recent switches kept in `switches`.
+        """
+        self.levels = [tuple(level) for level in (levels or self.DEFAULT_LEVELS)]
+        self.min_level = max(0, min_level)
+        self.max_level = len(self.levels) - 1 if max_level is None else min(max_level, len(self.levels) - 1)
+        if self.min_level > self.max_level:
+            raise ValueError("min_level no puede ser mayor que max_level")
+
+        self.budget = 1.0 / source_fps if source_fps and source_fps > 0 else 1.0 / 30
+        self.downscale_ratio = downscale_ratio
+        self.upscale_ratio = upscale_ratio
+        self.patience = patience
+        self.upscale_patience = upscale_patience
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.log_path = log_path
+        if log_path and os.path.dirname(log_path):
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+        level = self.max_level if initial_level is None else initial_level
+        self.level = min(max(level, self.min_level), self.max_level)
+        self.latency = None
+        self.frame_idx = 0
+        self.switches = deque(maxlen=max_switches)
+        self.switch_count = 0
+        self._over = 0
+        self._under = 0
+        self._cooldown_left = 0
+
+    @property
+    def current(self) -> tuple[str, int]:
+        """(model_name, imgsz) of the current level."""
+        return self.levels[self.level]
+
+    def update(self, latency: float) -> tuple[str, int] | None:
+        """
+        Feed the processing time of one frame.
+
+        Args:
+            latency (float): Seconds spent on the frame.
+
+        Returns:
+            tuple | None: New (model_name, imgsz) when the level changes, otherwise None.
+        """
+        self.frame_idx += 1
+        if self._cooldown_left > 0:
+            self._cooldown_left -= 1
+            return None
+
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+
+        load = self.latency / self.budget
+        self._over = self._over + 1 if load > self.downscale_ratio else 0
+        self._under = self._under + 1 if load < self.upscale_ratio else 0
+
+        if self._over >= self.patience and self.level > self.min_level:
+            return self._switch(self.level - 1, load)
+        if self._under >= self.upscale_patience and self.level < self.max_level:
+            return self._switch(self.level + 1, load)
+        return None
+
+    def _switch(self, new_level: int, load: float) -> tuple[str, int]:
+        previous = self.current
+        record = {
+            "time": time.time(),
+            "frame": self.frame_idx,
+            "from": {"model": previous[0], "imgsz": previous[1]},
+            "to": {"model": self.levels[new_level][0], "imgsz": self.levels[new_level][1]},
+            "latency_ms": round(self.latency * 1000, 2),
+            "budget_ms": round(self.budget * 1000, 2),
+            "load": round(load, 3),
+            "reason": "overload" if new_level < self.level else "spare_capacity",
+        }
+        self.level = new_level
+        self.switches.append(record)
+        self.switch_count += 1
+        self.latency = None
+        self._over = self._under = 0
+        self._cooldown_left = self.cooldown
+
+        log.info(f"Cambio de modelo ({record['reason']}): {previous[0]}@{previous[1]} -> "
+                 f"{self.current[0]}@{self.current[1]} (latencia {record['latency_ms']} ms, "
+                 f"presupuesto {record['budget_ms']} ms)")
+        if self.log_path:
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                log.error(f"No se pudo registrar el cambio de modelo: {e}")
+        return self.current
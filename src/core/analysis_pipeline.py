@@ -0,0 +1,471 @@
+import time
+import numpy as np
+import logging as log
+
+from .counting_processor import CountingProcessor
+from .homography_manager import HomographyManager
+from .speed_calculator import SpeedCalculator
+from .mask_processor import MaskProcessing
+from .tracker import ByteTracker
+from .tiling import TiledDetector
+from .adaptive_controller import AdaptiveController
+from .geometry_artifacts import artifacts_match
+from .clip_recorder import ClipRecorder
+from .video_output import AnnotatedVideoWriter
+from .occupancy import OccupancyMap
+from .congestion import CongestionEstimator
+from utils.file_manager import EventWriter
+from utils.metrics_server import PipelineMetrics
+from utils.memory_monitor import rss_bytes
+from utils.event_sinks import EventDispatcher, EventSink
+from data.crop_store import CropStore
+from models.vehicle import CountEvent
+from models.detection import FrameDetections, VehicleDetectionInterface
+
+
+class AnalysisPipeline:
+    # bicycle: 1, car: 2, motorcycle: 3, bus: 5, truck: 7
+    CLASSES_TO_DETECT = [1, 2, 3, 5, 7]
+
+    TRACKERS = ("ultralytics", "bytetrack")
+    INFERENCE_MODES = ("full", "tiled")
+
+    def __init__(self, lane_polygons: list, homography_config: dict, event_output_path: str = None,
+                 tracker: str = "ultralytics", tracker_params: dict = None,
+                 inference_mode: str = "full", tiling_params: dict = None, adaptive_params: dict = None,
+                 checkpointing: bool = False, resume_state: dict = None, geometry_artifacts: dict = None,
+                 metrics: PipelineMetrics = None, event_sinks: list[EventSink] = None,
+                 clip_params: dict = None, video_output_params: dict = None,
+                 crop_params: dict = None, occupancy_params: dict = None, congestion_params: dict = None,
+                 stale_track_seconds: float = 30.0, detector: VehicleDetectionInterface = None):
+        """
+        Per-frame analysis (mask, detection, counting, speed) without any GUI dependency.
+        Used by VideoProcessor in the GUI and by the headless runner.
+
+        Args:
+            lane_polygons (list): Lane polygons in pixel coordinates.
+            homography_config (dict): Homography points and real distances.
+            event_output_path (str): Optional file where counted events are streamed.
+            tracker (str): "ultralytics" (YOLO.track) or "bytetrack" (core.tracker.ByteTracker
+                on plain detections).
+            tracker_params (dict): Keyword arguments for ByteTracker (thresholds, track_buffer).
+            inference_mode (str): "full" (whole frame at model resolution) or "tiled" (batched
+                tiles over the lanes, see core.tiling). Tiled mode always uses ByteTracker.
+            tiling_params (dict): Keyword arguments for TiledDetector (tile_size, overlap...).
+            adaptive_params (dict): Keyword arguments for AdaptiveController (source_fps, levels,
+                limits...); when set the model variant / input size follow the processing load.
+                Adaptive mode always uses ByteTracker.
+            checkpointing (bool): The job will save checkpoints (get_state). Uses ByteTracker,
+                whose state can be saved, unlike the one inside YOLO.track.
+            resume_state (dict): State from get_state to continue an interrupted job; the event
+                log is truncated to the checkpoint position.
+            geometry_artifacts (dict): Cached derived geometry (see core.geometry_artifacts):
+                homography matrix, lane mask and pixel -> world table are used instead of being
+                recomputed; ignored if they were computed for another configuration.
+            metrics (PipelineMetrics): Optional metrics (fps, per-stage latency, queue depths,
+                tracks, per-lane counts and speeds), e.g. served by utils.metrics_server.
+            event_sinks (list[EventSink]): Destinations (file, socket, HTTP, broker) that receive
+                the counted events in near real time (see utils.event_sinks).
+            clip_params (dict): Keyword arguments for ClipRecorder (output_dir, pre_seconds...);
+                when set a clip is written around every flagged event (speeding by default) from a
+                ring buffer of recent frames. The recorder is created by each pipeline.
+            video_output_params (dict): Keyword arguments for AnnotatedVideoWriter (path, output_size,
+                frame_step...); when set every analyzed frame is written with its overlays to an
+                output video. The writer is created by each pipeline.
+            crop_params (dict): Keyword arguments for CropStore (directory, max_pack_mb...); when set
+                the best crop of every counted vehicle is kept in pack files (see data.crop_store).
+                The store is created by each pipeline and starts a new pack.
+            occupancy_params (dict): Keyword arguments for OccupancyMap (cell_size, bin_seconds...);
+                when set every frame is added to the occupancy heatmap and lane density series.
+            congestion_params (dict): Keyword arguments for CongestionEstimator (stop_speed_kmh,
+                max_gap_m, free_flow_kmh...); when set queue length, stopped vehicles and delay
+                are estimated per lane (needs a valid homography).
+            stale_track_seconds (float): Tracks not seen for this long are forgotten (crossing
+                history, counted IDs, speed filters), so memory does not grow with session length.
+            detector (VehicleDetectionInterface): Detector to use instead of loading the YOLO model
+                (core.vehicle_detector), e.g. a stand-in when only process_detections is used.
+        """
+        if tracker not in self.TRACKERS:
+            raise ValueError(f"Tracker no soportado: {tracker}")
+        if inference_mode not in self.INFERENCE_MODES:
+            raise ValueError(f"Modo de inferencia no soportado: {inference_mode}")
+        if inference_mode == "tiled" and tracker == "ultralytics":
+            # YOLO.track solo sigue una imagen completa: las detecciones por tiles se siguen aquí
+            log.info("Inferencia por tiles: se usa el tracker bytetrack")
+            tracker = "bytetrack"
+        if adaptive_params is not None and tracker == "ultralytics":
+            # el estado de YOLO.track vive en el modelo: cambiar de modelo reiniciaría los IDs
+            log.info("Modo adaptativo: se usa el tracker bytetrack")
+            tracker = "bytetrack"
+        if (checkpointing or resume_state is not None) and tracker == "ultralytics":
+            log.info("Checkpoints: se usa el tracker bytetrack")
+            tracker = "bytetrack"
+
+        self.homography_config = homography_config or {}
+        self.mask = MaskProcessing()
+        self.controller = AdaptiveController(**adaptive_params) if adaptive_params is not None else None
+        if detector is not None:
+            self.detector = detector
+        else:
+            # torch / ultralytics solo se cargan cuando se detecta con el modelo
+            from .vehicle_detector import VehicleDetection
+            self.detector = VehicleDetection(*self.controller.current) if self.controller else VehicleDetection()
+        self.tracker = ByteTracker(**(tracker_params or {})) if tracker == "bytetrack" else None
+        self.tiled_detector = None
+        if inference_mode == "tiled":
+            self.tiled_detector = TiledDetector(self.detector, lane_polygons, **(tiling_params or {}))
+        self.counter = CountingProcessor(lane_polygons)
+
+        if geometry_artifacts is not None and not artifacts_match(geometry_artifacts, lane_polygons, self.homography_config):
+            log.warning("La geometría derivada en caché no corresponde a la configuración, se recalcula")
+            geometry_artifacts = None
+        if geometry_artifacts is not None:
+            matrix = geometry_artifacts["homography_matrix"]
+            self.homography_manager = HomographyManager(self.homography_config, matrix if matrix.size else None)
+            if geometry_artifacts["world_table"].size:
+                self.homography_manager.set_world_table(geometry_artifacts["world_table"], int(geometry_artifacts["world_step"]))
+            self.mask.preload(geometry_artifacts["lane_labels"], lane_polygons)
+        else:
+            self.homography_manager = HomographyManager(self.homography_config)
+        self.speed_calculator = SpeedCalculator(self.homography_manager)
+        self.stale_track_seconds = stale_track_seconds
+        self._last_prune = None
+
+        self.occupancy = None
+        if occupancy_params is not None:
+            lane_labels = geometry_artifacts["lane_labels"] if geometry_artifacts is not None else None
+            self.occupancy = OccupancyMap(lane_polygons, lane_labels=lane_labels, **occupancy_params)
+        self.congestion = None
+        if congestion_params is not None:
+            self.congestion = CongestionEstimator(lane_polygons, self.homography_manager, **congestion_params)
+
+        self.event_writer = None
+        if event_output_path:
+            resume_offset = resume_state.get("writer_offset") if resume_state else None
+            self.event_writer = EventWriter(event_output_path, resume_offset=resume_offset)
+            self.event_writer.start()
+
+        self.event_dispatcher = None
+        if event_sinks:
+            self.event_dispatcher = EventDispatcher(event_sinks)
+            self.event_dispatcher.start()
+
+        self.clip_recorder = None
+        if clip_params is not None:
+            self.clip_recorder = ClipRecorder(**clip_params)
+            self.clip_recorder.start()
+
+        self.video_writer = None
+        if video_output_params is not None:
+            self.video_writer = AnnotatedVideoWriter(**video_output_params)
+            self._update_video_geometry()
+            self.video_writer.start()
+
+        self.crop_store = None
+        if crop_params is not None:
+            self.crop_store = CropStore(**crop_params)
+            self.crop_store.start()
+
+        if resume_state is not None:
+            self.set_state(resume_state)
+
+        self.metrics = metrics
+        if metrics is not None:
+            self._register_gauges(metrics)
+
+    def _register_gauges(self, metrics: PipelineMetrics):
+        """Values owned by other components, read when the metrics are scraped."""
+        if self.event_writer:
+            writer = self.event_writer
+            metrics.register_gauge("traffic_queue_depth", "Items waiting in a queue.", writer.queue.qsize, {"queue": "event_writer"})
+            metrics.register_gauge("traffic_events_dropped", "Events dropped because a queue was full.", lambda: writer.dropped, {"queue": "event_writer"})
+        for sink in (self.event_dispatcher.sinks if self.event_dispatcher else []):
+            labels = {"sink": sink.url}
+            metrics.register_gauge("traffic_sink_queue_depth", "Events waiting for a sink.", lambda s=sink: len(s.pending), labels)
+            metrics.register_gauge("traffic_sink_lag_seconds", "Age of the oldest undelivered event of a sink.", lambda s=sink: s.lag, labels)
+            metrics.register_gauge("traffic_sink_sent", "Events delivered to a sink.", lambda s=sink: s.sent, labels)
+            metrics.register_gauge("traffic_sink_dropped", "Events a sink dropped (queue overflow or failed retries).", lambda s=sink: s.dropped, labels)
+        if self.tracker is not None:
+            metrics.register_gauge("traffic_tracker_tracks", "Tracks kept by the tracker (active and lost).", lambda: len(self.tracker))
+        if self.clip_recorder is not None:
+            recorder = self.clip_recorder
+            metrics.register_gauge("traffic_clip_buffer_bytes", "Memory used by the clip ring buffer.", lambda: recorder.buffer_bytes)
+            metrics.register_gauge("traffic_clips_written", "Evidence clips written.", lambda: recorder.clips_written)
+            metrics.register_gauge("traffic_clips_dropped", "Evidence clips discarded (recorder saturated).", lambda: recorder.clips_dropped)
+        if self.video_writer is not None:
+            video_writer = self.video_writer
+            metrics.register_gauge("traffic_queue_depth", "Items waiting in a queue.", lambda: video_writer.queue_depth, {"queue": "video_writer"})
+            metrics.register_gauge("traffic_video_frames_dropped", "Frames skipped by the annotated video writer.", lambda: video_writer.frames_dropped)
+        if self.crop_store is not None:
+            crop_store = self.crop_store
+            metrics.register_gauge("traffic_queue_depth", "Items waiting in a queue.", lambda: crop_store.queue_depth, {"queue": "crop_store"})
+            metrics.register_gauge("traffic_crops_written", "Vehicle crops stored.", lambda: crop_store.crops_written)
+            metrics.register_gauge("traffic_crops_dropped", "Vehicle crops skipped (store saturated or write error).", lambda: crop_store.crops_dropped)
+        if self.congestion is not None:
+            congestion = self.congestion
+            for i in range(congestion.num_lanes):
+                labels = {"lane": i + 1}
+                metrics.register_gauge("traffic_queue_length_meters", "Queue length from the stop line.", lambda i=i: congestion.queue_length[i], labels)
+                metrics.register_gauge("traffic_stopped_vehicles", "Stopped vehicles in the lane.", lambda i=i: congestion.stopped[i], labels)
+                metrics.register_gauge("traffic_lane_delay_seconds", "Mean delay per vehicle against free flow.",
+                                       lambda i=i: congestion.delay_sum[i] / congestion.delay_count[i] if congestion.delay_count[i] else 0.0, labels)
+        metrics.register_gauge("traffic_memory_rss_bytes", "Resident memory of the process.", rss_bytes)
+        for name in self.memory_stats():
+            metrics.register_gauge("traffic_structure_size", "Entries in an in-process structure.",
+                                   lambda name=name: self.memory_stats().get(name, 0), {"structure": name})
+        if self.controller:
+            metrics.register_gauge("traffic_model_level", "Adaptive model level (0 = cheapest).", lambda: self.controller.level)
+
+    def reconfigure(self, lane_polygons: list = None, homography_config: dict = None):
+        """
+        Apply new lane geometry and/or homography between two frames.
+
+        Only derived artifacts are rebuilt (counting lines, mask, tiles, homography matrix);
+        the model, the tracker and the counters are kept. Speed filters are reset when the
+        homography changes because their state is in the old world coordinates.
+        """
+        if lane_polygons is not None:
+            self.counter.set_lanes(lane_polygons)
+            if self.tiled_detector:
+                self.tiled_detector.set_lanes(lane_polygons)
+            if self.occupancy:
+                self.occupancy.set_lanes(lane_polygons)
+            log.info(f"Geometría de carriles actualizada ({len(lane_polygons)} carriles)")
+        if homography_config is not None:
+            self.homography_config = homography_config
+            self.homography_manager.update(homography_config)
+            self.speed_calculator.kalman_filters.clear()
+            log.info("Homografía actualizada")
+        if self.congestion is not None and (lane_polygons is not None or homography_config is not None):
+            self.congestion.set_lanes(self.counter.lane_polygons)
+        if self.video_writer is not None:
+            self._update_video_geometry()
+
+    def _update_video_geometry(self):
+        counter = self.counter
+        self.video_writer.set_geometry(counter.lane_polygons, counter.counting_lines, self.homography_config.get("image_points"))
+
+    def get_state(self) -> dict:
+        """
+        Full analysis state for a checkpoint: tracker, counters, speed filters, adaptive level
+        and the event log position (waits until the pending events are written).
+        """
+        return {
+            "tracker": self.tracker.get_state(),
+            "counter": self.counter.get_state(),
+            "speed": self.speed_calculator.get_state(),
+            "adaptive_level": self.controller.level if self.controller else None,
+            "occupancy": self.occupancy.get_state() if self.occupancy else None,
+            "congestion": self.congestion.get_state() if self.congestion else None,
+            "writer_offset": self.event_writer.checkpoint() if self.event_writer else None,
+        }
+
+    def set_state(self, state: dict):
+        self.tracker.set_state(state["tracker"])
+        self.counter.set_state(state["counter"])
+        self.speed_calculator.set_state(state["speed"])
+        if self.occupancy and state.get("occupancy") is not None:
+            self.occupancy.set_state(state["occupancy"])
+        if self.congestion and state.get("congestion") is not None:
+            self.congestion.set_state(state["congestion"])
+        if self.controller and state.get("adaptive_level") is not None:
+            self.controller.level = state["adaptive_level"]
+            self._apply_level(*self.controller.current)
+
+    def _apply_level(self, model_name: str, imgsz: int):
+        """Switch the detector to an adaptive level (model variant and input size)."""
+        self.detector.set_model(model_name, imgsz)
+        if self.tiled_detector:
+            self.tiled_detector.tile_size = imgsz
+            self.tiled_detector.tiles = None
+
+    def process_frame(self, frame: np.ndarray, delta_t: float, timestamp: float = None) -> tuple[list[CountEvent], FrameDetections, list[str]]:
+        """
+        Analyze one frame.
+
+        Args:
+            frame (np.ndarray): BGR frame.
+            delta_t (float): Seconds since the previous frame.
+            timestamp (float): Epoch seconds of the frame (video time for recordings), default now.
+
+        Returns:
+            tuple: (newly counted events, detections of the frame, overlay label of each detection)
+        """
+        start = time.perf_counter()
+
+        # 1. create mask
+        masked_frame = self.mask.process_frame(frame, self.counter.lane_polygons)
+        mask_done = time.perf_counter()
+
+        # 2. detect vehicles: one FrameDetections per frame shared by every stage
+        if self.tiled_detector is not None:
+            detections = self.tiled_detector.detect(masked_frame, self.CLASSES_TO_DETECT)
+        else:
+            if self.tracker is None:
+                detections_generator, class_names = self.detector.inference(masked_frame, self.CLASSES_TO_DETECT)
+            else:
+                detections_generator, class_names = self.detector.detect(masked_frame, self.CLASSES_TO_DETECT)
+            detections = FrameDetections.empty(class_names)
+            for results in detections_generator:
+                detections = FrameDetections.from_results(results, class_names)
+        detect_done = time.perf_counter()
+        if self.tracker is not None:
+            detections = self.tracker.update(detections)
+        track_done = time.perf_counter()
+
+        new_events = self.process_detections(detections, delta_t, timestamp, frame.shape)
+        labels = self.get_labels(detections)
+
+        # 5b. evidence clips: the frame goes to the ring buffer before its events
+        if self.clip_recorder is not None:
+            self.clip_recorder.add_frame(frame, self.counter.current_time)
+            self.clip_recorder.on_events(new_events)
+        if self.crop_store is not None:
+            self.crop_store.add_frame(frame, detections, self.counter.current_time)
+            self.crop_store.on_events(new_events)
+        if self.video_writer is not None:
+            self.video_writer.write(frame, detections.boxes if detections.has_ids else detections.boxes[:0], labels)
+
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.observe_stage("mask", mask_done - start)
+            # con YOLO.track la etapa detect incluye el seguimiento
+            metrics.observe_stage("detect", detect_done - mask_done)
+            if self.tracker is not None:
+                metrics.observe_stage("track", track_done - detect_done)
+            metrics.observe_stage("total", time.perf_counter() - start)
+            metrics.frame_done(len(detections) if detections.has_ids else 0)
+
+        # 6. adapt model / input size to the processing load
+        if self.controller:
+            level = self.controller.update(time.perf_counter() - start)
+            if level:
+                self._apply_level(*level)
+
+        return new_events, detections, labels
+
+    def process_detections(self, detections: FrameDetections, delta_t: float, timestamp: float = None,
+                           frame_shape: tuple = None) -> list[CountEvent]:
+        """
+        Count, estimate speeds and update the spatial analytics from already computed detections
+        (also used to replay recorded or synthetic detections without a detector).
+
+        Args:
+            detections (FrameDetections): Tracked detections of the frame.
+            delta_t (float): Seconds since the previous frame.
+            timestamp (float): Epoch seconds of the frame, default now.
+            frame_shape (tuple): Shape of the frame; occupancy and congestion need it.
+        """
+        counter = self.counter
+        speed_calculator = self.speed_calculator
+        start = time.perf_counter()
+
+        # 3. count vehicles
+        new_events = counter.process_frame(detections, speed_calculator.speed_history, timestamp)
+        count_done = time.perf_counter()
+
+        # 4. calculate speed
+        if detections.has_ids:
+            speed_calculator.update_speeds(detections.track_ids, detections.anchors, delta_t)
+
+        # 4b. forget tracks that are gone
+        if self._last_prune is None:
+            self._last_prune = counter.current_time
+        elif counter.current_time - self._last_prune >= self.stale_track_seconds:
+            self._last_prune = counter.current_time
+            speed_calculator.remove_tracks(counter.prune_tracks(self.stale_track_seconds))
+
+        # 5. save events
+        for event in new_events:
+            speed = speed_calculator.speed_history.get(event.track_id, -1)
+            event.speed = float(speed) if speed >= 0 else float("nan")
+        if self.event_writer:
+            self.event_writer.write(new_events)
+        if self.event_dispatcher:
+            self.event_dispatcher.publish(new_events)
+
+        speed_done = time.perf_counter()
+
+        # 5c. occupancy heatmap and lane density, queues and delay
+        if frame_shape is not None and self.occupancy is not None:
+            self.occupancy.update(detections.anchors, detections.boxes, delta_t, counter.current_time, frame_shape)
+        occupancy_done = time.perf_counter()
+        if frame_shape is not None and self.congestion is not None:
+            track_ids = detections.track_ids if detections.has_ids else np.empty(0, dtype=np.int64)
+            self.congestion.update(track_ids, detections.anchors, delta_t, counter.current_time, frame_shape)
+
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.observe_stage("count", count_done - start)
+            metrics.observe_stage("speed", speed_done - count_done)
+            if self.occupancy is not None:
+                metrics.observe_stage("occupancy", occupancy_done - speed_done)
+            if self.congestion is not None:
+                metrics.observe_stage("congestion", time.perf_counter() - occupancy_done)
+            metrics.record_events(new_events)
+        return new_events
+
+    def memory_stats(self) -> dict:
+        """Entries held by the main in-process structures (tracks, filters, logs, queues)."""
+        counter = self.counter
+        speed_calculator = self.speed_calculator
+        stats = {
+            "track_history": len(counter.track_history),
+            "counted_ids": sum(len(ids) for ids in counter.counted_ids_per_lane.values()),
+            "speed_stats": len(counter.speed_stats),
+            "full_event_log": len(counter.full_event_log),
+            "kalman_filters": len(speed_calculator.kalman_filters),
+            "speed_history": len(speed_calculator.speed_history),
+        }
+        if self.tracker is not None:
+            stats["tracker_tracks"] = len(self.tracker)
+        if self.event_writer:
+            stats["event_writer_queue"] = self.event_writer.queue.qsize()
+        if self.event_dispatcher:
+            stats["sink_pending"] = sum(len(sink.pending) for sink in self.event_dispatcher.sinks)
+        if self.clip_recorder:
+            stats["clip_buffer_bytes"] = self.clip_recorder.buffer_bytes
+        if self.crop_store:
+            stats["crop_store_queue"] = self.crop_store.queue_depth
+            stats["crop_store_tracks"] = len(self.crop_store)
+        if self.video_writer:
+            stats["video_writer_queue"] = self.video_writer.queue_depth
+        if self.congestion:
+            stats["congestion_tracks"] = len(self.congestion)
+        return stats
+
+    def has_changes(self) -> bool:
+        """True if counters, rolling windows or congestion changed since they were last published."""
+        return self.counter.has_changes() or (self.congestion is not None and self.congestion.has_changes())
+
+    def get_labels(self, detections: FrameDetections) -> list[str]:
+        """Overlay text of each tracked detection: ID, class and speed."""
+        if not detections.has_ids:
+            return [""] * len(detections)
+
+        labels = []
+        speed_history = self.speed_calculator.speed_history
+        for track_id, cls_id in zip(detections.track_ids.tolist(), detections.class_ids.tolist()):
+            speed = speed_history.get(track_id, -1)
+            speed_text = f" {speed:.1f} km/h" if speed >= 0 else ""
+            labels.append(f"ID:{track_id} {detections.class_names.get(cls_id)}{speed_text}")
+        return labels
+
+    def close(self):
+        """Flush and close the outputs."""
+        if self.event_writer:
+            self.event_writer.close()
+            self.event_writer = None
+        if self.event_dispatcher:
+            self.event_dispatcher.close()
+            self.event_dispatcher = None
+        if self.clip_recorder:
+            self.clip_recorder.close()
+            self.clip_recorder = None
+        if self.video_writer:
+            self.video_writer.close()
+            self.video_writer = None
+        if self.crop_store:
+            self.crop_store.close()
+            self.crop_store = None
+        log.info("Pipeline de análisis cerrado")
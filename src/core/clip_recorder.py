@@ -0,0 +1,201 @@
+import os
+import queue
+import threading
+import logging as log
+from collections import deque
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from models.vehicle import CountEvent
+
+
+class _Clip:
+    __slots__ = ("event", "start", "end", "frames")
+
+    def __init__(self, event: CountEvent, start: float, end: float, frames: list):
+        self.event = event
+        self.start = start
+        self.end = end
+        self.frames = frames  # [(timestamp, jpeg bytes)]
+
+
+class ClipRecorder:
+    def __init__(self, output_dir: str = "clips", statuses: tuple = ("Exceso de Velocidad",),
+                 pre_seconds: float = 3.0, post_seconds: float = 3.0, max_width: int = 1280,
+                 jpeg_quality: int = 80, frame_step: int = 1, max_buffer_mb: float = 128.0,
+                 max_queue: int = 8, max_active_clips: int = 8, max_pending_clips: int = 4, codec: str = "mp4v"):
+        """
+        Video evidence of flagged events: a few seconds before and after each one.
+
+        Recent frames are kept downscaled and JPEG-compressed in a ring buffer bounded by
+        memory; when an event with one of `statuses` is counted, the frames from
+        `pre_seconds` before it to `post_seconds` after it are written as a clip.
+
+        The analysis thread only enqueues the frame reference. Downscaling, compression and
+        clip assembly run on a worker thread, video encoding on another; when the worker
+        falls behind frames are skipped (`frames_dropped`), and when too many clips wait to
+        be encoded new ones are discarded (`clips_dropped`), so analysis is never blocked.
+
+        Args:
+            output_dir (str): Folder of the clips.
+            statuses (tuple): Event statuses that produce a clip.
+            pre_seconds (float): Seconds recorded before the event.
+            post_seconds (float): Seconds recorded after the event.
+            max_width (int): Frames wider than this are downscaled (CPU and memory limit).
+            jpeg_quality (int): JPEG quality of the buffered frames (0-100).
+            frame_step (int): Keep one frame out of `frame_step`.
+            max_buffer_mb (float): Memory limit of the ring buffer.
+            max_queue (int): Frames waiting for compression before new ones are skipped.
+            max_active_clips (int): Clips recording at the same time (each holds its frames).
+            max_pending_clips (int): Finished clips waiting for the encoder.
+            codec (str): FourCC of the clips.
+        """
+        self.output_dir = output_dir
+        self.statuses = set(statuses)
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_width = max_width
+        self.jpeg_quality = jpeg_quality
+        self.frame_step = max(1, frame_step)
+        self.max_buffer_bytes = int(max_buffer_mb * 1024 * 1024)
+        self.max_queue = max_queue
+        self.max_active_clips = max_active_clips
+        self.codec = codec
+
+        self.frames_dropped = 0
+        self.clips_written = 0
+        self.clips_dropped = 0
+
+        self._ring = deque()  # (timestamp, jpeg bytes)
+        self._ring_bytes = 0
+        self._active = []
+        self._frame_count = 0
+        self._queue = queue.Queue()
+        self._encode_queue = queue.Queue(maxsize=max_pending_clips)
+        self._worker = threading.Thread(target=self._run, name="ClipRecorder", daemon=True)
+        self._encoder = threading.Thread(target=self._run_encoder, name="ClipEncoder", daemon=True)
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._worker.start()
+        self._encoder.start()
+
+    def add_frame(self, frame: np.ndarray, timestamp: float):
+        """Offer a frame (not copied: the caller must not modify it afterwards)."""
+        self._frame_count += 1
+        if self._frame_count % self.frame_step:
+            return
+        # los eventos nunca se descartan: el límite solo aplica a fotogramas
+        if self._queue.qsize() >= self.max_queue:
+            self.frames_dropped += 1
+            return
+        self._queue.put(("frame", timestamp, frame))
+
+    def on_events(self, events: list[CountEvent]):
+        """Start a clip for every event with a flagged status."""
+        for event in events:
+            if event.status in self.statuses:
+                self._queue.put(("event", event.timestamp, event))
+
+    @property
+    def buffer_bytes(self) -> int:
+        return self._ring_bytes
+
+    def close(self):
+        """Write the clips in progress with the frames received so far and stop the threads."""
+        if self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        if self._encoder.is_alive():
+            self._encode_queue.put(None)
+            self._encoder.join()
+        log.info(f"Grabador de clips cerrado: {self.clips_written} clips, {self.clips_dropped} descartados, "
+                 f"{self.frames_dropped} fotogramas omitidos")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            kind, timestamp, payload = item
+            if kind == "frame":
+                self._add_to_ring(timestamp, payload)
+            elif len(self._active) >= self.max_active_clips:
+                self.clips_dropped += 1
+                log.warning(f"Demasiados clips en grabación, clip del track {payload.track_id} descartado")
+            else:
+                start = timestamp - self.pre_seconds
+                frames = [entry for entry in self._ring if entry[0] >= start]
+                self._active.append(_Clip(payload, start, timestamp + self.post_seconds, frames))
+            self._finish_clips(timestamp)
+
+        for clip in self._active:
+            self._submit(clip, block=True)
+        self._active = []
+
+    def _add_to_ring(self, timestamp: float, frame: np.ndarray):
+        height, width = frame.shape[:2]
+        if width > self.max_width:
+            frame = cv2.resize(frame, (self.max_width, int(height * self.max_width / width)), interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return
+        data = encoded.tobytes()
+        entry = (timestamp, data)
+        self._ring.append(entry)
+        self._ring_bytes += len(data)
+        for clip in self._active:
+            clip.frames.append(entry)
+
+        # límite de memoria y ventana previa: los clips activos conservan sus propias referencias
+        while self._ring and (self._ring_bytes > self.max_buffer_bytes or self._ring[0][0] < timestamp - self.pre_seconds):
+            _, old = self._ring.popleft()
+            self._ring_bytes -= len(old)
+
+    def _finish_clips(self, now: float):
+        finished = [clip for clip in self._active if now >= clip.end]
+        if finished:
+            self._active = [clip for clip in self._active if now < clip.end]
+            for clip in finished:
+                self._submit(clip)
+
+    def _submit(self, clip: _Clip, block: bool = False):
+        if not clip.frames:
+            return
+        try:
+            self._encode_queue.put(clip, block=block)
+        except queue.Full:
+            self.clips_dropped += 1
+            log.warning(f"Codificador de clips saturado, clip del track {clip.event.track_id} descartado")
+
+    def _run_encoder(self):
+        while True:
+            clip = self._encode_queue.get()
+            if clip is None:
+                break
+            try:
+                self._write_clip(clip)
+            except Exception as e:
+                log.error(f"Error al escribir el clip del track {clip.event.track_id}: {e}")
+
+    def _write_clip(self, clip: _Clip):
+        event = clip.event
+        stamp = datetime.fromtimestamp(event.timestamp).strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.output_dir, f"carril{event.lane}_id{event.track_id}_{stamp}.mp4")
+
+        # fps real de los fotogramas guardados (omitidos y decimación incluidos)
+        duration = clip.frames[-1][0] - clip.frames[0][0]
+        fps = (len(clip.frames) - 1) / duration if duration > 0 else 30.0 / self.frame_step
+
+        writer = None
+        for _, data in clip.frames:
+            frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if writer is None:
+                height, width = frame.shape[:2]
+                writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.codec), fps, (width, height))
+            writer.write(frame)
+        writer.release()
+        self.clips_written += 1
+        log.info(f"Clip guardado: {path} ({len(clip.frames)} fotogramas, {event.speed:.1f} km/h)")
@@ -0,0 +1,340 @@
+import numpy as np
+
+from .homography_manager import HomographyManager
+from .geometry_artifacts import lane_label_image
+
+
+def _resized(array: np.ndarray, size: int) -> np.ndarray:
+    """Copy of a per-lane array with `size` lanes (lanes that remain keep their values)."""
+    array = np.asarray(array)
+    new = np.zeros(size, dtype=array.dtype)
+    keep = min(size, len(array))
+    new[:keep] = array[:keep]
+    return new
+
+
+class CongestionEstimator:
+    # arrays por track indexados por slot: dtype y valor de un slot libre
+    SLOT_ARRAYS = {
+        "slot_track": (np.int64, -1),
+        "slot_lane": (np.int64, -1),
+        "slot_position": (np.float64, np.nan),
+        "slot_speed": (np.float64, np.nan),
+        "slot_ref_position": (np.float64, np.nan),
+        "slot_ref_time": (np.float64, 0.0),
+        "slot_delay": (np.float64, 0.0),
+        "slot_stopped": (bool, False),
+        "slot_last_seen": (np.float64, 0.0),
+    }
+    LANE_ARRAYS = ("delay_sum", "delay_count", "stopped_total", "max_queue_length", "flow_direction")
+
+    def __init__(self, lane_polygons: list, homography_manager: HomographyManager, stop_speed_kmh: float = 5.0,
+                 max_gap_m: float = 10.0, free_flow_kmh: float = 50.0, track_timeout: float = 2.0,
+                 flow_smoothing: float = 0.05, speed_window: float = 1.0):
+        """
+        Queue length, stopped vehicles and delay per lane.
+
+        Each lane gets an axis in world coordinates (homography) from the middle of its far
+        end to the middle of its near end; tracked vehicles are projected onto it. The stop
+        line is the downstream end of the lane, inferred from the mean motion of the vehicles.
+        The queue is the chain of stopped vehicles starting at the stop line with gaps of at
+        most `max_gap_m`; its length is the distance from the stop line to the last one.
+
+        The speed of each vehicle is its advance along the lane axis over at least
+        `speed_window` seconds, measured here in world coordinates (the overlay speeds of
+        SpeedCalculator are calibrated for display and never reach zero). Delay is accumulated
+        per vehicle while it is in a lane, as the time lost against the free flow speed
+        (delta_t * (1 - v / v_free)), and added to the lane when the vehicle leaves it. Per-track values live in preallocated arrays indexed by slot, so a frame
+        is a handful of vectorized operations over its detections.
+
+        Args:
+            lane_polygons (list): Lane polygons in pixel coordinates.
+            homography_manager (HomographyManager): Pixel -> world (meters) projection.
+            stop_speed_kmh (float): Vehicles slower than this are stopped.
+            max_gap_m (float): Largest gap between two queued vehicles (and to the stop line).
+            free_flow_kmh (float): Speed without delay.
+            track_timeout (float): Seconds without seeing a track before it leaves its lane.
+            flow_smoothing (float): EMA factor of the lane direction estimate.
+            speed_window (float): Seconds between two position samples of the speed estimate
+                (longer windows average out the detection jitter).
+        """
+        self.hm = homography_manager
+        self.stop_speed_kmh = stop_speed_kmh
+        self.max_gap_m = max_gap_m
+        self.free_flow_kmh = free_flow_kmh
+        self.track_timeout = track_timeout
+        self.flow_smoothing = flow_smoothing
+        self.speed_window = speed_window
+
+        self.frame_size = None
+        self._lane_labels = None
+        self._slots = {}  # track_id -> slot
+        self._free_slots = []
+        self._reserve_slots(256)
+        self._last_prune = None
+        self.version = 0
+        self._published_version = -1
+        self.set_lanes(lane_polygons)
+
+    def _reserve_slots(self, capacity: int):
+        """Grow the per-track arrays to `capacity` slots."""
+        old = len(getattr(self, "slot_track", ()))
+        if capacity <= old:
+            return
+        for name, (dtype, fill) in self.SLOT_ARRAYS.items():
+            array = np.full(capacity, fill, dtype=dtype)
+            if old:
+                array[:old] = getattr(self, name)
+            setattr(self, name, array)
+        self._free_slots.extend(range(capacity - 1, old - 1, -1))
+
+    def set_lanes(self, lane_polygons: list):
+        """
+        New lane geometry or homography: lane axes and labels are rebuilt, vehicles in a lane
+        are closed (their delay is added) and lane totals are kept for the lanes that remain.
+        """
+        self.lane_polygons = [np.asarray(p, dtype=np.int32) for p in lane_polygons]
+        num_lanes = len(self.lane_polygons)
+        if hasattr(self, "num_lanes"):
+            self._finalize(np.flatnonzero(self.slot_lane >= 0))
+            self.slot_lane[:] = -1
+            self.slot_position[:] = np.nan
+            self.slot_speed[:] = np.nan
+            self.slot_ref_position[:] = np.nan
+
+        empty = np.zeros(0)
+        self.delay_sum = _resized(getattr(self, "delay_sum", empty), num_lanes)
+        self.delay_count = _resized(getattr(self, "delay_count", empty.astype(np.int64)), num_lanes)
+        self.stopped_total = _resized(getattr(self, "stopped_total", empty.astype(np.int64)), num_lanes)
+        self.max_queue_length = _resized(getattr(self, "max_queue_length", empty), num_lanes)
+        self.flow_direction = _resized(getattr(self, "flow_direction", empty), num_lanes)
+        self.queue_length = np.zeros(num_lanes, dtype=np.float64)
+        self.stopped = np.zeros(num_lanes, dtype=np.int64)
+        self.vehicles = np.zeros(num_lanes, dtype=np.int64)
+        self.num_lanes = num_lanes
+
+        self._build_axes()
+        if self.frame_size is not None:
+            self._lane_labels = lane_label_image(self.lane_polygons, self.frame_size)
+        self.version += 1
+
+    def _build_axes(self):
+        """World origin (far end), unit direction and length of each lane axis."""
+        self.axis_origin = np.zeros((self.num_lanes, 2), dtype=np.float64)
+        self.axis_direction = np.zeros((self.num_lanes, 2), dtype=np.float64)
+        self.axis_length = np.zeros(self.num_lanes, dtype=np.float64)
+        self.has_world = self.hm.matrix is not None and self.num_lanes > 0
+        if not self.has_world:
+            return
+        # extremos del carril en la imagen: punto medio de los dos vértices superiores y de los dos inferiores
+        ends = []
+        for polygon in self.lane_polygons:
+            by_y = polygon[np.argsort(polygon[:, 1], kind="stable")]
+            ends.append([by_y[:2].mean(axis=0), by_y[-2:].mean(axis=0)])
+        world = self.hm.transform_array(np.asarray(ends, dtype=np.float32).reshape(-1, 2)).reshape(-1, 2, 2)
+        axis = world[:, 1] - world[:, 0]
+        length = np.linalg.norm(axis, axis=1)
+        self.axis_origin = world[:, 0].astype(np.float64)
+        self.axis_direction = axis / np.maximum(length, 1e-9)[:, None]
+        self.axis_length = length
+
+    def _slot_of(self, track_id: int) -> int:
+        slot = self._slots.get(track_id)
+        if slot is None:
+            if not self._free_slots:
+                self._reserve_slots(2 * len(self.slot_track))
+            slot = self._slots[track_id] = self._free_slots.pop()
+            self.slot_track[slot] = track_id
+            self.slot_lane[slot] = -1
+            self.slot_position[slot] = np.nan
+            self.slot_speed[slot] = np.nan
+            self.slot_ref_position[slot] = np.nan
+            self.slot_delay[slot] = 0.0
+            self.slot_stopped[slot] = False
+        return slot
+
+    def update(self, track_ids: np.ndarray, anchors: np.ndarray, delta_t: float, timestamp: float,
+               frame_shape: tuple):
+        """
+        Add the tracked vehicles of one frame.
+
+        Args:
+            track_ids (np.ndarray): (N,) tracker IDs.
+            anchors (np.ndarray): (N, 2) anchor points in pixels.
+            delta_t (float): Seconds since the previous frame.
+            timestamp (float): Epoch seconds of the frame.
+            frame_shape (tuple): Shape of the frame.
+        """
+        height, width = frame_shape[:2]
+        if self.frame_size != (width, height):
+            self.frame_size = (width, height)
+            self._lane_labels = lane_label_image(self.lane_polygons, self.frame_size)
+        if self._last_prune is None:
+            self._last_prune = timestamp
+        if timestamp - self._last_prune >= self.track_timeout:
+            self._prune(timestamp)
+
+        previous = (self.queue_length.round(1).tolist(), self.stopped.tolist(), self.vehicles.tolist())
+        self.queue_length[:] = 0
+        self.stopped[:] = 0
+        self.vehicles[:] = 0
+        n = len(track_ids)
+        if n == 0 or not self.has_world or delta_t <= 0:
+            self._mark_changes(previous)
+            return
+
+        ids = track_ids.tolist()
+        slots = np.fromiter((self._slot_of(t) for t in ids), dtype=np.int64, count=n)
+        self.slot_last_seen[slots] = timestamp
+
+        x = np.clip(anchors[:, 0].astype(np.int64), 0, width - 1)
+        y = np.clip(anchors[:, 1].astype(np.int64), 0, height - 1)
+        lanes = self._lane_labels[y, x].astype(np.int64) - 1
+
+        # cambio de carril (o salida): la demora acumulada se asigna al carril anterior
+        previous_lanes = self.slot_lane[slots]
+        changed = previous_lanes != lanes
+        self._finalize(slots[changed & (previous_lanes >= 0)])
+        entering = slots[changed]
+        self.slot_lane[entering] = lanes[changed]
+        self.slot_position[entering] = np.nan
+        self.slot_speed[entering] = np.nan
+        self.slot_ref_position[entering] = np.nan
+        self.slot_delay[entering] = 0.0
+        self.slot_stopped[entering] = False
+
+        inside = lanes >= 0
+        if not inside.any():
+            self._mark_changes(previous)
+            return
+        slots, lanes = slots[inside], lanes[inside]
+        world = self.hm.lookup_array(anchors[inside])
+        position = np.einsum("ij,ij->i", world - self.axis_origin[lanes], self.axis_direction[lanes])
+
+        step = position - self.slot_position[slots]
+        self.slot_position[slots] = position
+
+        # velocidad: avance a lo largo del eje entre dos muestras separadas al menos speed_window
+        reference = self.slot_ref_position[slots]
+        elapsed = timestamp - self.slot_ref_time[slots]
+        first = np.isnan(reference)
+        due = ~first & (elapsed >= self.speed_window)
+        self.slot_speed[slots[due]] = np.abs(position[due] - reference[due]) / elapsed[due] * 3.6
+        restart = first | due
+        self.slot_ref_position[slots[restart]] = position[restart]
+        self.slot_ref_time[slots[restart]] = timestamp
+
+        speeds = self.slot_speed[slots]
+        known = ~np.isnan(speeds)
+
+        # sentido de circulación por carril: media del avance de los vehículos en movimiento
+        # (el ruido de detección de los detenidos no indica ningún sentido)
+        moving = known & (speeds >= self.stop_speed_kmh) & ~np.isnan(step)
+        if moving.any():
+            counts = np.bincount(lanes[moving], minlength=self.num_lanes)
+            mean_step = np.bincount(lanes[moving], weights=step[moving], minlength=self.num_lanes) / np.maximum(counts, 1)
+            seen = counts > 0
+            self.flow_direction[seen] += self.flow_smoothing * (np.sign(mean_step[seen]) - self.flow_direction[seen])
+
+        lost = np.clip(1.0 - np.nan_to_num(speeds) / self.free_flow_kmh, 0.0, 1.0) * delta_t
+        self.slot_delay[slots[known]] += lost[known]
+        stopped = known & (speeds < self.stop_speed_kmh)
+        self.slot_stopped[slots[stopped]] = True
+
+        self.vehicles[:] = np.bincount(lanes, minlength=self.num_lanes)
+        self.stopped[:] = np.bincount(lanes[stopped], minlength=self.num_lanes)
+
+        # distancia a la línea de detención: extremo cercano (sentido hacia la cámara) o lejano
+        toward_near_end = self.flow_direction[lanes] >= 0
+        distance = np.where(toward_near_end, self.axis_length[lanes] - position, position)
+        for lane in np.unique(lanes[stopped]).tolist():
+            queued = np.sort(np.maximum(distance[stopped & (lanes == lane)], 0.0))
+            gaps = np.diff(queued, prepend=0.0)
+            breaks = np.flatnonzero(gaps > self.max_gap_m)
+            end = breaks[0] if len(breaks) else len(queued)
+            if end:
+                self.queue_length[lane] = queued[end - 1]
+        np.maximum(self.max_queue_length, self.queue_length, out=self.max_queue_length)
+        self._mark_changes(previous)
+
+    def _mark_changes(self, previous: tuple):
+        if previous != (self.queue_length.round(1).tolist(), self.stopped.tolist(), self.vehicles.tolist()):
+            self.version += 1
+
+    def _finalize(self, slots: np.ndarray):
+        """Add the delay of vehicles leaving their lane to the lane totals."""
+        if len(slots) == 0:
+            return
+        lanes = self.slot_lane[slots]
+        valid = (lanes >= 0) & (lanes < self.num_lanes)
+        slots, lanes = slots[valid], lanes[valid]
+        np.add.at(self.delay_sum, lanes, self.slot_delay[slots])
+        np.add.at(self.delay_count, lanes, 1)
+        np.add.at(self.stopped_total, lanes, self.slot_stopped[slots].astype(np.int64))
+        self.slot_lane[slots] = -1
+        self.version += 1
+
+    def _prune(self, now: float):
+        """Close and free the slots of tracks not seen for `track_timeout` seconds."""
+        self._last_prune = now
+        stale = np.flatnonzero((self.slot_track >= 0) & (self.slot_last_seen < now - self.track_timeout))
+        if len(stale) == 0:
+            return
+        self._finalize(stale[self.slot_lane[stale] >= 0])
+        for slot, track_id in zip(stale.tolist(), self.slot_track[stale].tolist()):
+            del self._slots[track_id]
+            self._free_slots.append(slot)
+        self.slot_track[stale] = -1
+
+    def __len__(self):
+        return len(self._slots)
+
+    def has_changes(self) -> bool:
+        return self.version != self._published_version
+
+    def get_statistics(self) -> dict:
+        """
+        Per-lane congestion (keys: lane index): current queue length (m), stopped and present
+        vehicles, longest queue of the session (m), mean delay per vehicle (s) and vehicles
+        that stopped at least once, both over the vehicles that already left the lane.
+        """
+        self._published_version = self.version
+        return {
+            i: {
+                "queue_length_m": float(self.queue_length[i]),
+                "max_queue_length_m": float(self.max_queue_length[i]),
+                "stopped": int(self.stopped[i]),
+                "vehicles": int(self.vehicles[i]),
+                "avg_delay_s": float(self.delay_sum[i] / self.delay_count[i]) if self.delay_count[i] else 0.0,
+                "stopped_vehicles": int(self.stopped_total[i]),
+                "completed_vehicles": int(self.delay_count[i]),
+            }
+            for i in range(self.num_lanes)
+        }
+
+    def get_state(self) -> dict:
+        """Per-track slots and lane totals (for checkpoints)."""
+        return {
+            "slots": dict(self._slots),
+            "arrays": {name: getattr(self, name).copy() for name in self.SLOT_ARRAYS},
+            "lanes": {name: getattr(self, name).copy() for name in self.LANE_ARRAYS},
+            "last_prune": self._last_prune,
+        }
+
+    def set_state(self, state: dict):
+        """
+        Restore a checkpoint. Lane totals are matched by index: if the checkpoint has a
+        different number of lanes, the lanes that remain keep their totals.
+        """
+        capacity = len(state["arrays"]["slot_track"])
+        for name, (dtype, fill) in self.SLOT_ARRAYS.items():
+            array = state["arrays"].get(name)
+            setattr(self, name, np.full(capacity, fill, dtype=dtype) if array is None else np.array(array, dtype=dtype))
+        for name in self.LANE_ARRAYS:
+            setattr(self, name, _resized(np.asarray(state["lanes"][name], dtype=getattr(self, name).dtype), self.num_lanes))
+        self.slot_lane[self.slot_lane >= self.num_lanes] = -1
+        self._slots = dict(state["slots"])
+        used = set(self._slots.values())
+        self._free_slots = [slot for slot in range(len(self.slot_track) - 1, -1, -1) if slot not in used]
+        self._last_prune = state["last_prune"]
+        self.version += 1
@@ -1,35 +1,109 @@
 import os
 import sys
+import time
 import numpy as np
-from datetime import datetime
-from collections import defaultdict
+from itertools import islice
+from collections import defaultdict, deque
 from shapely.geometry import LineString, Point
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from models.count import CountingVehiclesInterface
+from models.lane import Lane
+from models.vehicle import CountEvent, Vehicle
+from models.detection import FrameDetections
+from .rolling_metrics import RollingMetrics
+
+
+class SpeedSummary:
+    """Running speed aggregates of a lane: count, sum, min, max and slow / normal / fast counts."""
+    __slots__ = ("events", "count", "total", "min", "max", "slow", "normal", "fast")
+
+    def __init__(self):
+        self.events = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.slow = 0
+        self.normal = 0
+        self.fast = 0
+
+    def add(self, speed: float):
+        """Add a counted event; unknown speeds (nan) are counted but not averaged."""
+        self.events += 1
+        if not speed == speed:
+            return
+        self.count += 1
+        self.total += speed
+        self.min = min(self.min, speed)
+        self.max = max(self.max, speed)
+        if speed < 40: self.slow += 1
+        elif speed < 60: self.normal += 1
+        else: self.fast += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def get_state(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    @classmethod
+    def from_state(cls, state: tuple) -> "SpeedSummary":
+        summary = cls()
+        for name, value in zip(cls.__slots__, state):
+            setattr(summary, name, value)
+        return summary
 
 
 class CountingProcessor:
-    def __init__(self, lane_polygons: list[list[tuple[int, int]]]):
+    def __init__(self, lane_polygons: list[list[tuple[int, int]]], max_log_events: int = 10000):
         """
         Initialize the counting processor class.
 
         Args:
             lane_polygons list[list[tuple[int, int]]]: List of lanes.
+            max_log_events (int): Maximum events kept in memory; the full log is streamed to disk by EventWriter.
         """
-        self.lane_polygons = [np.array(p, dtype=np.int32) for p in lane_polygons]
-        self.counting_lines = [self._calculate_counting_line(p) for p in self.lane_polygons]
+        self._build_lanes(lane_polygons)
         
-        # Historial para la lógica de cruce de línea
-        self.track_history = defaultdict(list)
+        # Historial para la lógica de cruce de línea: track_id -> Vehicle (última y penúltima posición)
+        self.track_history = {}
         
         # Almacenamiento persistente de datos de la sesión
-        self.full_event_log = []
-        self.speeds_per_lane = defaultdict(list)
+        self.full_event_log = deque(maxlen=max_log_events)
+        self.speed_stats = defaultdict(SpeedSummary)
         self.vehicle_counts_per_lane = defaultdict(lambda: defaultdict(int))
         
-        self.counted_ids_per_lane = defaultdict(list)
+        self.counted_ids_per_lane = defaultdict(set)
+        
+        # carriles con cambios desde la última publicación de estadísticas
+        self.dirty_lanes = set()
+        
+        # métricas de ventana deslizante (últimos 5 min / última hora) con memoria fija
+        self.rolling_metrics = RollingMetrics(len(self.lane_polygons))
+        self._published_rolling_version = -1
+        
+        # reloj de la sesión: hora real en vivo o tiempo del video al procesar grabaciones
+        self.current_time = time.time()
+        
+    def _build_lanes(self, lane_polygons: list):
+        """Derived lane geometry: int32 polygons, counting lines and Lane objects."""
+        self.lane_polygons = [np.array(p, dtype=np.int32) for p in lane_polygons]
+        self.counting_lines = [self._calculate_counting_line(p) for p in self.lane_polygons]
+        self.lanes = [Lane(i, polygon, line) for i, (polygon, line) in enumerate(zip(self.lane_polygons, self.counting_lines))]
+        
+    def set_lanes(self, lane_polygons: list):
+        """
+        Replace the lane geometry of a running session.
+        
+        Only the polygons and counting lines are rebuilt; counters, counted IDs and the
+        crossing history are kept (lanes are matched by index).
+        """
+        self._build_lanes(lane_polygons)
+        self.rolling_metrics.resize(len(self.lane_polygons))
+        self.dirty_lanes.update(i for i, summary in self.speed_stats.items() if summary.events)
         
     def _calculate_counting_line(self, polygon: np.ndarray) -> LineString:
         """
@@ -61,86 +135,186 @@ class CountingProcessor:
         
         return LineString([(min(x_coords), line_y), (max(x_coords), line_y)])
     
-    def process_frame(self, detections, class_names: dict, speed_history: dict):
+    def process_frame(self, detections: FrameDetections, speed_history: dict, timestamp: float = None) -> list[CountEvent]:
         """
         process detections and count vehicles per lane.
+        
+        Args:
+            detections (FrameDetections): Detections of the frame.
+            speed_history (dict): track_id -> current speed in km/h.
+            timestamp (float): Epoch seconds of the frame, defaults to the current time.
         """
         newly_counted_events = []
+        now = time.time() if timestamp is None else timestamp
+        self.current_time = now
+        self.rolling_metrics.advance(now)
         
-        if detections.boxes.id is None:
+        if not detections.has_ids:
             return newly_counted_events
         
-        boxes = detections.boxes.xyxy.cpu().numpy()
-        track_ids = detections.boxes.id.int().cpu().tolist()
-        clss = detections.boxes.cls.cpu().tolist()
-        confs = detections.boxes.conf.cpu().tolist()
+        class_names = detections.class_names
+        track_ids = detections.track_ids.tolist()
+        clss = detections.class_ids.tolist()
+        confs = detections.confidences.tolist()
+        anchors = detections.anchors.tolist()
         
-        for box, track_id, cls_id, conf in zip(boxes, track_ids, clss, confs):
-            self.track_history[track_id].append(((box[0] + box[2]) / 2, box[3]))
-            if len(self.track_history[track_id]) > 2:
-                self.track_history[track_id].pop(0)
+        for anchor, track_id, cls_id, conf in zip(anchors, track_ids, clss, confs):
+            anchor = tuple(anchor)
+            vehicle = self.track_history.get(track_id)
+            if vehicle is None:
+                self.track_history[track_id] = Vehicle(track_id, int(cls_id), anchor, now)
+                continue
+            vehicle.update(anchor, now)
                 
-            if len(self.track_history[track_id]) == 2:
-                trajectory = LineString(self.track_history[track_id])
-                for i, line in enumerate(self.counting_lines):
-                    if trajectory.intersects(line) and track_id not in self.counted_ids_per_lane[i]:
-                        self.counted_ids_per_lane[i].append(track_id)
-                        
-                        speed = speed_history.get(track_id, 0)
-                        if speed <= 0: continue
+            trajectory = LineString(vehicle.trajectory)
+            for lane in self.lanes:
+                i = lane.index
+                if trajectory.intersects(lane.counting_line) and track_id not in self.counted_ids_per_lane[i]:
+                    self.counted_ids_per_lane[i].add(track_id)
+                    
+                    speed = speed_history.get(track_id, 0)
+                    if speed <= 0: continue
 
-                        if speed > 60: status = "Exceso de Velocidad"
-                        elif speed < 40: status = "Lento"
-                        else: status = "Normal"
-                        
-                        event = {
-                            "track_id": track_id,
-                            "timestamp": datetime.now().strftime('%H:%M:%S'),
-                            "lane": i + 1,
-                            "type": class_names.get(cls_id, "Desconocido"),
-                            "speed": f"{speed:.1f}",
-                            "confidence": f"{conf*100:.0f}%",
-                            "status": status
-                        }
-                        self.full_event_log.append(event)
-                        newly_counted_events.append(event)
-                        
-                        self.speeds_per_lane[i].append(speed)
-                        self.vehicle_counts_per_lane[i][event["type"]] += 1
+                    if speed > 60: status = "Exceso de Velocidad"
+                    elif speed < 40: status = "Lento"
+                    else: status = "Normal"
+                    
+                    event = CountEvent(
+                        track_id=track_id,
+                        timestamp=now,
+                        lane=lane.number,
+                        class_id=int(cls_id),
+                        vehicle_type=class_names.get(cls_id, "Desconocido"),
+                        speed=float(speed),
+                        confidence=float(conf),
+                        status=status,
+                    )
+                    self.record_event(event)
+                    newly_counted_events.append(event)
                         
         return newly_counted_events
     
+    def prune_tracks(self, max_age: float) -> list[int]:
+        """
+        Forget vehicles not seen for `max_age` seconds (crossing history and counted IDs).
+        
+        Returns:
+            list[int]: Track IDs removed.
+        """
+        limit = self.current_time - max_age
+        stale = [track_id for track_id, vehicle in self.track_history.items() if vehicle.last_seen < limit]
+        for track_id in stale:
+            del self.track_history[track_id]
+        if stale:
+            for ids in self.counted_ids_per_lane.values():
+                ids.difference_update(stale)
+        return stale
+    
+    def record_event(self, event: CountEvent):
+        """Add a counted event to the session counters at its `counted_speed` (also used to replay stitched events)."""
+        i = event.lane - 1
+        self.full_event_log.append(event)
+        self.speed_stats[i].add(event.counted_speed)
+        self.vehicle_counts_per_lane[i][event.vehicle_type] += 1
+        self.dirty_lanes.add(i)
+        self.rolling_metrics.add(event.timestamp, i, event.vehicle_type, event.counted_speed)
+    
+    def get_state(self) -> dict:
+        """Counters, counted IDs, crossing history and rolling windows (for checkpoints)."""
+        return {
+            "track_history": [(v.track_id, v.class_id, v.prev_anchor, v.anchor, v.last_seen) for v in self.track_history.values()],
+            "event_log": list(self.full_event_log),
+            "speed_stats": {i: summary.get_state() for i, summary in self.speed_stats.items()},
+            "vehicle_counts_per_lane": {i: dict(counts) for i, counts in self.vehicle_counts_per_lane.items()},
+            "counted_ids_per_lane": {i: list(ids) for i, ids in self.counted_ids_per_lane.items()},
+            "rolling_metrics": self.rolling_metrics.get_state(),
+            "current_time": self.current_time,
+        }
+    
+    def set_state(self, state: dict):
+        self.track_history = {}
+        for track_id, class_id, prev_anchor, anchor, last_seen in state["track_history"]:
+            vehicle = Vehicle(track_id, class_id, anchor, last_seen)
+            vehicle.prev_anchor = prev_anchor
+            self.track_history[track_id] = vehicle
+        self.full_event_log.clear()
+        self.full_event_log.extend(state["event_log"])
+        self.speed_stats = defaultdict(SpeedSummary, {i: SpeedSummary.from_state(s) for i, s in state["speed_stats"].items()})
+        self.vehicle_counts_per_lane = defaultdict(lambda: defaultdict(int))
+        for i, counts in state["vehicle_counts_per_lane"].items():
+            self.vehicle_counts_per_lane[i].update(counts)
+        self.counted_ids_per_lane = defaultdict(set, {i: set(ids) for i, ids in state["counted_ids_per_lane"].items()})
+        self.rolling_metrics.set_state(state["rolling_metrics"])
+        self.current_time = state["current_time"]
+        # publicar todo en la próxima actualización
+        self.dirty_lanes = {i for i, summary in self.speed_stats.items() if summary.events}
+        self._published_rolling_version = -1
+    
+    def _get_lane_statistics(self, lane_idx: int) -> dict:
+        """Estadísticas acumuladas de un carril, leídas de sus agregados (sin recorrer los eventos)."""
+        summary = self.speed_stats[lane_idx]
+        return {
+            "avg_speed": summary.mean,
+            "min_speed": summary.min if summary.count else 0.0,
+            "max_speed": summary.max if summary.count else 0.0,
+            "vehicle_counts": dict(self.vehicle_counts_per_lane[lane_idx]),
+            "speed_dist": {"slow": summary.slow, "normal": summary.normal, "fast": summary.fast},
+        }
+    
+    def _get_global_statistics(self) -> dict:
+        """Estadísticas globales de la sesión a partir de los agregados por carril."""
+        speed_count = sum(summary.count for summary in self.speed_stats.values())
+        speed_total = sum(summary.total for summary in self.speed_stats.values())
+        
+        global_counts = defaultdict(int)
+        for counts in self.vehicle_counts_per_lane.values():
+            for v_type, count in counts.items():
+                global_counts[v_type] += count
+                
+        return {
+            "avg_speed": speed_total / speed_count if speed_count else 0,
+            "vehicle_counts": dict(global_counts),
+        }
+    
     def get_statistics(self) -> dict:
         """Calcula y devuelve todas las estadísticas acumuladas."""
         stats = { "lanes": {}, "global": {}, "log_preview": [] }
         
         # Estadísticas por carril
-        for lane_idx, speeds in self.speeds_per_lane.items():
-            if not speeds: continue
-            stats["lanes"][lane_idx] = {
-                "avg_speed": np.mean(speeds),
-                "min_speed": min(speeds),
-                "max_speed": max(speeds),
-                "vehicle_counts": self.vehicle_counts_per_lane[lane_idx],
-                "speed_dist": {
-                    "slow": len([s for s in speeds if s < 40]),
-                    "normal": len([s for s in speeds if 40 <= s < 60]),
-                    "fast": len([s for s in speeds if s >= 60]),
-                }
-            }
+        for lane_idx, summary in self.speed_stats.items():
+            if not summary.events: continue
+            stats["lanes"][lane_idx] = self._get_lane_statistics(lane_idx)
         
         # Estadísticas globales
-        all_speeds = [s for speeds in self.speeds_per_lane.values() for s in speeds]
-        stats["global"]["avg_speed"] = np.mean(all_speeds) if all_speeds else 0
+        stats["global"] = self._get_global_statistics()
         
-        global_counts = defaultdict(int)
-        for counts in self.vehicle_counts_per_lane.values():
-            for v_type, count in counts.items():
-                global_counts[v_type] += count
-        stats["global"]["vehicle_counts"] = global_counts
+        # Métricas de ventana deslizante
+        stats["rolling"] = self.rolling_metrics.get_all_windows(self.current_time)
         
         # Vista previa del log para el CSV
-        stats["log_preview"] = self.full_event_log[-5:] # Últimos 5 eventos
+        stats["log_preview"] = list(islice(self.full_event_log, max(0, len(self.full_event_log) - 5), None)) # Últimos 5 eventos
         
         return stats
-    
\ No newline at end of file
+    
+    def has_changes(self) -> bool:
+        """True si hay carriles o ventanas deslizantes con cambios sin publicar."""
+        return bool(self.dirty_lanes) or self.rolling_metrics.version != self._published_rolling_version
+    
+    def get_statistics_delta(self) -> dict:
+        """
+        Devuelve solo las estadísticas que cambiaron desde la última llamada.
+        
+        Returns:
+            dict: {"lanes": {lane_idx: lane_stats}, "global": {...}} con los carriles modificados,
+            "rolling" si las ventanas deslizantes avanzaron, o un dict vacío si no hubo cambios.
+        """
+        delta = {}
+        if self.dirty_lanes:
+            delta["lanes"] = {lane_idx: self._get_lane_statistics(lane_idx) for lane_idx in self.dirty_lanes}
+            delta["global"] = self._get_global_statistics()
+            self.dirty_lanes.clear()
+        
+        if self.rolling_metrics.version != self._published_rolling_version:
+            delta["rolling"] = self.rolling_metrics.get_all_windows(self.current_time)
+            self._published_rolling_version = self.rolling_metrics.version
+        return delta
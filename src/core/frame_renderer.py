@@ -0,0 +1,168 @@
+import cv2
+import threading
+import numpy as np
+
+
+class FrameRenderer:
+    def __init__(self):
+        """
+        Draw the analysis overlays on a frame downscaled to the display size.
+
+        The GUI downscales on the analysis thread (`fit`) and only draws on the GUI thread
+        (`render_scaled`); the video writer does both steps in `render`. The output buffer
+        is allocated once per target size and reused between frames, so rendering cost
+        depends on the widget size and not on the source resolution.
+        The static geometry (lanes, counting lines, labels, homography rectangle) is
+        rendered once into a cached layer and composited with a single copy per frame.
+        """
+        self.lane_polygons = []
+        self.counting_lines = []
+        self.homography_points = None
+        self._buffer = None
+        
+        # static overlay cache, rebuilt when the geometry or the output size changes
+        self._geometry_version = 0
+        self._static_key = None
+        self._static_layer = None
+        self._static_mask = None
+        
+        # geometry handed over by other threads, applied by the rendering thread before its next frame
+        self._pending_geometry = None
+        self._geometry_lock = threading.Lock()
+
+    def set_geometry(self, lane_polygons: list[np.ndarray], counting_lines: list, homography_points: list[tuple] = None):
+        """
+        Set the static geometry drawn on every frame and invalidate the cached layer.
+
+        Thread safe: the geometry is only stored here and applied by the rendering thread
+        at the start of its next frame, so a frame is never drawn with half of a change.
+
+        Args:
+            lane_polygons (list[np.ndarray]): Lane polygons in source pixel coordinates.
+            counting_lines (list[LineString]): Counting line of each lane.
+            homography_points (list[tuple]): The 4 points of the homography rectangle.
+        """
+        with self._geometry_lock:
+            self._pending_geometry = (lane_polygons, counting_lines, homography_points)
+
+    def _apply_pending_geometry(self):
+        with self._geometry_lock:
+            pending, self._pending_geometry = self._pending_geometry, None
+        if pending is None:
+            return
+        self.lane_polygons, self.counting_lines, self.homography_points = pending
+        self._geometry_version += 1
+
+    def _build_static_layer(self, width: int, height: int, scale: float):
+        """Render lanes, counting lines, lane labels and homography rectangle into the cached layer."""
+        layer = np.zeros((height, width, 3), dtype=np.uint8)
+        line_thickness, font_scale = self._get_dynamic_scale(width)
+
+        # homography rectangle
+        if self.homography_points and len(self.homography_points) == 4:
+            rect = (np.float32(self.homography_points) * scale).astype(np.int32)
+            cv2.polylines(layer, [rect], isClosed=True, color=(0, 0, 255), thickness=line_thickness)
+
+        # lanes, count lines and labels
+        for i, (polygon, line) in enumerate(zip(self.lane_polygons, self.counting_lines)):
+            scaled_polygon = (polygon * scale).astype(np.int32)
+            cv2.polylines(layer, [scaled_polygon], isClosed=True, color=(255, 255, 0), thickness=line_thickness)
+            (x1, y1), (x2, y2) = line.coords
+            cv2.line(layer, (int(x1 * scale), int(y1 * scale)), (int(x2 * scale), int(y2 * scale)), (0, 255, 255), line_thickness)
+            
+            label_x, label_y = scaled_polygon.min(axis=0)
+            cv2.putText(layer, f"Carril {i+1}", (int(label_x) + 5, int(label_y) + 20), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 0), line_thickness)
+
+        self._static_layer = layer
+        self._static_mask = layer.any(axis=2, keepdims=True)
+
+    def _get_dynamic_scale(self, width: int) -> tuple[int, float]:
+        """Line thickness and font scale for a given output width."""
+        scale_factor = width / 1280.0  # Normalizar basado en el tamaño de la vista
+        line_thickness = max(1, int(2 * scale_factor))
+        font_scale = max(0.4, 0.5 * scale_factor)
+        return line_thickness, font_scale
+
+    def _get_buffer(self, width: int, height: int) -> np.ndarray:
+        """Return the reusable output buffer, reallocating only when the size changes."""
+        if self._buffer is None or self._buffer.shape[:2] != (height, width):
+            self._buffer = np.empty((height, width, 3), dtype=np.uint8)
+        return self._buffer
+
+    @staticmethod
+    def fit(frame: np.ndarray, target_size: tuple[int, int]) -> tuple[np.ndarray, float]:
+        """
+        Downscale a frame to fit the target size, keeping the aspect ratio.
+
+        Returns:
+            tuple[np.ndarray, float]: New frame (not shared with any buffer) and the scale applied.
+        """
+        src_h, src_w = frame.shape[:2]
+        target_w, target_h = target_size
+        scale = min(target_w / src_w, target_h / src_h)
+        out_w, out_h = max(1, int(src_w * scale)), max(1, int(src_h * scale))
+        return cv2.resize(frame, (out_w, out_h), interpolation=cv2.INTER_AREA), scale
+
+    def render(self, frame: np.ndarray, boxes: np.ndarray, labels: list[str], target_size: tuple[int, int]) -> np.ndarray:
+        """
+        Downscale the frame to fit the target size, composite the static layer and draw detections.
+
+        Args:
+            frame (np.ndarray): Full resolution BGR frame.
+            boxes (np.ndarray): Detection boxes (N, 4) in xyxy source coordinates.
+            labels (list[str]): Text label of each box.
+            target_size (tuple[int, int]): Width and height of the display area.
+
+        Returns:
+            np.ndarray: The rendered BGR frame (the internal buffer, valid until the next call).
+        """
+        src_h, src_w = frame.shape[:2]
+        target_w, target_h = target_size
+        scale = min(target_w / src_w, target_h / src_h)
+        out_w, out_h = max(1, int(src_w * scale)), max(1, int(src_h * scale))
+
+        canvas = self._get_buffer(out_w, out_h)
+        cv2.resize(frame, (out_w, out_h), dst=canvas, interpolation=cv2.INTER_AREA)
+        return self._draw_overlay(canvas, boxes, labels, scale)
+
+    def render_scaled(self, frame: np.ndarray, boxes: np.ndarray, labels: list[str], scale: float) -> np.ndarray:
+        """
+        Draw the overlays on a frame already downscaled by `fit`; the frame itself is not modified.
+
+        Args:
+            frame (np.ndarray): BGR frame at display size.
+            boxes (np.ndarray): Detection boxes (N, 4) in xyxy source coordinates.
+            labels (list[str]): Text label of each box.
+            scale (float): Scale from source to display coordinates returned by `fit`.
+
+        Returns:
+            np.ndarray: The rendered BGR frame (the internal buffer, valid until the next call).
+        """
+        out_h, out_w = frame.shape[:2]
+        canvas = self._get_buffer(out_w, out_h)
+        np.copyto(canvas, frame)
+        return self._draw_overlay(canvas, boxes, labels, scale)
+
+    def _draw_overlay(self, canvas: np.ndarray, boxes: np.ndarray, labels: list[str], scale: float) -> np.ndarray:
+        """Composite the static layer and draw the detections on `canvas` in place."""
+        out_h, out_w = canvas.shape[:2]
+        if self._pending_geometry is not None:
+            self._apply_pending_geometry()
+
+        # static overlay: one composite per frame
+        static_key = (out_w, out_h, self._geometry_version)
+        if static_key != self._static_key:
+            self._build_static_layer(out_w, out_h, scale)
+            self._static_key = static_key
+        np.copyto(canvas, self._static_layer, where=self._static_mask)
+
+        line_thickness, font_scale = self._get_dynamic_scale(out_w)
+
+        # detections and speed
+        if len(boxes):
+            scaled_boxes = (np.asarray(boxes, dtype=np.float32) * scale).astype(np.int32)
+            for (x1, y1, x2, y2), label in zip(scaled_boxes.tolist(), labels):
+                cv2.rectangle(canvas, (x1, y1), (x2, y2), (0, 255, 0), line_thickness)
+                cv2.putText(canvas, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 255, 0), line_thickness)
+
+        return canvas
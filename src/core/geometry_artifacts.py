@@ -0,0 +1,79 @@
+import cv2
+import numpy as np
+import logging as log
+
+from .homography_manager import HomographyManager
+from utils.file_manager import ArtifactCache
+
+
+def geometry_key(lane_polygons: list, homography_config: dict, frame_size: tuple) -> str:
+    """Content hash of the inputs of the geometry artifacts."""
+    lanes = [[[int(x), int(y)] for x, y in lane] for lane in lane_polygons]
+    homography = {
+        "image_points": [[int(x), int(y)] for x, y in (homography_config or {}).get("image_points", [])],
+        "real_width_m": float((homography_config or {}).get("real_width_m") or 0),
+        "real_length_m": float((homography_config or {}).get("real_length_m") or 0),
+    }
+    return ArtifactCache.key(lanes, homography, [int(frame_size[0]), int(frame_size[1])])
+
+
+def lane_label_image(lane_polygons: list, frame_size: tuple) -> np.ndarray:
+    """(H, W) uint8 image with the lane index + 1 of every pixel, 0 outside the lanes."""
+    width, height = int(frame_size[0]), int(frame_size[1])
+    lane_labels = np.zeros((height, width), dtype=np.uint8)
+    for i, polygon in enumerate(lane_polygons):
+        cv2.fillPoly(lane_labels, [np.asarray(polygon, dtype=np.int32)], i + 1)
+    return lane_labels
+
+
+def compute_geometry_artifacts(lane_polygons: list, homography_config: dict, frame_size: tuple,
+                               world_step: int = 8) -> dict:
+    """
+    Derived geometry of a camera configuration.
+
+    Args:
+        lane_polygons (list): Lane polygons in pixel coordinates.
+        homography_config (dict): Homography points and real distances.
+        frame_size (tuple): (width, height) of the frames.
+        world_step (int): Pixels between samples of the pixel -> world table.
+
+    Returns:
+        dict: key, frame_size, homography_matrix (3x3, empty if the homography is invalid),
+        lane_labels (H, W uint8: lane index + 1, 0 outside the lanes), world_table and world_step.
+    """
+    width, height = int(frame_size[0]), int(frame_size[1])
+    lane_labels = lane_label_image(lane_polygons, (width, height))
+
+    hm = HomographyManager(homography_config or {})
+    world_table = hm.compute_world_table((height, width), world_step)
+    return {
+        "key": np.array(geometry_key(lane_polygons, homography_config, frame_size)),
+        "frame_size": np.array([width, height], dtype=np.int64),
+        "homography_matrix": hm.matrix if hm.matrix is not None else np.empty((0, 3)),
+        "lane_labels": lane_labels,
+        "world_table": world_table if world_table is not None else np.empty((0, 0, 2), dtype=np.float32),
+        "world_step": np.array(world_step, dtype=np.int64),
+    }
+
+
+def load_geometry_artifacts(cache: ArtifactCache, lane_polygons: list, homography_config: dict,
+                            frame_size: tuple) -> dict:
+    """Artifacts of a configuration from `cache`, computed and stored on the first use."""
+    key = geometry_key(lane_polygons, homography_config, frame_size)
+    artifacts = cache.load(key)
+    if artifacts is not None:
+        log.info(f"Geometría derivada cargada de la caché ({key})")
+        return artifacts
+
+    artifacts = compute_geometry_artifacts(lane_polygons, homography_config, frame_size)
+    try:
+        cache.save(key, artifacts)
+    except OSError as e:
+        log.error(f"No se pudo guardar la geometría derivada en la caché: {e}")
+    return artifacts
+
+
+def artifacts_match(artifacts: dict, lane_polygons: list, homography_config: dict) -> bool:
+    """True if `artifacts` were computed from this lane geometry and homography."""
+    frame_size = tuple(int(v) for v in artifacts["frame_size"])
+    return str(artifacts["key"]) == geometry_key(lane_polygons, homography_config, frame_size)
@@ -4,13 +4,25 @@ import logging as log
 
 
 class HomographyManager:
-    def __init__(self, homography_config: dict):
+    def __init__(self, homography_config: dict, matrix: np.ndarray = None):
         """
         Initialize the HomographyManager with a configuration dictionary.
         Args:
             homography_config (dict): A dictionary with coordinate points and real distances.
+            matrix (np.ndarray): Precomputed 3x3 matrix for this configuration (cached artifact).
         """
         self.matrix =None
+        self.world_table = None
+        self.world_step = None
+        if matrix is not None:
+            self.matrix = np.asarray(matrix, dtype=np.float64)
+        else:
+            self._calculate_homography_matrix(homography_config)
+        
+    def update(self, homography_config: dict):
+        """Recompute the matrix for new points / distances."""
+        self.matrix = None
+        self.world_table = None
         self._calculate_homography_matrix(homography_config)
         
     def _calculate_homography_matrix(self, config: dict):
@@ -62,4 +74,55 @@ class HomographyManager:
         transformed = cv2.perspectiveTransform(points_np, self.matrix)
         
         return [tuple(p[0]) for p in transformed] if transformed is not None else None
+    
+    def transform_array(self, points: np.ndarray) -> np.ndarray | None:
+        """
+        Transforma un array (N, 2) de puntos de la imagen a coordenadas del mundo real.
+        """
+        if self.matrix is None or len(points) == 0:
+            return None
+        
+        points_np = np.ascontiguousarray(points, dtype=np.float32).reshape(-1, 1, 2)
+        return cv2.perspectiveTransform(points_np, self.matrix).reshape(-1, 2)
+
+    
+    def compute_world_table(self, frame_shape: tuple, step: int = 8) -> np.ndarray | None:
+        """
+        Real world coordinates of a pixel grid (one sample every `step` pixels).
+        
+        Returns:
+            np.ndarray: (H // step + 1, W // step + 1, 2) float32 table, None without matrix.
+        """
+        if self.matrix is None:
+            return None
+        height, width = frame_shape[:2]
+        xs = np.arange(0, width + step, step, dtype=np.float32)
+        ys = np.arange(0, height + step, step, dtype=np.float32)
+        grid = np.stack(np.meshgrid(xs, ys), axis=-1)
+        return self.transform_array(grid.reshape(-1, 2)).reshape(len(ys), len(xs), 2)
+    
+    def set_world_table(self, table: np.ndarray, step: int):
+        """Use a precomputed pixel -> world table (see compute_world_table) for lookup_array."""
+        self.world_table = table
+        self.world_step = step
+    
+    def lookup_array(self, points: np.ndarray) -> np.ndarray | None:
+        """
+        Real world coordinates of (N, 2) image points by bilinear interpolation of the
+        pixel -> world table; falls back to the exact transform without table.
+        """
+        if self.world_table is None:
+            return self.transform_array(points)
+        if len(points) == 0:
+            return None
         
+        rows, cols = self.world_table.shape[:2]
+        grid = np.asarray(points, dtype=np.float32) / self.world_step
+        gx = np.clip(grid[:, 0], 0, cols - 1.001)
+        gy = np.clip(grid[:, 1], 0, rows - 1.001)
+        x0, y0 = gx.astype(np.int64), gy.astype(np.int64)
+        fx, fy = (gx - x0)[:, None], (gy - y0)[:, None]
+        t = self.world_table
+        top = t[y0, x0] * (1 - fx) + t[y0, x0 + 1] * fx
+        bottom = t[y0 + 1, x0] * (1 - fx) + t[y0 + 1, x0 + 1] * fx
+        return top * (1 - fy) + bottom * fy
@@ -3,8 +3,19 @@ import numpy as np
 
 
 class MaskProcessing:
-    def _init__(self):
-        pass
+    def __init__(self):
+        # la máscara solo cambia con la geometría o el tamaño del fotograma
+        self._mask = None
+        self._mask_key = None
+    
+    @staticmethod
+    def _key(frame_shape: tuple, lane_polygons: list) -> tuple:
+        return frame_shape[:2], b"".join(np.asarray(p, dtype=np.int32).tobytes() for p in lane_polygons)
+    
+    def preload(self, mask: np.ndarray, lane_polygons: list):
+        """Use a precomputed lane mask (cached artifact) for frames of its size."""
+        self._mask = np.where(mask > 0, 255, 0).astype(np.uint8)
+        self._mask_key = self._key(mask.shape, lane_polygons)
     
     def process_frame(self, frame: np.ndarray, lane_polygons: list[list[tuple[int, int]]]) -> np.ndarray:
         """
@@ -17,11 +28,13 @@ class MaskProcessing:
         Returns:
             np.ndarray: The processed frame with the mask applied.
         """
-        mask = np.zeros(frame.shape[:2], dtype=np.uint8)
-        
-        for polygon in lane_polygons:
-            cv2.fillPoly(mask, [polygon], 255)
+        key = self._key(frame.shape, lane_polygons)
+        if key != self._mask_key:
+            mask = np.zeros(frame.shape[:2], dtype=np.uint8)
+            for polygon in lane_polygons:
+                cv2.fillPoly(mask, [np.asarray(polygon, dtype=np.int32)], 255)
+            self._mask, self._mask_key = mask, key
         
-        masked_frame = cv2.bitwise_and(frame, frame, mask=mask)
+        masked_frame = cv2.bitwise_and(frame, frame, mask=self._mask)
         
         return masked_frame
\ No newline at end of file
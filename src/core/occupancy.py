@@ -0,0 +1,244 @@
+import os
+import cv2
+import numpy as np
+
+from .geometry_artifacts import lane_label_image
+
+
+class OccupancyMap:
+    def __init__(self, lane_polygons: list, cell_size: int = 8, bin_seconds: float = 60.0, max_bins: int = 1440,
+                 footprints: bool = True, lane_labels: np.ndarray = None):
+        """
+        Spatial occupancy of the scene: where vehicles are, how long they stay and how many
+        vehicles each lane holds over time.
+
+        Every frame adds its detections weighted by the frame duration, so the maps are in
+        vehicle-seconds:
+        - `dwell`: anchor points (road contact) scattered into a grid of `cell_size` pixels;
+        - footprints: the boxes, accumulated as a 2D difference array (4 scatter-adds per box)
+          whose prefix sum is only taken when the map is read;
+        - per lane: vehicle-seconds, seconds with at least one vehicle and a ring buffer of
+          `bin_seconds` bins with the mean number of vehicles (density over time).
+        Each update is a few scatter-adds over the detections of the frame, independent of
+        the grid size and of the session length.
+
+        Args:
+            lane_polygons (list): Lane polygons in pixel coordinates (see CountingProcessor).
+            cell_size (int): Pixels per grid cell.
+            bin_seconds (float): Time resolution of the lane density series.
+            max_bins (int): Bins kept in the density series (default 24 h of 1 min bins).
+            footprints (bool): Also accumulate the box footprints.
+            lane_labels (np.ndarray): Precomputed lane label image (see core.geometry_artifacts).
+        """
+        self.cell_size = cell_size
+        self.bin_seconds = bin_seconds
+        self.max_bins = max_bins
+        self.footprints = footprints
+
+        self.frame_size = None
+        self.dwell = None
+        self._footprint_diff = None
+        self.set_lanes(lane_polygons)
+        self._lane_labels = lane_labels
+
+        self.lane_seconds = np.zeros(self.num_lanes, dtype=np.float64)
+        self.lane_occupied_seconds = np.zeros(self.num_lanes, dtype=np.float64)
+        self.observed_seconds = 0.0
+        self.density = np.zeros((max_bins, self.num_lanes), dtype=np.float64)
+        self.start_time = None
+        self.current_bin = None
+
+    def set_lanes(self, lane_polygons: list):
+        """Replace the lane geometry; lane counters are kept for the lanes that remain."""
+        self.lane_polygons = [np.asarray(p, dtype=np.int32) for p in lane_polygons]
+        num_lanes = len(self.lane_polygons)
+        if self.frame_size is not None:
+            self._build_labels()
+        else:
+            self._lane_labels = None
+        if getattr(self, "num_lanes", num_lanes) != num_lanes:
+            keep = min(num_lanes, self.num_lanes)
+            for name in ("lane_seconds", "lane_occupied_seconds"):
+                resized = np.zeros(num_lanes, dtype=np.float64)
+                resized[:keep] = getattr(self, name)[:keep]
+                setattr(self, name, resized)
+            density = np.zeros((self.max_bins, num_lanes), dtype=np.float64)
+            density[:, :keep] = self.density[:, :keep]
+            self.density = density
+        self.num_lanes = num_lanes
+
+    def _build_labels(self):
+        self._lane_labels = lane_label_image(self.lane_polygons, self.frame_size)
+
+    def _allocate(self, width: int, height: int):
+        self.frame_size = (width, height)
+        grid_h, grid_w = -(-height // self.cell_size), -(-width // self.cell_size)
+        self.dwell = np.zeros((grid_h, grid_w), dtype=np.float64)
+        if self.footprints:
+            self._footprint_diff = np.zeros((grid_h + 1, grid_w + 1), dtype=np.float64)
+        if self._lane_labels is None or self._lane_labels.shape != (height, width):
+            self._build_labels()
+
+    def update(self, anchors: np.ndarray, boxes: np.ndarray, delta_t: float, timestamp: float, frame_shape: tuple):
+        """
+        Add the detections of one frame.
+
+        Args:
+            anchors (np.ndarray): (N, 2) anchor points in pixels (FrameDetections.anchors).
+            boxes (np.ndarray): (N, 4) xyxy boxes in pixels.
+            delta_t (float): Seconds represented by the frame.
+            timestamp (float): Epoch seconds of the frame.
+            frame_shape (tuple): Shape of the frame.
+        """
+        height, width = frame_shape[:2]
+        if self.frame_size != (width, height):
+            self._allocate(width, height)
+        self._advance(timestamp)
+        if delta_t <= 0:
+            return
+        self.observed_seconds += delta_t
+
+        lane_vehicles = np.zeros(self.num_lanes, dtype=np.int64)
+        if len(anchors):
+            x = np.clip(anchors[:, 0].astype(np.int64), 0, width - 1)
+            y = np.clip(anchors[:, 1].astype(np.int64), 0, height - 1)
+            cell = self.cell_size
+            np.add.at(self.dwell, (y // cell, x // cell), delta_t)
+
+            if self._footprint_diff is not None:
+                grid_h, grid_w = self.dwell.shape
+                x1 = np.clip(boxes[:, 0] // cell, 0, grid_w - 1).astype(np.int64)
+                y1 = np.clip(boxes[:, 1] // cell, 0, grid_h - 1).astype(np.int64)
+                x2 = np.clip(boxes[:, 2] // cell, 0, grid_w - 1).astype(np.int64) + 1
+                y2 = np.clip(boxes[:, 3] // cell, 0, grid_h - 1).astype(np.int64) + 1
+                diff = self._footprint_diff
+                np.add.at(diff, (y1, x1), delta_t)
+                np.add.at(diff, (y1, x2), -delta_t)
+                np.add.at(diff, (y2, x1), -delta_t)
+                np.add.at(diff, (y2, x2), delta_t)
+
+            # carril de cada vehículo según su punto de contacto (0: fuera de los carriles)
+            lanes = self._lane_labels[y, x]
+            lane_vehicles = np.bincount(lanes, minlength=self.num_lanes + 1)[1:self.num_lanes + 1]
+
+        self.lane_seconds += lane_vehicles * delta_t
+        self.lane_occupied_seconds += (lane_vehicles > 0) * delta_t
+        self.density[self.current_bin % self.max_bins] += lane_vehicles * (delta_t / self.bin_seconds)
+
+    def _advance(self, timestamp: float):
+        """Move the density ring buffer to the bin of `timestamp`, clearing the bins left behind."""
+        if self.start_time is None:
+            self.start_time = timestamp
+            self.current_bin = 0
+            return
+        target = int((timestamp - self.start_time) // self.bin_seconds)
+        if target <= self.current_bin:
+            return
+        steps = min(target - self.current_bin, self.max_bins)
+        for b in range(target - steps + 1, target + 1):
+            self.density[b % self.max_bins] = 0
+        self.current_bin = target
+
+    @property
+    def footprint(self) -> np.ndarray | None:
+        """Box coverage per cell in vehicle-seconds (prefix sum of the difference array)."""
+        if self._footprint_diff is None:
+            return None
+        return self._footprint_diff.cumsum(axis=0).cumsum(axis=1)[:-1, :-1]
+
+    def density_series(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Lane density over time, oldest bin first.
+
+        Returns:
+            tuple: (bin start times (B,), mean vehicles per lane in each bin (B, lanes));
+            the last bin is the current, partial one.
+        """
+        if self.current_bin is None:
+            return np.empty(0), np.empty((0, self.num_lanes))
+        first = max(0, self.current_bin - self.max_bins + 1)
+        bins = np.arange(first, self.current_bin + 1)
+        return self.start_time + bins * self.bin_seconds, self.density[bins % self.max_bins]
+
+    def lane_summary(self) -> dict:
+        """Per-lane mean vehicles present and fraction of time occupied (keys: lane index)."""
+        if self.observed_seconds <= 0:
+            return {}
+        return {
+            i: {
+                "mean_vehicles": float(self.lane_seconds[i] / self.observed_seconds),
+                "occupancy": float(self.lane_occupied_seconds[i] / self.observed_seconds),
+            }
+            for i in range(self.num_lanes)
+        }
+
+    def render_overlay(self, frame: np.ndarray, alpha: float = 0.5, source: str = "dwell") -> np.ndarray:
+        """
+        Heatmap blended over a frame (a copy). Cells without vehicles keep the frame.
+
+        Args:
+            frame (np.ndarray): BGR frame of any size (the map is scaled to it).
+            alpha (float): Heatmap opacity.
+            source (str): "dwell" (anchor points) or "footprint" (boxes).
+        """
+        grid = self.footprint if source == "footprint" else self.dwell
+        output = frame.copy()
+        if grid is None or not grid.any():
+            return output
+        # escala logarítmica: unas pocas celdas con mucha espera no ocultan el resto
+        values = np.log1p(grid)
+        heat = (values * (255.0 / values.max())).astype(np.uint8)
+        height, width = frame.shape[:2]
+        heat = cv2.resize(heat, (width, height), interpolation=cv2.INTER_LINEAR)
+        colored = cv2.applyColorMap(heat, cv2.COLORMAP_JET)
+        blended = cv2.addWeighted(frame, 1.0 - alpha, colored, alpha, 0)
+        visible = heat > 0
+        output[visible] = blended[visible]
+        return output
+
+    def save(self, path: str):
+        """Export the maps and lane series as a compressed .npz."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        times, density = self.density_series()
+        footprint = self.footprint
+        np.savez_compressed(
+            path,
+            cell_size=np.array(self.cell_size),
+            frame_size=np.array(self.frame_size or (0, 0)),
+            dwell=self.dwell if self.dwell is not None else np.empty((0, 0)),
+            footprint=footprint if footprint is not None else np.empty((0, 0)),
+            lane_seconds=self.lane_seconds,
+            lane_occupied_seconds=self.lane_occupied_seconds,
+            observed_seconds=np.array(self.observed_seconds),
+            density_times=times,
+            density=density,
+        )
+
+    def get_state(self) -> dict:
+        """Accumulated maps and counters (for checkpoints)."""
+        return {
+            "frame_size": self.frame_size,
+            "dwell": None if self.dwell is None else self.dwell.copy(),
+            "footprint_diff": None if self._footprint_diff is None else self._footprint_diff.copy(),
+            "lane_seconds": self.lane_seconds.copy(),
+            "lane_occupied_seconds": self.lane_occupied_seconds.copy(),
+            "observed_seconds": self.observed_seconds,
+            "density": self.density.copy(),
+            "start_time": self.start_time,
+            "current_bin": self.current_bin,
+        }
+
+    def set_state(self, state: dict):
+        if state["frame_size"] is not None:
+            self._allocate(*state["frame_size"])
+            self.dwell[:] = state["dwell"]
+            if self._footprint_diff is not None and state["footprint_diff"] is not None:
+                self._footprint_diff[:] = state["footprint_diff"]
+        self.lane_seconds[:] = state["lane_seconds"]
+        self.lane_occupied_seconds[:] = state["lane_occupied_seconds"]
+        self.observed_seconds = state["observed_seconds"]
+        self.density[:] = state["density"]
+        self.start_time = state["start_time"]
+        self.current_bin = state["current_bin"]
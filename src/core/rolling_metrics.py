@@ -0,0 +1,200 @@
+import numpy as np
+
+
+class RollingMetrics:
+    VEHICLE_TYPES = ["car", "motorcycle", "bus", "truck", "bicycle", "other"]
+
+    def __init__(self, num_lanes: int, windows: dict = None, bin_seconds: float = 10.0,
+                 speed_edges: list[float] = None, speeding_threshold: float = 60.0):
+        """
+        Sliding-window traffic metrics with fixed memory.
+
+        Counted events are accumulated into time bins of `bin_seconds` kept in a ring
+        buffer of per-lane, per-class arrays (counts, speed sums, speeding counts and a
+        speed histogram). Each window keeps running totals: when a bin leaves the window
+        it is subtracted, so rolling forward costs O(1) per bin regardless of session length.
+
+        Args:
+            num_lanes (int): Number of lanes.
+            windows (dict): Window name -> length in seconds. Defaults to 5 minutes and 1 hour.
+            bin_seconds (float): Time resolution of the ring buffer.
+            speed_edges (list[float]): Speed histogram bin edges in km/h.
+            speeding_threshold (float): Speed above which an event counts as speeding.
+        """
+        self.windows = windows or {"5min": 5 * 60, "1h": 60 * 60}
+        self.bin_seconds = bin_seconds
+        self.speed_edges = np.asarray(speed_edges if speed_edges is not None else np.arange(0, 161, 20), dtype=np.float64)
+        self.speeding_threshold = speeding_threshold
+        self.num_lanes = num_lanes
+
+        self.window_bins = {name: max(1, int(round(seconds / bin_seconds))) for name, seconds in self.windows.items()}
+        self.n_bins = max(self.window_bins.values())
+        n_types = len(self.VEHICLE_TYPES)
+        n_hist = len(self.speed_edges) + 1
+
+        # ring buffer (bin, carril, clase)
+        self.counts = np.zeros((self.n_bins, num_lanes, n_types), dtype=np.int32)
+        self.speed_sums = np.zeros((self.n_bins, num_lanes, n_types), dtype=np.float64)
+        self.speeding = np.zeros((self.n_bins, num_lanes, n_types), dtype=np.int32)
+        self.histograms = np.zeros((self.n_bins, num_lanes, n_hist), dtype=np.int32)
+
+        # totales acumulados de cada ventana
+        self.totals = {
+            name: {
+                "counts": np.zeros((num_lanes, n_types), dtype=np.int64),
+                "speed_sums": np.zeros((num_lanes, n_types), dtype=np.float64),
+                "speeding": np.zeros((num_lanes, n_types), dtype=np.int64),
+                "histograms": np.zeros((num_lanes, n_hist), dtype=np.int64),
+            }
+            for name in self.windows
+        }
+
+        self.start_time = None
+        self.current_bin = None
+        self.version = 0
+
+    def resize(self, num_lanes: int):
+        """Change the number of lanes keeping the data of the lanes that remain."""
+        if num_lanes == self.num_lanes:
+            return
+        keep = min(num_lanes, self.num_lanes)
+
+        def resized(array: np.ndarray, lane_axis: int) -> np.ndarray:
+            shape = list(array.shape)
+            shape[lane_axis] = num_lanes
+            new = np.zeros(shape, dtype=array.dtype)
+            index = [slice(None)] * array.ndim
+            index[lane_axis] = slice(0, keep)
+            new[tuple(index)] = array[tuple(index)]
+            return new
+
+        self.counts = resized(self.counts, 1)
+        self.speed_sums = resized(self.speed_sums, 1)
+        self.speeding = resized(self.speeding, 1)
+        self.histograms = resized(self.histograms, 1)
+        for totals in self.totals.values():
+            for key in totals:
+                totals[key] = resized(totals[key], 0)
+        self.num_lanes = num_lanes
+        self.version += 1
+
+    def get_state(self) -> dict:
+        """Ring buffer and window totals as plain arrays (for checkpoints)."""
+        return {
+            "counts": self.counts.copy(), "speed_sums": self.speed_sums.copy(),
+            "speeding": self.speeding.copy(), "histograms": self.histograms.copy(),
+            "totals": {name: {k: v.copy() for k, v in totals.items()} for name, totals in self.totals.items()},
+            "start_time": self.start_time, "current_bin": self.current_bin, "version": self.version,
+        }
+
+    def set_state(self, state: dict):
+        self.counts[:] = state["counts"]
+        self.speed_sums[:] = state["speed_sums"]
+        self.speeding[:] = state["speeding"]
+        self.histograms[:] = state["histograms"]
+        for name, totals in state["totals"].items():
+            for key, array in totals.items():
+                self.totals[name][key][:] = array
+        self.start_time = state["start_time"]
+        self.current_bin = state["current_bin"]
+        self.version = state["version"]
+
+    def _type_index(self, vehicle_type: str) -> int:
+        try:
+            return self.VEHICLE_TYPES.index(vehicle_type)
+        except ValueError:
+            return len(self.VEHICLE_TYPES) - 1
+
+    def _reset(self):
+        self.counts[:] = 0
+        self.speed_sums[:] = 0
+        self.speeding[:] = 0
+        self.histograms[:] = 0
+        for totals in self.totals.values():
+            for array in totals.values():
+                array[:] = 0
+
+    def advance(self, timestamp: float):
+        """Roll the windows forward to `timestamp`, expiring the bins that leave each window."""
+        new_bin = int(timestamp // self.bin_seconds)
+        if self.current_bin is None:
+            self.start_time = timestamp
+            self.current_bin = new_bin
+            return
+        if new_bin <= self.current_bin:
+            return
+
+        if new_bin - self.current_bin >= self.n_bins:
+            # salto mayor que todo el buffer: nada sigue dentro de las ventanas
+            self._reset()
+        else:
+            for b in range(self.current_bin + 1, new_bin + 1):
+                for name, k in self.window_bins.items():
+                    expired = (b - k) % self.n_bins
+                    totals = self.totals[name]
+                    totals["counts"] -= self.counts[expired]
+                    totals["speed_sums"] -= self.speed_sums[expired]
+                    totals["speeding"] -= self.speeding[expired]
+                    totals["histograms"] -= self.histograms[expired]
+                slot = b % self.n_bins
+                self.counts[slot] = 0
+                self.speed_sums[slot] = 0
+                self.speeding[slot] = 0
+                self.histograms[slot] = 0
+
+        self.current_bin = new_bin
+        self.version += 1
+
+    def add(self, timestamp: float, lane_idx: int, vehicle_type: str, speed: float):
+        """Add a counted event."""
+        self.advance(timestamp)
+        slot = self.current_bin % self.n_bins
+        type_idx = self._type_index(vehicle_type)
+        hist_idx = int(np.searchsorted(self.speed_edges, speed, side="right"))
+        is_speeding = int(speed > self.speeding_threshold)
+
+        self.counts[slot, lane_idx, type_idx] += 1
+        self.speed_sums[slot, lane_idx, type_idx] += speed
+        self.speeding[slot, lane_idx, type_idx] += is_speeding
+        self.histograms[slot, lane_idx, hist_idx] += 1
+        for totals in self.totals.values():
+            totals["counts"][lane_idx, type_idx] += 1
+            totals["speed_sums"][lane_idx, type_idx] += speed
+            totals["speeding"][lane_idx, type_idx] += is_speeding
+            totals["histograms"][lane_idx, hist_idx] += 1
+        self.version += 1
+
+    def get_window(self, name: str, timestamp: float = None) -> dict:
+        """
+        Metrics of one window per lane.
+
+        Returns:
+            dict: {lane_idx: {"count", "flow_rate" (veh/h), "mean_speed", "speeding_share",
+            "vehicle_counts", "speed_hist"}}
+        """
+        totals = self.totals[name]
+        window_seconds = self.windows[name]
+        if self.start_time is not None and timestamp is not None:
+            # al inicio de la sesión la ventana aún no está llena
+            window_seconds = min(window_seconds, max(self.bin_seconds, timestamp - self.start_time))
+
+        lane_counts = totals["counts"].sum(axis=1)
+        lane_speed_sums = totals["speed_sums"].sum(axis=1)
+        lane_speeding = totals["speeding"].sum(axis=1)
+
+        metrics = {}
+        for lane_idx in range(self.num_lanes):
+            count = int(lane_counts[lane_idx])
+            metrics[lane_idx] = {
+                "count": count,
+                "flow_rate": count * 3600.0 / window_seconds,
+                "mean_speed": float(lane_speed_sums[lane_idx] / count) if count else 0.0,
+                "speeding_share": float(lane_speeding[lane_idx] / count) if count else 0.0,
+                "vehicle_counts": {t: int(c) for t, c in zip(self.VEHICLE_TYPES, totals["counts"][lane_idx]) if c},
+                "speed_hist": totals["histograms"][lane_idx].tolist(),
+            }
+        return metrics
+
+    def get_all_windows(self, timestamp: float = None) -> dict:
+        """Metrics of every configured window: {window_name: {lane_idx: {...}}}."""
+        return {name: self.get_window(name, timestamp) for name in self.windows}
@@ -0,0 +1,244 @@
+import json
+import time
+import multiprocessing
+import logging as log
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from .analysis_pipeline import AnalysisPipeline
+from .counting_processor import CountingProcessor
+from .tracker import iou_matrix, match_by_iou
+from utils.file_manager import EventWriter
+from utils.event_sinks import EventDispatcher
+from models.vehicle import CountEvent
+
+# opciones de AnalysisPipeline que dependen de un único proceso con todos los fotogramas en orden
+# (carga del proceso, métricas en vivo, salidas por fotograma): no se pueden repartir por segmentos
+SEGMENT_UNSUPPORTED_OPTIONS = ("adaptive_params", "metrics", "video_output_params", "clip_params", "crop_params",
+                               "occupancy_params", "congestion_params")
+
+
+def plan_segments(total_frames: int, n_segments: int) -> list[tuple[int, int]]:
+    """Split [0, total_frames) into `n_segments` contiguous (start, end) frame ranges."""
+    n_segments = max(1, min(n_segments, total_frames))
+    bounds = np.linspace(0, total_frames, n_segments + 1).round().astype(int).tolist()
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def process_segment(task: dict) -> dict:
+    """
+    Analyze the frames of one segment in a worker process.
+
+    The worker starts `overlap` frames before its segment so tracks, line crossing history
+    and speed filters are warmed up; events of those frames belong to the previous segment
+    and are discarded when stitching. Tracks seen in the warm-up and in the last `overlap`
+    frames are returned to reconcile IDs with the neighbouring segments (the warm-up of a
+    segment covers the last frames of the previous one).
+
+    Returns:
+        dict: index, start, end, frames processed, events [(frame_idx, CountEvent)] and
+        head / tail tracks {frame_idx: (track_ids, boxes)}.
+    """
+    start, end, overlap, fps = task["start"], task["end"], task["overlap"], task["fps"]
+    first = max(0, start - overlap)
+    delta_t = 1.0 / fps
+
+    pipeline = AnalysisPipeline(task["lanes"], task["homography"], None, **task["options"])
+    cap = cv2.VideoCapture(task["source"])
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+
+    events, head, tail = [], {}, {}
+    frame_idx = first
+    try:
+        while frame_idx < end:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp = task["start_time"] + frame_idx / fps
+            new_events, detections, _ = pipeline.process_frame(frame, delta_t, timestamp)
+            events.extend((frame_idx, event) for event in new_events)
+
+            if detections.has_ids:
+                if frame_idx < start:
+                    head[frame_idx] = (detections.track_ids.copy(), detections.boxes.copy())
+                if frame_idx >= end - overlap:
+                    tail[frame_idx] = (detections.track_ids.copy(), detections.boxes.copy())
+            frame_idx += 1
+    finally:
+        pipeline.close()
+        cap.release()
+
+    return {
+        "index": task["index"], "start": start, "end": end, "frames": frame_idx - first,
+        "events": events, "head": head, "tail": tail,
+    }
+
+
+def reconcile_tracks(tail: dict, head: dict, min_iou: float = 0.5, min_votes: int = 3) -> dict[int, int]:
+    """
+    Match the track IDs of two segments over the frames both processed.
+
+    Boxes of every common frame are matched by IoU; each pair of IDs gets one vote per
+    frame and pairs are accepted one-to-one by descending votes.
+
+    Args:
+        tail (dict): {frame_idx: (track_ids, boxes)} at the end of the earlier segment.
+        head (dict): {frame_idx: (track_ids, boxes)} at the start of the later segment.
+        min_iou (float): Minimum IoU for a per-frame match.
+        min_votes (int): Minimum matched frames to accept a pair.
+
+    Returns:
+        dict: later segment ID -> earlier segment ID.
+    """
+    common_frames = sorted(set(tail) & set(head))
+    votes = defaultdict(int)
+    for frame_idx in common_frames:
+        ids_a, boxes_a = tail[frame_idx]
+        ids_b, boxes_b = head[frame_idx]
+        rows, cols = match_by_iou(iou_matrix(boxes_a, boxes_b), min_iou)
+        for a, b in zip(ids_a[rows].tolist(), ids_b[cols].tolist()):
+            votes[(b, a)] += 1
+
+    min_votes = max(1, min(min_votes, len(common_frames) // 2))
+    mapping, used = {}, set()
+    for (b, a), count in sorted(votes.items(), key=lambda item: -item[1]):
+        if count < min_votes:
+            break
+        if b not in mapping and a not in used:
+            mapping[b] = a
+            used.add(a)
+    return mapping
+
+
+def stitch_segments(results: list[dict], counter: CountingProcessor) -> list[CountEvent]:
+    """
+    Merge the events of all segments into one log with session-wide track IDs.
+
+    Each event is kept only by the segment that owns its frame. IDs are reconciled across
+    boundaries, so a vehicle already counted in a lane by the previous segment is not counted
+    again. Kept events are added to `counter`, in frame order.
+    """
+    results = sorted(results, key=lambda r: r["index"])
+    global_ids = [dict() for _ in results]
+    next_id = 1
+
+    def global_id(segment: int, local_id: int) -> int:
+        nonlocal next_id
+        ids = global_ids[segment]
+        if local_id not in ids:
+            ids[local_id] = next_id
+            next_id += 1
+        return ids[local_id]
+
+    stitched, counted = [], set()
+    for k, result in enumerate(results):
+        if k > 0:
+            mapping = reconcile_tracks(results[k - 1]["tail"], result["head"])
+            for local_id, previous_id in mapping.items():
+                global_ids[k][local_id] = global_id(k - 1, previous_id)
+            log.info(f"Segmento {k}: {len(mapping)} tracks reconciliados con el segmento anterior")
+
+        for frame_idx, event in sorted(result["events"], key=lambda item: item[0]):
+            if frame_idx < result["start"]:
+                continue  # calentamiento: pertenece al segmento anterior
+            event.track_id = global_id(k, event.track_id)
+            if (event.track_id, event.lane) in counted:
+                continue
+            counted.add((event.track_id, event.lane))
+            counter.record_event(event)
+            stitched.append(event)
+    return stitched
+
+
+def run_segmented(source: str, lane_polygons: list, homography_config: dict, events_out: str = None,
+                  stats_out: str = None, workers: int = None, segments: int = None, overlap_seconds: float = 2.0,
+                  start_time: float = None, **pipeline_options) -> dict:
+    """
+    Analyze one recording split in time segments processed in parallel worker processes.
+
+    Timestamps are video time (start_time + frame / fps). The result has the same structure
+    as a sequential headless run: one event log and one final statistics line.
+
+    Args:
+        source (str): Video file.
+        lane_polygons (list): Lane polygons in pixel coordinates.
+        homography_config (dict): Homography points and real distances.
+        events_out (str): Optional event log file (.csv, .db/.sqlite, .parquet).
+        stats_out (str): Optional JSON lines file for the final statistics.
+        workers (int): Worker processes, default the number of CPUs.
+        segments (int): Number of segments, default `workers`.
+        overlap_seconds (float): Warm-up processed before each segment and used to reconcile IDs.
+        start_time (float): Epoch seconds of the first frame, default now.
+        **pipeline_options: tracker, tracker_params, inference_mode, tiling_params, geometry_artifacts,
+            event_sinks (see AnalysisPipeline); the SEGMENT_UNSUPPORTED_OPTIONS raise ValueError.
+
+    Returns:
+        dict: Final statistics.
+    """
+    unsupported = [name for name in SEGMENT_UNSUPPORTED_OPTIONS if pipeline_options.get(name) is not None]
+    if unsupported:
+        raise ValueError(f"Opciones no disponibles en el procesamiento por segmentos: {', '.join(unsupported)}")
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        log.error(f"No se pudo abrir la fuente de video: {source}")
+        return {}
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if total_frames <= 0:
+        log.error(f"No se pudo determinar la duración de: {source}")
+        return {}
+
+    workers = workers or multiprocessing.cpu_count()
+    start_time = time.time() if start_time is None else start_time
+    overlap = int(round(overlap_seconds * fps))
+    # los eventos se envían desde este proceso, una vez unidos los segmentos
+    event_sinks = pipeline_options.pop("event_sinks", None)
+
+    tasks = [
+        {"index": i, "start": start, "end": end, "overlap": overlap, "fps": fps, "start_time": start_time,
+         "source": source, "lanes": lane_polygons, "homography": homography_config, "options": pipeline_options}
+        for i, (start, end) in enumerate(plan_segments(total_frames, segments or workers))
+    ]
+    log.info(f"{total_frames} fotogramas en {len(tasks)} segmentos, {workers} procesos, solape de {overlap} fotogramas")
+
+    results = []
+    started = time.time()
+    # spawn: los procesos hijos no heredan el estado de torch / CUDA del padre
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(process_segment, task) for task in tasks]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            log.info(f"Segmento {result['index']} terminado ({result['frames']} fotogramas, "
+                     f"{len(result['events'])} eventos) - {len(results)}/{len(tasks)}")
+
+    counter = CountingProcessor(lane_polygons)
+    events = stitch_segments(results, counter)
+    counter.current_time = start_time + total_frames / fps
+    counter.rolling_metrics.advance(counter.current_time)
+
+    if events_out:
+        writer = EventWriter(events_out)
+        writer.start()
+        writer.write(events)
+        writer.close()
+    if event_sinks:
+        dispatcher = EventDispatcher(event_sinks)
+        dispatcher.start()
+        dispatcher.publish(events)
+        dispatcher.close()
+
+    stats = counter.get_statistics()
+    stats.pop("log_preview", None)
+    if stats_out:
+        with open(stats_out, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"time": counter.current_time, "frame": total_frames, **stats}) + "\n")
+
+    log.info(f"{total_frames} fotogramas procesados en {time.time() - started:.1f} s, "
+             f"conteo total: {stats['global'].get('vehicle_counts', {})}")
+    return stats
@@ -20,6 +20,28 @@ class SpeedCalculator:
         kf.errorCovPost = np.eye(4, dtype=np.float32) * 1
         return kf
         
+    def get_state(self) -> dict:
+        """Kalman filter states (statePost, errorCovPost) and smoothed speeds (for checkpoints)."""
+        return {
+            "filters": {track_id: (kf.statePost.copy(), kf.errorCovPost.copy()) for track_id, kf in self.kalman_filters.items()},
+            "speed_history": dict(self.speed_history),
+        }
+        
+    def set_state(self, state: dict):
+        self.kalman_filters = {}
+        for track_id, (state_post, error_cov_post) in state["filters"].items():
+            kf = self._create_kalman_filter()
+            kf.statePost = np.asarray(state_post, dtype=np.float32)
+            kf.errorCovPost = np.asarray(error_cov_post, dtype=np.float32)
+            self.kalman_filters[track_id] = kf
+        self.speed_history = defaultdict(lambda: -1, state["speed_history"])
+        
+    def remove_tracks(self, track_ids: list[int]):
+        """Drop the filters and speeds of tracks that are gone."""
+        for track_id in track_ids:
+            self.kalman_filters.pop(track_id, None)
+            self.speed_history.pop(track_id, None)
+        
     def update_speed(self, track_id: int, image_point: tuple, delta_t: float) -> float:
         """
         Update the speed of an object based on its position in the image and its history.
@@ -31,6 +53,30 @@ class SpeedCalculator:
         Returns:
             float: The calculated speed in km/h.
         """
+        # Transformar la medición de la imagen a coordenadas del mundo real
+        real_world_point = self.hm.transform_points([image_point])
+        return self._update_filter(track_id, real_world_point[0] if real_world_point else None, delta_t)
+    
+    def update_speeds(self, track_ids: np.ndarray, image_points: np.ndarray, delta_t: float):
+        """
+        Update the speed of every tracked object of a frame.
+        
+        The image points of the whole frame are projected at once, through the cached
+        pixel -> world table when the pipeline set one (see HomographyManager.lookup_array).
+        
+        Args:
+            track_ids (np.ndarray): (N,) tracker IDs.
+            image_points (np.ndarray): (N, 2) anchor points in the image.
+            delta_t (float): Seconds since the previous frame.
+        """
+        if len(track_ids) == 0:
+            return
+        world_points = self.hm.lookup_array(image_points)
+        for i, track_id in enumerate(track_ids.tolist()):
+            self._update_filter(track_id, world_points[i] if world_points is not None else None, delta_t)
+    
+    def _update_filter(self, track_id: int, real_world_point, delta_t: float) -> float:
+        """Predict/correct the Kalman filter of an object with a real world measurement."""
         # iniciar el filtro de Kalman si no existe
         if track_id not in self.kalman_filters:
             self.kalman_filters[track_id] = self._create_kalman_filter()
@@ -44,10 +90,8 @@ class SpeedCalculator:
         # Predecir el siguiente estado
         kf.predict()
         
-        # Transformar la medición de la imagen a coordenadas del mundo real
-        real_world_point = self.hm.transform_points([image_point])
-        if real_world_point:
-            measurement = np.array(real_world_point[0], dtype=np.float32)
+        if real_world_point is not None:
+            measurement = np.array(real_world_point, dtype=np.float32).reshape(2, 1)
             
             # Corregir el estado del filtro con la nueva medición
             kf.correct(measurement)
@@ -0,0 +1,166 @@
+import cv2
+import numpy as np
+import logging as log
+
+from models.detection import FrameDetections, VehicleDetectionInterface
+
+
+def compute_tiles(lane_polygons: list, frame_shape: tuple, tile_size: int = 640, overlap: float = 0.2) -> np.ndarray:
+    """
+    Overlapping square tiles covering the lanes.
+
+    A regular grid is laid over the bounding box of all lane polygons and only the tiles
+    that contain some lane pixel are kept, so nothing is spent on off-road areas.
+
+    Args:
+        lane_polygons (list): Lane polygons in pixel coordinates.
+        frame_shape (tuple): (height, width) of the frame.
+        tile_size (int): Tile side in pixels (the model input size).
+        overlap (float): Fraction of the tile shared with its neighbour.
+
+    Returns:
+        np.ndarray: (T, 4) int32 tiles as x1, y1, x2, y2.
+    """
+    height, width = frame_shape[:2]
+    lane_mask = np.zeros((height, width), dtype=np.uint8)
+    for polygon in lane_polygons:
+        cv2.fillPoly(lane_mask, [np.asarray(polygon, dtype=np.int32)], 1)
+
+    ys, xs = np.nonzero(lane_mask)
+    if len(xs) == 0:
+        return np.empty((0, 4), dtype=np.int32)
+
+    size_x, size_y = min(tile_size, width), min(tile_size, height)
+    step_x = max(1, int(size_x * (1 - overlap)))
+    step_y = max(1, int(size_y * (1 - overlap)))
+
+    def starts(lo: int, hi: int, size: int, step: int, limit: int) -> np.ndarray:
+        # inicios repartidos uniformemente sobre [lo, hi]: solape >= overlap, sin tile final casi duplicado
+        lo = min(lo, limit - size)
+        last = min(max(hi - size + 1, lo), limit - size)
+        count = int(np.ceil((last - lo) / step)) + 1
+        return np.unique(np.linspace(lo, last, count).round().astype(np.int64))
+
+    x_starts = starts(xs.min(), xs.max(), size_x, step_x, width)
+    y_starts = starts(ys.min(), ys.max(), size_y, step_y, height)
+    grid_x, grid_y = np.meshgrid(x_starts, y_starts)
+    tiles = np.stack([grid_x.ravel(), grid_y.ravel(), grid_x.ravel() + size_x, grid_y.ravel() + size_y], axis=1)
+
+    # descartar tiles sin píxeles de carril (tabla integral: suma por tile en O(1))
+    integral = cv2.integral(lane_mask)
+    x1, y1, x2, y2 = tiles.T
+    lane_pixels = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+    return tiles[lane_pixels > 0].astype(np.int32)
+
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray,
+                        threshold: float = 0.5, metric: str = "ios") -> np.ndarray:
+    """
+    Class-aware greedy NMS.
+
+    With metric="ios" (intersection over the smaller box) a box cut by a tile border is
+    suppressed by the complete box of the neighbouring tile even if their IoU is low.
+
+    Returns:
+        np.ndarray: Indices of the kept boxes, by descending score.
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # desplazar cada clase a una región disjunta para hacer una sola pasada
+    offsets = class_ids.astype(np.float32)[:, None] * (boxes.max() + 1)
+    shifted = boxes + offsets
+    areas = (shifted[:, 2] - shifted[:, 0]) * (shifted[:, 3] - shifted[:, 1])
+    order = np.argsort(-scores)
+    keep = []
+    while len(order):
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        if not len(rest):
+            break
+        w = np.clip(np.minimum(shifted[i, 2], shifted[rest, 2]) - np.maximum(shifted[i, 0], shifted[rest, 0]), 0, None)
+        h = np.clip(np.minimum(shifted[i, 3], shifted[rest, 3]) - np.maximum(shifted[i, 1], shifted[rest, 1]), 0, None)
+        intersection = w * h
+        if metric == "ios":
+            overlap = intersection / np.maximum(np.minimum(areas[i], areas[rest]), 1e-6)
+        else:
+            overlap = intersection / np.maximum(areas[i] + areas[rest] - intersection, 1e-6)
+        order = rest[overlap < threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+class TiledDetector:
+    def __init__(self, detector: VehicleDetectionInterface, lane_polygons: list, tile_size: int = 640,
+                 overlap: float = 0.2, nms_threshold: float = 0.5, include_full_frame: bool = True):
+        """
+        Detection on overlapping tiles of the lane ROI, run as one batch.
+
+        Tiles are computed from the lane polygons on the first frame (its size is needed).
+        With `include_full_frame` the whole frame is added to the batch at model resolution
+        so vehicles bigger than a tile are still detected. Results of all crops are moved
+        back to frame coordinates and merged with cross-tile NMS; the output has no IDs and
+        is meant to be fed to core.tracker.ByteTracker.
+
+        Args:
+            detector (VehicleDetectionInterface): Detector with `detect_batch`.
+            lane_polygons (list): Lane polygons in pixel coordinates.
+            tile_size (int): Tile side in pixels, also used as model input size.
+            overlap (float): Fraction of overlap between neighbouring tiles.
+            nms_threshold (float): Intersection over smaller box above which boxes are merged.
+            include_full_frame (bool): Also run the full frame in the batch.
+        """
+        self.detector = detector
+        self.lane_polygons = lane_polygons
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.nms_threshold = nms_threshold
+        self.include_full_frame = include_full_frame
+        self.tiles = None
+        self._frame_shape = None
+
+    def set_lanes(self, lane_polygons: list):
+        """New lane geometry, tiles are recomputed on the next frame."""
+        self.lane_polygons = lane_polygons
+        self.tiles = None
+
+    def _ensure_tiles(self, frame_shape: tuple):
+        if self.tiles is None or self._frame_shape != frame_shape[:2]:
+            self._frame_shape = frame_shape[:2]
+            self.tiles = compute_tiles(self.lane_polygons, frame_shape, self.tile_size, self.overlap)
+            log.info(f"Inferencia por tiles: {len(self.tiles)} tiles de {self.tile_size}px")
+
+    def detect(self, frame: np.ndarray, classes_to_detect: list[int] = None) -> FrameDetections:
+        """
+        Args:
+            frame (np.ndarray): BGR frame (usually already masked to the lanes).
+            classes_to_detect (list[int]): Class IDs to keep.
+
+        Returns:
+            FrameDetections: Merged detections without track IDs.
+        """
+        self._ensure_tiles(frame.shape)
+
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in self.tiles.tolist()]
+        origins = [(x1, y1) for x1, y1, _, _ in self.tiles.tolist()]
+        if self.include_full_frame or not crops:
+            crops.append(frame)
+            origins.append((0, 0))
+
+        results_list, class_names = self.detector.detect_batch(crops, classes_to_detect, self.tile_size)
+
+        # data: [x1, y1, x2, y2, conf, cls] por crop -> coordenadas del fotograma
+        parts = []
+        for results, (ox, oy) in zip(results_list, origins):
+            data = results.boxes.data.cpu().numpy()
+            if len(data):
+                data = data[:, [0, 1, 2, 3, -2, -1]].astype(np.float32)
+                data[:, [0, 2]] += ox
+                data[:, [1, 3]] += oy
+                parts.append(data)
+        if not parts:
+            return FrameDetections.empty(class_names)
+
+        data = np.concatenate(parts)
+        keep = non_max_suppression(data[:, :4], data[:, 4], data[:, 5], self.nms_threshold)
+        data = data[keep]
+        return FrameDetections(data[:, :4], None, data[:, 5], data[:, 4], class_names)
@@ -0,0 +1,191 @@
+import numpy as np
+
+from models.detection import FrameDetections
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # sin scipy se usa la asignación greedy
+    linear_sum_assignment = None
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes."""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-6)
+
+
+def match_by_iou(iou: np.ndarray, min_iou: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Assign rows to columns maximizing IoU, keeping only pairs with IoU >= min_iou.
+
+    Returns:
+        tuple: (row indices, column indices) of the matched pairs.
+    """
+    if iou.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(-iou)
+    else:
+        # greedy: pares ordenados por IoU descendente, cada fila/columna una sola vez
+        flat_order = np.argsort(-iou, axis=None)
+        rows_all, cols_all = np.unravel_index(flat_order, iou.shape)
+        used_rows, used_cols = np.zeros(iou.shape[0], bool), np.zeros(iou.shape[1], bool)
+        rows, cols = [], []
+        for r, c in zip(rows_all.tolist(), cols_all.tolist()):
+            if iou[r, c] < min_iou:
+                break
+            if not used_rows[r] and not used_cols[c]:
+                used_rows[r] = used_cols[c] = True
+                rows.append(r)
+                cols.append(c)
+        rows, cols = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+
+    keep = iou[rows, cols] >= min_iou
+    return rows[keep], cols[keep]
+
+
+class ByteTracker:
+    def __init__(self, high_thresh: float = 0.5, low_thresh: float = 0.1, new_track_thresh: float = 0.6,
+                 match_iou: float = 0.2, low_match_iou: float = 0.5, track_buffer: int = 30):
+        """
+        Vectorized IoU tracker with ByteTrack's two-stage association.
+
+        Track state is kept in NumPy arrays (boxes, velocities, IDs, classes, frames since
+        last match). Each frame: boxes are predicted with a constant velocity model, high
+        confidence detections are matched to all tracks, low confidence detections to the
+        remaining tracks that were seen in the previous frame, and unmatched high
+        confidence detections start new tracks. Tracks not matched for more than
+        `track_buffer` frames are removed.
+
+        Args:
+            high_thresh (float): Minimum confidence for the first association.
+            low_thresh (float): Minimum confidence for the second association.
+            new_track_thresh (float): Minimum confidence to start a track.
+            match_iou (float): Minimum IoU in the first association.
+            low_match_iou (float): Minimum IoU in the second association.
+            track_buffer (int): Frames a lost track is kept before removal.
+        """
+        self.high_thresh = high_thresh
+        self.low_thresh = low_thresh
+        self.new_track_thresh = new_track_thresh
+        self.match_iou = match_iou
+        self.low_match_iou = low_match_iou
+        self.track_buffer = track_buffer
+        self.reset()
+
+    def reset(self):
+        self.boxes = np.empty((0, 4), dtype=np.float32)
+        self.velocities = np.empty((0, 4), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.class_ids = np.empty(0, dtype=np.int64)
+        self.lost = np.empty(0, dtype=np.int32)
+        self.next_id = 1
+        self.frame_id = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_state(self) -> dict:
+        """Tracker state as plain arrays (for checkpoints)."""
+        return {
+            "boxes": self.boxes.copy(), "velocities": self.velocities.copy(), "ids": self.ids.copy(),
+            "class_ids": self.class_ids.copy(), "lost": self.lost.copy(),
+            "next_id": self.next_id, "frame_id": self.frame_id,
+        }
+
+    def set_state(self, state: dict):
+        self.boxes = np.asarray(state["boxes"], dtype=np.float32)
+        self.velocities = np.asarray(state["velocities"], dtype=np.float32)
+        self.ids = np.asarray(state["ids"], dtype=np.int64)
+        self.class_ids = np.asarray(state["class_ids"], dtype=np.int64)
+        self.lost = np.asarray(state["lost"], dtype=np.int32)
+        self.next_id = int(state["next_id"])
+        self.frame_id = int(state["frame_id"])
+
+    def update(self, detections: FrameDetections) -> FrameDetections:
+        """
+        Associate the detections of a frame with the existing tracks.
+
+        Args:
+            detections (FrameDetections): Detections without IDs.
+
+        Returns:
+            FrameDetections: The detections assigned to a track, with their track IDs.
+        """
+        self.frame_id += 1
+        confidences = detections.confidences
+        det_boxes = detections.boxes
+        n_tracks = len(self.ids)
+
+        # 1. predicción de movimiento constante
+        predicted = self.boxes + self.velocities
+        assigned = np.full(len(detections), -1, dtype=np.int64)   # detección -> índice de track
+        track_matched = np.zeros(n_tracks, dtype=bool)
+
+        # 2. primera asociación: detecciones de alta confianza con todos los tracks
+        high = np.flatnonzero(confidences >= self.high_thresh)
+        rows, cols = match_by_iou(iou_matrix(predicted, det_boxes[high]), self.match_iou)
+        assigned[high[cols]] = rows
+        track_matched[rows] = True
+
+        # 3. segunda asociación: baja confianza con tracks vistos en el fotograma anterior
+        low = np.flatnonzero((confidences >= self.low_thresh) & (confidences < self.high_thresh))
+        remaining = np.flatnonzero(~track_matched & (self.lost == 0))
+        if len(low) and len(remaining):
+            rows, cols = match_by_iou(iou_matrix(predicted[remaining], det_boxes[low]), self.low_match_iou)
+            assigned[low[cols]] = remaining[rows]
+            track_matched[remaining[rows]] = True
+
+        # 4. actualizar tracks asociados
+        matched_dets = np.flatnonzero(assigned >= 0)
+        matched_tracks = assigned[matched_dets]
+        if len(matched_dets):
+            new_boxes = det_boxes[matched_dets]
+            self.velocities[matched_tracks] = 0.5 * self.velocities[matched_tracks] + 0.5 * (new_boxes - self.boxes[matched_tracks])
+            self.boxes[matched_tracks] = new_boxes
+            self.class_ids[matched_tracks] = detections.class_ids[matched_dets]
+            self.lost[matched_tracks] = 0
+
+        # 5. tracks no asociados: avanzan con la predicción y envejecen
+        unmatched_tracks = np.flatnonzero(~track_matched)
+        self.boxes[unmatched_tracks] = predicted[unmatched_tracks]
+        self.lost[unmatched_tracks] += 1
+
+        # 6. nuevos tracks a partir de detecciones de alta confianza sin asociar
+        new_dets = np.flatnonzero((assigned < 0) & (confidences >= self.new_track_thresh))
+        if len(new_dets):
+            new_ids = np.arange(self.next_id, self.next_id + len(new_dets), dtype=np.int64)
+            self.next_id += len(new_dets)
+            assigned[new_dets] = np.arange(n_tracks, n_tracks + len(new_dets))
+            self.boxes = np.concatenate([self.boxes, det_boxes[new_dets]])
+            self.velocities = np.concatenate([self.velocities, np.zeros((len(new_dets), 4), dtype=np.float32)])
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.class_ids = np.concatenate([self.class_ids, detections.class_ids[new_dets]])
+            self.lost = np.concatenate([self.lost, np.zeros(len(new_dets), dtype=np.int32)])
+
+        # 7. resultado: detecciones con ID, en el orden original
+        output = np.flatnonzero(assigned >= 0)
+        tracked = FrameDetections(
+            det_boxes[output], self.ids[assigned[output]], detections.class_ids[output],
+            confidences[output], detections.class_names,
+        )
+
+        # 8. eliminar tracks perdidos demasiado tiempo
+        alive = self.lost <= self.track_buffer
+        if not alive.all():
+            self.boxes, self.velocities = self.boxes[alive], self.velocities[alive]
+            self.ids, self.class_ids, self.lost = self.ids[alive], self.class_ids[alive], self.lost[alive]
+
+        return tracked
@@ -13,7 +13,7 @@ from models.detection import VehicleDetectionInterface
 
 
 class VehicleDetection(VehicleDetectionInterface):
-    def __init__(self):
+    def __init__(self, model_name: str = "yolo11s.pt", imgsz: int = 640):
         # device
         if torch.backends.mps.is_available():
             self.device = torch.device("mps")
@@ -25,17 +25,38 @@ class VehicleDetection(VehicleDetectionInterface):
             self.device = torch.device("cpu")
             log.info("Using CPU for PyTorch")
 
-        # model
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        vehicle_model_path = os.path.join(base_dir, "detection_models", "yolo11s.pt")
-        
-        try:
-            self.vehicle_model: YOLO = YOLO(vehicle_model_path).to(self.device)
-            log.info(f"model loaded succesfully using: {self.device}")
-        except Exception as e:
-            log.error(f"model not loaded: {e}")
-            raise
-        
+        # model: loaded models are kept so switching variants does not reload weights
+        self.models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "detection_models")
+        self._models: dict[str, YOLO] = {}
+        self.model_name = None
+        self.imgsz = imgsz
+        self.set_model(model_name, imgsz)
+
+    def _load_model(self, model_name: str) -> YOLO:
+        if model_name not in self._models:
+            try:
+                self._models[model_name] = YOLO(os.path.join(self.models_dir, model_name)).to(self.device)
+                log.info(f"model {model_name} loaded succesfully using: {self.device}")
+            except Exception as e:
+                log.error(f"model not loaded: {e}")
+                raise
+        return self._models[model_name]
+
+    def set_model(self, model_name: str, imgsz: int = None):
+        """Switch the model variant (e.g. yolo11n.pt / yolo11s.pt) and optionally the input size."""
+        self.vehicle_model: YOLO = self._load_model(model_name)
+        self.model_name = model_name
+        if imgsz:
+            self.imgsz = imgsz
+
 
     def inference(self, image: np.ndarray, classes_to_detect: list[int] = None) -> tuple[list[Results], dict[int, str]]:
-        return self.vehicle_model.track(image, conf=0.3, verbose=False, persist=True, imgsz=640, stream=True, half=True, classes=classes_to_detect), self.vehicle_model.names
+        return self.vehicle_model.track(image, conf=0.3, verbose=False, persist=True, imgsz=self.imgsz, stream=True, half=True, classes=classes_to_detect), self.vehicle_model.names
+
+    def detect(self, image: np.ndarray, classes_to_detect: list[int] = None) -> tuple[list[Results], dict[int, str]]:
+        """Detection only (no tracking), for use with a project-side tracker."""
+        return self.vehicle_model.predict(image, conf=0.1, verbose=False, imgsz=self.imgsz, stream=True, half=True, classes=classes_to_detect), self.vehicle_model.names
+
+    def detect_batch(self, images: list[np.ndarray], classes_to_detect: list[int] = None, imgsz: int = 640) -> tuple[list[Results], dict[int, str]]:
+        """Detection only on several images in a single forward pass (one Results per image)."""
+        return self.vehicle_model.predict(images, conf=0.1, verbose=False, imgsz=imgsz, half=True, classes=classes_to_detect), self.vehicle_model.names
@@ -0,0 +1,113 @@
+import os
+import queue
+import threading
+import logging as log
+
+import cv2
+import numpy as np
+
+from .frame_renderer import FrameRenderer
+
+
+class AnnotatedVideoWriter:
+    def __init__(self, path: str, output_size: tuple[int, int] = None, fps: float = None, frame_step: int = 1,
+                 codec: str = "mp4v", max_queue: int = 16):
+        """
+        Annotated output video (lanes, counting lines, boxes, IDs, speeds) for audits.
+
+        Frames are rendered with the same FrameRenderer as the GUI and encoded on a worker
+        thread (resize, drawing and encoding run in OpenCV without holding the GIL). The
+        analysis thread only enqueues the frame and its boxes; when the queue is full the
+        frame is skipped and counted in `frames_dropped`, so analysis speed is not tied to
+        the encoder.
+
+        Args:
+            path (str): Output video file.
+            output_size (tuple[int, int]): Maximum (width, height), the aspect ratio is kept;
+                default the source resolution.
+            fps (float): Source frame rate; the output runs at fps / frame_step.
+            frame_step (int): Write one frame out of `frame_step`.
+            codec (str): FourCC of the output (e.g. "mp4v", "avc1", "XVID", "MJPG").
+            max_queue (int): Frames waiting for the encoder before new ones are skipped.
+        """
+        self.path = path
+        self.output_size = output_size
+        self.fps = fps
+        self.frame_step = max(1, frame_step)
+        self.codec = codec
+        self.max_queue = max_queue
+
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self._frame_count = 0
+        self._renderer = FrameRenderer()
+        self._writer = None
+        self._failed = False
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="AnnotatedVideoWriter", daemon=True)
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread.start()
+
+    def set_geometry(self, lane_polygons: list, counting_lines: list, homography_points: list = None):
+        """Static overlay of the next frames (see FrameRenderer.set_geometry)."""
+        self._queue.put(("geometry", (lane_polygons, counting_lines, homography_points)))
+
+    def write(self, frame: np.ndarray, boxes: np.ndarray, labels: list[str]):
+        """Offer an analyzed frame (not copied: the caller must not modify it afterwards)."""
+        self._frame_count += 1
+        if (self._frame_count - 1) % self.frame_step:
+            return
+        if self._queue.qsize() >= self.max_queue:
+            self.frames_dropped += 1
+            return
+        self._queue.put(("frame", (frame, boxes, labels)))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def close(self):
+        """Encode the queued frames and close the file."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        log.info(f"Video anotado cerrado: {self.path} ({self.frames_written} fotogramas, "
+                 f"{self.frames_dropped} omitidos)")
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                kind, payload = item
+                if kind == "geometry":
+                    self._renderer.set_geometry(*payload)
+                    continue
+                if self._failed:
+                    continue
+                try:
+                    self._encode(*payload)
+                except Exception as e:
+                    log.error(f"Error al escribir el video anotado {self.path}: {e}")
+                    self._failed = True
+        finally:
+            if self._writer is not None:
+                self._writer.release()
+
+    def _encode(self, frame: np.ndarray, boxes: np.ndarray, labels: list[str]):
+        height, width = frame.shape[:2]
+        canvas = self._renderer.render(frame, boxes, labels, self.output_size or (width, height))
+        if self._writer is None:
+            fps = (self.fps or 30.0) / self.frame_step
+            out_h, out_w = canvas.shape[:2]
+            self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.codec), fps, (out_w, out_h))
+            if not self._writer.isOpened():
+                raise IOError(f"No se pudo abrir el codificador {self.codec} para {self.path}")
+            log.info(f"Video anotado: {self.path} ({out_w}x{out_h}, {fps:.1f} fps, {self.codec})")
+        self._writer.write(canvas)
+        self.frames_written += 1
@@ -1,22 +1,22 @@
+import os
 import cv2
 import time
 import numpy as np
+import threading
 import logging as log
 
 from PySide6.QtCore import QThread, Signal
 from PySide6.QtGui import QImage
 
-from .vehicle_detector import VehicleDetection
-from .counting_processor import CountingProcessor
-from .homography_manager import HomographyManager
-from .speed_calculator import SpeedCalculator
-from .mask_processor import MaskProcessing
+from .analysis_pipeline import AnalysisPipeline
+from .frame_renderer import FrameRenderer
+from utils.file_manager import load_checkpoint, save_checkpoint
+from utils.memory_monitor import rss_bytes
 
 log.basicConfig(level=log.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 
 class VideoProcessor(QThread):
-    frameReady = Signal(QImage)
     analysisResult = Signal(dict)
     finished = Signal()
     
@@ -27,15 +27,122 @@ class VideoProcessor(QThread):
         self.lane_config = None
         self.homography_config = None
         
+        # display: the analysis loop publishes the latest frame downscaled to the display size,
+        # the GUI draws the overlays at its own rate
+        self.renderer = FrameRenderer()
+        self._display_size = (1280, 720)
+        self._latest_frame = None
+        self._displayed_frame_idx = -1
+        
+        # stats: coalesced deltas published at most every `stats_interval` seconds
+        self.stats_interval = 0.5
+        
+        # events: streamed to disk by a background writer when an output path is set
+        self.event_output_path = None
+        
+        # live reconfiguration: the latest pending (lanes, homography) is applied at the next frame boundary
+        self._pending_config = None
+        self._config_lock = threading.Lock()
+        
+        # checkpoints: periodic state snapshots so an interrupted run resumes where it stopped
+        self.checkpoint_path = None
+        self.checkpoint_interval = 60.0
+        
+        # pipeline options of this camera: tracker and inference mode (see AnalysisPipeline)
+        self.pipeline_options = {}
+        
+        # memory: RSS and sizes of the analysis structures logged every `memory_log_interval` seconds
+        self.memory_log_interval = 300.0
+        
     def set_analysis_config(self, lane_polygons: list, homography_config: dict):
         self.lane_config = lane_polygons
         self.homography_config = homography_config
     
+    def update_config(self, lane_polygons: list = None, homography_config: dict = None):
+        """
+        Push new lanes and/or homography into the running analysis (thread safe).
+        
+        Updates arriving before the next frame are merged; they are applied together
+        between two frames, so a frame never sees half of a change.
+        """
+        with self._config_lock:
+            pending_lanes, pending_homography = self._pending_config or (None, None)
+            self._pending_config = (
+                lane_polygons if lane_polygons is not None else pending_lanes,
+                homography_config if homography_config is not None else pending_homography,
+            )
+        if lane_polygons is not None:
+            self.lane_config = lane_polygons
+        if homography_config is not None:
+            self.homography_config = homography_config
+        
+    def _apply_pending_config(self, pipeline: AnalysisPipeline):
+        with self._config_lock:
+            pending, self._pending_config = self._pending_config, None
+        if pending is None:
+            return
+        pipeline.reconfigure(*pending)
+        counter = pipeline.counter
+        self.renderer.set_geometry(counter.lane_polygons, counter.counting_lines, pipeline.homography_config.get("image_points"))
+        
     def set_video_source(self, source):
         self.video_source = source
         
+    def set_event_output(self, path: str | None):
+        """Set the file (.csv, .db/.sqlite, .parquet) where counted events are streamed, None disables it."""
+        self.event_output_path = path
+        
+    def set_checkpoint(self, path: str | None, interval: float = 60.0):
+        """Save the analysis state to `path` every `interval` seconds and resume from it on the next run."""
+        self.checkpoint_path = path
+        self.checkpoint_interval = interval
+        
+    def set_tracker(self, tracker: str, params: dict = None):
+        """Select the tracker of this camera and its parameters (used from the next run)."""
+        self.pipeline_options.update(tracker=tracker, tracker_params=params or {})
+        
+    def set_inference_mode(self, mode: str, tiling_params: dict = None):
+        """"full" or "tiled" inference over the lanes (used from the next run)."""
+        self.pipeline_options.update(inference_mode=mode, tiling_params=tiling_params or {})
+        
+    def set_adaptive(self, params: dict | None):
+        """Enable model / input size switching under load (AdaptiveController parameters), None disables it."""
+        self.pipeline_options["adaptive_params"] = params
+        
+    def set_geometry_artifacts(self, artifacts: dict | None):
+        """Cached derived geometry of the current configuration (see core.geometry_artifacts), None disables it."""
+        self.pipeline_options["geometry_artifacts"] = artifacts
+        
+    def set_stats_rate(self, rate_hz: float):
+        """Set the maximum number of analysisResult emissions per second."""
+        self.stats_interval = 1.0 / rate_hz if rate_hz > 0 else 0.0
+        
+    def _publish_statistics(self, pipeline: AnalysisPipeline, pending_events: list):
+        """Emit the new events and the counters that changed since the last emission."""
+        delta = pipeline.counter.get_statistics_delta()
+        if pipeline.congestion is not None and pipeline.congestion.has_changes():
+            delta["congestion"] = pipeline.congestion.get_statistics()
+        delta["newly_counted"] = list(pending_events)
+        pending_events.clear()
+        self.analysisResult.emit(delta)
+        
+    def _log_memory(self, pipeline: AnalysisPipeline, pending_events: int):
+        sizes = ", ".join(f"{name}={size}" for name, size in pipeline.memory_stats().items())
+        log.info(f"Memoria: RSS {rss_bytes() / (1024 * 1024):.0f} MB, {sizes}, pending_events={pending_events}")
+        
+    def _save_checkpoint(self, pipeline: AnalysisPipeline, frame_idx: int, start_time: float):
+        try:
+            save_checkpoint(self.checkpoint_path, {
+                "source": str(self.video_source),
+                "frame_idx": frame_idx,
+                "start_time": start_time,
+                "pipeline": pipeline.get_state(),
+            })
+        except Exception as e:
+            log.error(f"No se pudo guardar el checkpoint: {e}")
+        
     @staticmethod
-    def get_first_frame(source):
+    def get_first_frame(source) -> np.ndarray | None:
         """capture first frame"""
         cap = cv2.VideoCapture(source)
         cap.set(3, 1280)
@@ -43,21 +150,31 @@ class VideoProcessor(QThread):
         
         if not cap.isOpened():
             log.error(f"No se pudo abrir la fuente de video: {source}")
-            return None, 0, 0
+            return None
             
         ret, frame = cap.read()
         cap.release()
         
         if not ret:
             log.error(f"No se pudo leer el primer fotograma de: {source}")
-            return None, 0, 0
+            return None
+        return frame
         
-        # Convertir el fotograma a QImage y obtener dimensiones
+    @staticmethod
+    def to_qimage(frame: np.ndarray) -> QImage:
+        """Copy a BGR frame into a QImage."""
         h, w, ch = frame.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format_BGR888)
+        return QImage(frame.data, w, h, ch * w, QImage.Format_BGR888).copy()
         
-        return qt_image.copy(), w, h
+    def show_preview(self, frame: np.ndarray):
+        """
+        Publish a frame of a new source (before the analysis starts) for the display,
+        without overlays. It is shown by the next `get_display_frame` call.
+        """
+        self.renderer.set_geometry([], [])
+        self._displayed_frame_idx = -1
+        display_frame, display_scale = FrameRenderer.fit(frame, self._display_size)
+        self._latest_frame = (0, display_frame, display_scale, np.empty((0, 4), dtype=np.float32), [])
         
     def run(self):
         if not self.video_source and self.video_source != 0:
@@ -70,98 +187,127 @@ class VideoProcessor(QThread):
         
         cap = cv2.VideoCapture(self.video_source)
         fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         
         if not cap.isOpened():
             log.error(f"No se puedo abrir la fuente de video: {self.video_source}")
             return
         
-        mask = MaskProcessing()
-        detector = VehicleDetection()
-        counter = CountingProcessor(self.lane_config)
-        homography_manager = HomographyManager(self.homography_config)
-        speed_calculator = SpeedCalculator(homography_manager)
+        options = dict(self.pipeline_options)
+        if options.get("adaptive_params") is not None and not options["adaptive_params"].get("source_fps"):
+            options["adaptive_params"] = {**options["adaptive_params"], "source_fps": fps}
+        if options.get("video_output_params") is not None:
+            # cada ejecución escribe su propio video: no se sobrescribe el de la anterior
+            video = dict(options["video_output_params"])
+            base, extension = os.path.splitext(video["path"])
+            video["path"] = f"{base}_{time.strftime('%Y%m%d_%H%M%S')}{extension}"
+            video.setdefault("fps", fps)
+            options["video_output_params"] = video
         
-        # bicycle: 1, car: 2, motorcycle: 3, bus: 5, truck: 7
-        classes_to_detect = [1, 2, 3, 5, 7]  # Car, Motorcycle, Bus, Truck
+        # resume: grabaciones en tiempo de video para que el resultado no dependa de la interrupción
+        checkpoint_path = self.checkpoint_path
+        checkpoint = load_checkpoint(checkpoint_path) if checkpoint_path else None
+        if checkpoint and checkpoint.get("source") != str(self.video_source):
+            checkpoint = None
+        video_clock = checkpoint_path is not None and isinstance(self.video_source, str)
+        frame_idx = checkpoint["frame_idx"] if checkpoint else 0
+        start_time = checkpoint["start_time"] if checkpoint else time.time()
+        if checkpoint and video_clock:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            log.info(f"Reanudando desde el fotograma {frame_idx} ({checkpoint_path})")
+        frame_period = 1.0 / fps if fps > 0 else 1.0 / 30
         
-        # draw
-        scale_factor = frame_width / 2560.0  # Normalizar basado en Full HD
-        line_thickness = max(1, int(3 * scale_factor))
-        font_scale = max(0.4, 0.7 * scale_factor)
+        pipeline = AnalysisPipeline(self.lane_config, self.homography_config, self.event_output_path,
+                                    checkpointing=checkpoint_path is not None,
+                                    resume_state=checkpoint["pipeline"] if checkpoint else None, **options)
+        counter = pipeline.counter
+        self.renderer.set_geometry(counter.lane_polygons, counter.counting_lines, pipeline.homography_config.get("image_points"))
         
         self.is_running = True
+        self._latest_frame = None
         prev_time = time.time()
+        last_stats_time = 0.0
+        last_checkpoint = time.time()
+        last_memory_log = time.time()
+        pending_events = []
+        finished = False
         
-        while self.is_running:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # 0. time delta
-            current_time = time.time()
-            delta_t = current_time - prev_time
-            prev_time = current_time
-            
-            # 1. create mask
-            masked_frame = mask.process_frame(frame, counter.lane_polygons)
-            
-            # 2. detect vehicles
-            detections_generator, class_names = detector.inference(masked_frame, classes_to_detect)
-            
-            for results in detections_generator:
+        try:
+            while self.is_running:
+                ret, frame = cap.read()
+                if not ret:
+                    finished = True
+                    break
                 
-                # 3. count vehicles
-                new_events = counter.process_frame(results, class_names, speed_calculator.speed_history)
+                # 0. configuration changes pushed from the GUI, applied between frames
+                if self._pending_config is not None:
+                    self._apply_pending_config(pipeline)
                 
-                # 4. calculate speed
-                if results.boxes.id is not None:
-                    for box, track_id in zip(results.boxes.xyxy.cpu(), results.boxes.id.int().cpu()):
-                        speed_check_point = ((box[0] + box[2]) / 2, box[3])
-                        speed_calculator.update_speed(int(track_id), speed_check_point, delta_t)
-                        
-                # 5. save events
-                for event in new_events:
-                    speed = speed_calculator.speed_history.get(event['track_id'], -1)
-                    event['speed'] = f"{speed:.1f}" if speed >= 0 else "-"
-            
-                # 6. send results
-                #if new_events:
-                #    current_stats = counter.get_statistics()
-                #    self.analysisResult.emit(current_stats)
-                current_stats = counter.get_statistics()
-                current_stats['newly_counted'] = new_events
-                self.analysisResult.emit(current_stats)
-                    
-                # 7. draw lanes and count lines
-                for i, polygon in enumerate(counter.lane_polygons):
-                    cv2.polylines(frame, [polygon], isClosed=True, color=(255, 255, 0), thickness=line_thickness)
-                    line = counter.counting_lines[i]
-                    cv2.line(frame, (int(line.coords[0][0]), int(line.coords[0][1])), 
-                            (int(line.coords[1][0]), int(line.coords[1][1])), (0, 255, 255), line_thickness)
+                # time delta
+                if video_clock:
+                    current_time = start_time + frame_idx * frame_period
+                    delta_t = frame_period
+                else:
+                    current_time = time.time()
+                    delta_t = current_time - prev_time
+                prev_time = current_time
+                
+                # 1. analyze frame
+                new_events, detections, labels = pipeline.process_frame(frame, delta_t, current_time if video_clock else None)
+                
+                # 2. send results only when something changed, coalesced to the stats rate
+                pending_events.extend(new_events)
+                if (pending_events or pipeline.has_changes()) and current_time - last_stats_time >= self.stats_interval:
+                    self._publish_statistics(pipeline, pending_events)
+                    last_stats_time = current_time
                     
-                # 9. draw detections and speed
-                if results.boxes.id is not None:
-                    for box, track_id, cls_id in zip(results.boxes.xyxy.cpu(), results.boxes.id.int().cpu(), results.boxes.cls.cpu()):
-                        speed = speed_calculator.speed_history.get(int(track_id), -1)
-                        speed_text = f" {speed:.1f} km/h" if speed >= 0 else ""
-                        label = f"ID:{track_id} {class_names.get(int(cls_id))}{speed_text}"
-                        
-                        cv2.rectangle(frame, (int(box[0]), int(box[1])), (int(box[2]), int(box[3])), (0, 255, 0), line_thickness)
-                        cv2.putText(frame, label, (int(box[0]), int(box[1]-10)), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 255, 0), line_thickness)
+                # 3. publish the frame downscaled to the display size and the overlay data
+                frame_idx += 1
+                display_frame, display_scale = FrameRenderer.fit(frame, self._display_size)
+                boxes = detections.boxes if detections.has_ids else detections.boxes[:0]
+                self._latest_frame = (frame_idx, display_frame, display_scale, boxes, labels)
                 
-                # convert numpy image to QImage
-                h, w, ch = frame.shape
-                bytes_per_line = ch * w
-                qt_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format_BGR888)
+                # 4. memory report (the display keeps a single frame: there is no frame queue)
+                if self.memory_log_interval and time.time() - last_memory_log >= self.memory_log_interval:
+                    self._log_memory(pipeline, len(pending_events))
+                    last_memory_log = time.time()
                 
-                # send frame
-                self.frameReady.emit(qt_image.copy())
-            
-        cap.release()
-        self.is_running = False
-        self.finished.emit()
-        log.info("Procesamiento de video finalizado")
+                # 5. checkpoint
+                if checkpoint_path and (time.time() - last_checkpoint >= self.checkpoint_interval or not self.is_running):
+                    self._save_checkpoint(pipeline, frame_idx, start_time)
+                    last_checkpoint = time.time()
+                
+            if pending_events or pipeline.has_changes():
+                self._publish_statistics(pipeline, pending_events)
+        finally:
+            # cerrar siempre el pipeline: vacía eventos, clips, sinks y video anotado
+            pipeline.close()
+            cap.release()
+            self.is_running = False
+            if finished and checkpoint_path and os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+            self.finished.emit()
+            log.info("Procesamiento de video finalizado")
+        
+    def get_display_frame(self, width: int, height: int) -> QImage | None:
+        """
+        Draw the overlays on the latest analyzed frame.
+
+        Called from the GUI thread at the display rate. The frame was already downscaled by
+        the analysis thread; `width` x `height` is the size used for the next frames.
+        Returns None when no new frame was analyzed since the last call. The returned QImage
+        wraps the renderer buffer, so it must be converted (e.g. QPixmap.fromImage) before
+        the next call.
+        """
+        self._display_size = (width, height)
+        latest = self._latest_frame
+        if latest is None or latest[0] == self._displayed_frame_idx:
+            return None
+        
+        frame_idx, frame, scale, boxes, labels = latest
+        self._displayed_frame_idx = frame_idx
+        canvas = self.renderer.render_scaled(frame, boxes, labels, scale)
+        h, w, ch = canvas.shape
+        return QImage(canvas.data, w, h, ch * w, QImage.Format_BGR888)
         
     def stop(self):
         self.is_running = False
\ No newline at end of file
@@ -0,0 +1,289 @@
+import os
+import glob
+import queue
+import threading
+import logging as log
+
+import cv2
+import numpy as np
+
+from models.vehicle import CountEvent
+from models.detection import FrameDetections
+
+# registro del índice: una fila de tamaño fijo por recorte guardado en el pack
+CROP_INDEX_DTYPE = np.dtype([
+    ("track_id", np.int64),
+    ("timestamp", np.float64),
+    ("lane", np.int16),
+    ("class_id", np.int16),
+    ("confidence", np.float32),
+    ("box", np.float32, 4),
+    ("offset", np.int64),
+    ("length", np.int32),
+])
+
+
+def _pack_paths(directory: str, number: int) -> tuple[str, str]:
+    base = os.path.join(directory, f"crops_{number:05d}")
+    return f"{base}.pack", f"{base}.idx"
+
+
+class _BestCrop:
+    __slots__ = ("score", "crop", "box", "confidence", "last_seen", "counted")
+
+    def __init__(self):
+        self.score = -1.0
+        self.crop = None
+        self.box = None
+        self.confidence = 0.0
+        self.last_seen = 0.0
+        self.counted = False
+
+
+class CropStore:
+    def __init__(self, directory: str = "crops", jpeg_quality: int = 85, margin: float = 0.1,
+                 max_crop_size: int = 256, max_pack_mb: float = 256.0, max_queue: int = 64,
+                 track_timeout: float = 10.0):
+        """
+        One image crop per counted vehicle, packed into a few large files.
+
+        While a track is visible, the crop of its best detection (confidence x box area) is
+        kept in memory; when the track is counted that crop is JPEG-encoded on a worker thread
+        and appended to the current pack file. Each crop adds a fixed-size row to the pack's
+        index (CROP_INDEX_DTYPE: track, time, lane, class, box, offset, length), so a reader
+        finds any crop with one seek. Packs rotate to a new file after `max_pack_mb`.
+
+        The analysis thread only slices and copies the crop when a track improves; encoding
+        and file writes never block it (when the queue is full the crop is skipped and
+        counted in `crops_dropped`).
+
+        Args:
+            directory (str): Folder of the pack and index files.
+            jpeg_quality (int): JPEG quality (0-100).
+            margin (float): Extra context around the box, as a fraction of its size.
+            max_crop_size (int): Longest side of the stored crop (larger crops are downscaled).
+            max_pack_mb (float): Size of a pack file before a new one is started.
+            max_queue (int): Crops waiting for the encoder before new ones are skipped.
+            track_timeout (float): Seconds without seeing a track before its crop is dropped.
+        """
+        self.directory = directory
+        self.jpeg_quality = jpeg_quality
+        self.margin = margin
+        self.max_crop_size = max_crop_size
+        self.max_pack_bytes = int(max_pack_mb * 1024 * 1024)
+        self.max_queue = max_queue
+        self.track_timeout = track_timeout
+
+        self.crops_written = 0
+        self.crops_dropped = 0
+
+        self._best = {}  # track_id -> _BestCrop
+        self._last_prune = 0.0
+        self._pack_number = 0
+        self._pack = None
+        self._index = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="CropStore", daemon=True)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # una sesión nueva siempre empieza un pack nuevo: no se escribe tras datos de otra ejecución
+        existing = sorted(glob.glob(os.path.join(self.directory, "crops_*.pack")))
+        if existing:
+            self._pack_number = int(os.path.basename(existing[-1])[6:11]) + 1
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._best)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def add_frame(self, frame: np.ndarray, detections: FrameDetections, timestamp: float):
+        """Keep the crop of every tracked vehicle whose detection improves on its best one."""
+        if not detections.has_ids:
+            return
+        boxes = detections.boxes
+        height, width = frame.shape[:2]
+        scores = detections.confidences * (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+        best_crops = self._best
+        for i, track_id in enumerate(detections.track_ids.tolist()):
+            best = best_crops.get(track_id)
+            if best is None:
+                best = best_crops[track_id] = _BestCrop()
+            best.last_seen = timestamp
+            if best.counted or scores[i] <= best.score:
+                continue
+            x1, y1, x2, y2 = boxes[i].tolist()
+            dx, dy = (x2 - x1) * self.margin, (y2 - y1) * self.margin
+            left, top = max(0, int(x1 - dx)), max(0, int(y1 - dy))
+            right, bottom = min(width, int(x2 + dx) + 1), min(height, int(y2 + dy) + 1)
+            if right <= left or bottom <= top:
+                continue
+            best.score = float(scores[i])
+            best.crop = frame[top:bottom, left:right].copy()
+            best.box = boxes[i].copy()
+            best.confidence = float(detections.confidences[i])
+
+        # tracks perdidos (o ya contados y fuera de escena): se libera su recorte
+        if timestamp - self._last_prune >= self.track_timeout:
+            self._last_prune = timestamp
+            limit = timestamp - self.track_timeout
+            for track_id in [t for t, best in best_crops.items() if best.last_seen < limit]:
+                del best_crops[track_id]
+
+    def on_events(self, events: list[CountEvent]):
+        """Store the best crop of every counted vehicle."""
+        for event in events:
+            best = self._best.get(event.track_id)
+            if best is None or best.crop is None or best.counted:
+                continue
+            crop, box, confidence = best.crop, best.box, best.confidence
+            # se conserva la entrada (marcada) para no volver a recortar el track ya contado
+            best.crop = None
+            best.counted = True
+            if self._queue.qsize() >= self.max_queue:
+                self.crops_dropped += 1
+                continue
+            self._queue.put((event, crop, box, confidence))
+
+    def close(self):
+        """Write the queued crops and close the pack."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._best.clear()
+        log.info(f"Almacén de recortes cerrado: {self.crops_written} recortes, {self.crops_dropped} omitidos")
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                try:
+                    self._write_crop(*item)
+                except Exception as e:
+                    self.crops_dropped += 1
+                    log.error(f"Error al guardar el recorte del track {item[0].track_id}: {e}")
+        finally:
+            self._close_pack()
+
+    def _write_crop(self, event: CountEvent, crop: np.ndarray, box: np.ndarray, confidence: float):
+        height, width = crop.shape[:2]
+        longest = max(height, width)
+        if longest > self.max_crop_size:
+            scale = self.max_crop_size / longest
+            crop = cv2.resize(crop, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode(".jpg", crop, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise IOError("no se pudo codificar el JPEG")
+        data = encoded.tobytes()
+
+        if self._pack is None or self._pack.tell() + len(data) > self.max_pack_bytes:
+            self._open_next_pack()
+        offset = self._pack.tell()
+        self._pack.write(data)
+        self._pack.flush()
+
+        # el índice se escribe después de los datos: una fila nunca apunta a bytes incompletos
+        record = np.array([(event.track_id, event.timestamp, event.lane, event.class_id, confidence,
+                            box, offset, len(data))], dtype=CROP_INDEX_DTYPE)
+        self._index.write(record.tobytes())
+        self._index.flush()
+        self.crops_written += 1
+
+    def _open_next_pack(self):
+        had_pack = self._pack is not None
+        self._close_pack()
+        if had_pack:
+            self._pack_number += 1
+        pack_path, index_path = _pack_paths(self.directory, self._pack_number)
+        self._pack = open(pack_path, "ab")
+        self._index = open(index_path, "ab")
+        log.info(f"Pack de recortes: {pack_path}")
+
+    def _close_pack(self):
+        if self._pack is not None:
+            self._pack.close()
+            self._index.close()
+            self._pack = None
+            self._index = None
+
+
+class CropPackReader:
+    def __init__(self, directory: str):
+        """
+        Random access to the crops of a CropStore folder.
+
+        The index files of every pack are read into one structured array (a few tens of
+        bytes per crop, so millions of crops fit in memory), sorted by time. Lookups by
+        track or time range are vectorized over that array and each crop is then read
+        with a single seek in its pack.
+
+        Args:
+            directory (str): Folder of the pack and index files.
+        """
+        self.directory = directory
+        self.index = np.empty(0, dtype=CROP_INDEX_DTYPE)
+        self.packs = np.empty(0, dtype=np.int32)
+        self._files = {}
+        self.refresh()
+
+    def __len__(self):
+        return len(self.index)
+
+    def refresh(self):
+        """Re-read the index files (e.g. while a CropStore is still writing)."""
+        indexes, packs = [], []
+        for index_path in sorted(glob.glob(os.path.join(self.directory, "crops_*.idx"))):
+            number = int(os.path.basename(index_path)[6:11])
+            pack_path, _ = _pack_paths(self.directory, number)
+            raw = np.fromfile(index_path, dtype=np.uint8)
+            # una fila a medio escribir (proceso interrumpido) se ignora
+            rows = raw[:len(raw) - len(raw) % CROP_INDEX_DTYPE.itemsize].view(CROP_INDEX_DTYPE)
+            if not os.path.exists(pack_path):
+                continue
+            pack_size = os.path.getsize(pack_path)
+            rows = rows[rows["offset"] + rows["length"] <= pack_size]
+            indexes.append(rows)
+            packs.append(np.full(len(rows), number, dtype=np.int32))
+
+        if indexes:
+            index, pack_numbers = np.concatenate(indexes), np.concatenate(packs)
+            order = np.argsort(index["timestamp"], kind="stable")
+            self.index, self.packs = index[order], pack_numbers[order]
+        else:
+            self.index = np.empty(0, dtype=CROP_INDEX_DTYPE)
+            self.packs = np.empty(0, dtype=np.int32)
+
+    def find_track(self, track_id: int) -> np.ndarray:
+        """Rows (positions in `index`) of a track ID."""
+        return np.flatnonzero(self.index["track_id"] == track_id)
+
+    def find_time_range(self, start: float = None, end: float = None) -> np.ndarray:
+        """Rows with start <= timestamp <= end (either may be None), in time order."""
+        timestamps = self.index["timestamp"]
+        first = 0 if start is None else np.searchsorted(timestamps, start, side="left")
+        last = len(timestamps) if end is None else np.searchsorted(timestamps, end, side="right")
+        return np.arange(first, max(first, last))
+
+    def read_bytes(self, row: int) -> bytes:
+        """JPEG bytes of a row."""
+        number = int(self.packs[row])
+        pack = self._files.get(number)
+        if pack is None:
+            pack = self._files[number] = open(_pack_paths(self.directory, number)[0], "rb")
+        pack.seek(int(self.index["offset"][row]))
+        return pack.read(int(self.index["length"][row]))
+
+    def read_image(self, row: int) -> np.ndarray:
+        """Decoded BGR crop of a row."""
+        return cv2.imdecode(np.frombuffer(self.read_bytes(row), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def close(self):
+        for pack in self._files.values():
+            pack.close()
+        self._files = {}
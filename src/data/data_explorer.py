@@ -0,0 +1,271 @@
+import os
+import csv
+import sqlite3
+import numpy as np
+import logging as log
+
+from .event_store import EventStore
+from models.vehicle import CountEvent
+
+
+# se usa un índice denso mientras su rango no supere este múltiplo del número de eventos (más un mínimo
+# fijo); si no (p. ej. un timestamp erróneo que estira la sesión años) se agrupa con np.unique
+DENSE_SPAN_RATIO = 4
+DENSE_SPAN_MIN = 1 << 16
+
+
+def _bucket_index(timestamps: np.ndarray, bucket_seconds: float, sub_keys: np.ndarray = None, n_sub: int = 1) -> tuple[np.ndarray, int, int]:
+    """
+    Group key of every event: bucket relative to the first one, times `n_sub`, plus its sub key (e.g. lane).
+
+    Returns:
+        tuple[np.ndarray, int, int]: int64 keys, first bucket and key span.
+    """
+    first_bucket = np.floor(timestamps.min() / bucket_seconds)
+    last_bucket = np.floor(timestamps.max() / bucket_seconds)
+    relative = timestamps / bucket_seconds
+    relative -= first_bucket
+    keys = relative.astype(np.int64)  # relative >= 0: truncar equivale a floor
+    if sub_keys is not None:
+        keys *= n_sub
+        keys += sub_keys
+    return keys, int(first_bucket), int(last_bucket - first_bucket + 1) * n_sub
+
+
+def _count_keys(keys: np.ndarray, span: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Distinct keys in [0, span) and their number of events: dense bincount, O(n + span), when the
+    span is bounded by the number of events; sort with np.unique otherwise.
+    """
+    if span <= max(DENSE_SPAN_RATIO * len(keys), DENSE_SPAN_MIN):
+        counts = np.bincount(keys, minlength=span)
+        present = np.flatnonzero(counts)
+        return present, counts[present]
+    return np.unique(keys, return_counts=True)
+
+
+class TrafficDataExplorer:
+    def __init__(self, root_dir: str):
+        """
+        Aggregate queries over the event stores of many sessions and cameras.
+
+        Sessions are saved as memory-mapped columnar stores under
+        `root_dir/<camera>/<session>/`. Queries only touch the columns they need and
+        are computed with vectorized group-bys (bincount over dense keys) per session,
+        then merged, so tens of millions of events never have to be loaded as Python objects.
+
+        Args:
+            root_dir (str): Root directory of the columnar stores.
+        """
+        self.root_dir = root_dir
+        self.vehicle_types = []
+        self._type_codes = {}
+        self.sessions = []
+        os.makedirs(root_dir, exist_ok=True)
+        self.refresh()
+
+    # --- almacenamiento ---
+    def refresh(self):
+        """Scan the root directory and memory-map every stored session."""
+        self.sessions = []
+        for camera in sorted(os.listdir(self.root_dir)):
+            camera_dir = os.path.join(self.root_dir, camera)
+            if not os.path.isdir(camera_dir):
+                continue
+            for session in sorted(os.listdir(camera_dir)):
+                session_dir = os.path.join(camera_dir, session)
+                if os.path.exists(os.path.join(session_dir, "meta.json")):
+                    store = EventStore.load(session_dir, mmap=True)
+                    # mapa de códigos locales de tipo a códigos globales
+                    type_lookup = np.array([self._global_type_code(t) for t in store.vehicle_types], dtype=np.int16)
+                    self.sessions.append({"camera": camera, "session": session, "store": store, "type_lookup": type_lookup})
+
+    def _global_type_code(self, vehicle_type: str) -> int:
+        if vehicle_type not in self._type_codes:
+            self._type_codes[vehicle_type] = len(self.vehicle_types)
+            self.vehicle_types.append(vehicle_type)
+        return self._type_codes[vehicle_type]
+
+    def add_session(self, store: EventStore, camera: str, session: str):
+        """Save an in-memory EventStore as a new session and make it queryable."""
+        store.save(os.path.join(self.root_dir, camera, session))
+        self.refresh()
+
+    def import_events_file(self, path: str, camera: str, session: str = None, chunk_size: int = 100000):
+        """
+        Convert an event log written by EventWriter (.csv, .db/.sqlite) into a columnar session.
+
+        Args:
+            path (str): Event log file.
+            camera (str): Camera name.
+            session (str): Session name, defaults to the file name.
+            chunk_size (int): Rows converted per batch.
+        """
+        session = session or os.path.splitext(os.path.basename(path))[0]
+        store = EventStore()
+        for rows in self._read_event_rows(path, chunk_size):
+            store.append([CountEvent.from_row(row) for row in rows])
+        log.info(f"{len(store)} eventos importados de {path}")
+        self.add_session(store, camera, session)
+
+    @staticmethod
+    def _read_event_rows(path: str, chunk_size: int):
+        """Yield the rows of an event log as lists of dicts."""
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".csv":
+            with open(path, newline="", encoding="utf-8") as f:
+                chunk = []
+                for row in csv.DictReader(f):
+                    chunk.append(row)
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+                if chunk:
+                    yield chunk
+        elif extension in (".db", ".sqlite"):
+            connection = sqlite3.connect(path)
+            connection.row_factory = sqlite3.Row
+            cursor = connection.execute("SELECT * FROM events")
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+            connection.close()
+        else:
+            raise ValueError(f"Formato de registro no soportado: {extension}")
+
+    def _iter_columns(self, columns: list[str], cameras: list[str] = None, time_range: tuple[float, float] = None,
+                      global_types: bool = True):
+        """
+        Yield the requested columns of every selected session, already filtered by time.
+        The "type" column is translated to global type codes; with `global_types=False` it keeps
+        the session codes and "type_lookup" (session code -> global code) is yielded with it.
+        """
+        for entry in self.sessions:
+            if cameras is not None and entry["camera"] not in cameras:
+                continue
+            store = entry["store"]
+            if len(store) == 0:
+                continue
+
+            selection = slice(None)
+            if time_range is not None:
+                timestamps = store.column("timestamp")
+                mask = np.ones(len(store), dtype=bool)
+                if time_range[0] is not None:
+                    mask &= timestamps >= time_range[0]
+                if time_range[1] is not None:
+                    mask &= timestamps < time_range[1]
+                selection = mask
+
+            data = {name: store.column(name)[selection] for name in columns}
+            if "type" in data:
+                if global_types:
+                    data["type"] = entry["type_lookup"][data["type"]]
+                else:
+                    data["type_lookup"] = entry["type_lookup"]
+            yield data
+
+    # --- consultas ---
+    def counts_per_lane(self, bucket_seconds: int = 900, cameras: list[str] = None, time_range: tuple[float, float] = None) -> dict:
+        """
+        Vehicle counts per lane per time bucket (15 minutes by default).
+
+        Returns:
+            dict: {"bucket_start": epoch seconds, "lane": lane number, "count": events}, one entry per
+            (bucket, lane) pair with at least one event, sorted by bucket and lane.
+        """
+        keys, counts = [], []
+        for data in self._iter_columns(["timestamp", "lane"], cameras, time_range):
+            if not len(data["lane"]):
+                continue
+            # clave (bucket, carril) relativa al primer bucket de la sesión
+            n_lanes = int(data["lane"].max()) + 1
+            session_keys, first_bucket, span = _bucket_index(data["timestamp"], bucket_seconds, data["lane"], n_lanes)
+            present, session_counts = _count_keys(session_keys, span)
+            keys.append((present // n_lanes + first_bucket) * 1024 + present % n_lanes)
+            counts.append(session_counts)
+
+        if not keys:
+            return {"bucket_start": np.empty(0), "lane": np.empty(0, dtype=np.int16), "count": np.empty(0, dtype=np.int64)}
+
+        # combinar los resultados de todas las sesiones
+        merged_keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        merged_counts = np.bincount(inverse, weights=np.concatenate(counts)).astype(np.int64)
+        return {
+            "bucket_start": (merged_keys // 1024) * bucket_seconds,
+            "lane": (merged_keys % 1024).astype(np.int16),
+            "count": merged_counts,
+        }
+
+    def speed_percentiles_per_class(self, percentiles: tuple = (15, 50, 85, 95), resolution: float = 0.1, max_speed: float = 300.0,
+                                    cameras: list[str] = None, time_range: tuple[float, float] = None) -> dict:
+        """
+        Speed percentiles per vehicle class.
+
+        Each session adds a (class, speed bin) histogram with a single bincount over its own
+        type codes; the histograms of all sessions are summed and the percentiles read from their
+        cumulative sums, so the result is exact up to `resolution` km/h.
+
+        Returns:
+            dict: {vehicle_type: {"count": n, "p15": ..., "p50": ..., ...}}
+        """
+        n_bins = int(np.ceil(max_speed / resolution)) + 1
+        histogram = np.zeros((len(self.vehicle_types), n_bins), dtype=np.int64)
+        for data in self._iter_columns(["speed", "type"], cameras, time_range, global_types=False):
+            # clave (bin de velocidad, tipo local); velocidad desconocida (nan) -> bin n_bins, descartado
+            speed_bins = data["speed"] / np.float32(resolution)
+            np.clip(speed_bins, 0, n_bins - 1, out=speed_bins)
+            np.copyto(speed_bins, n_bins, where=np.isnan(speed_bins))
+            keys = speed_bins.astype(np.int64)
+            n_local = len(data["type_lookup"])
+            keys *= n_local
+            keys += data["type"]
+            session_hist = np.bincount(keys, minlength=(n_bins + 1) * n_local).reshape(n_bins + 1, n_local)
+            histogram[data["type_lookup"]] += session_hist[:n_bins].T
+
+        result = {}
+        if not histogram.any():
+            return result
+
+        cumulative = np.cumsum(histogram, axis=1)
+        totals = cumulative[:, -1]
+        for code in np.flatnonzero(totals):
+            ranks = np.asarray(percentiles, dtype=np.float64) / 100 * totals[code]
+            bins = np.searchsorted(cumulative[code], np.maximum(ranks, 1), side="left")
+            values = (bins + 0.5) * resolution
+            result[self.vehicle_types[code]] = {"count": int(totals[code]), **{f"p{p}": float(v) for p, v in zip(percentiles, values)}}
+        return result
+
+    def speeding_rate(self, bucket_seconds: int = 3600, cameras: list[str] = None, time_range: tuple[float, float] = None) -> dict:
+        """
+        Share of events with "Exceso de Velocidad" per time bucket (1 hour by default).
+
+        Returns:
+            dict: {"bucket_start": epoch seconds, "total": events, "speeding": events, "rate": speeding / total}
+        """
+        speeding_code = EventStore.STATUSES.index("Exceso de Velocidad")
+        keys, totals, speeding = [], [], []
+        for data in self._iter_columns(["timestamp", "status"], cameras, time_range):
+            if not len(data["status"]):
+                continue
+            # clave (bucket, exceso de velocidad): un solo bincount sin pesos
+            session_keys, first_bucket, span = _bucket_index(data["timestamp"], bucket_seconds, data["status"] == speeding_code, 2)
+            present, session_counts = _count_keys(session_keys, span)
+            keys.append(present // 2 + first_bucket)
+            totals.append(session_counts)
+            speeding.append(session_counts * (present % 2))
+
+        if not keys:
+            return {"bucket_start": np.empty(0), "total": np.empty(0, dtype=np.int64), "speeding": np.empty(0, dtype=np.int64), "rate": np.empty(0)}
+
+        merged_keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        total = np.bincount(inverse, weights=np.concatenate(totals)).astype(np.int64)
+        speeding_total = np.bincount(inverse, weights=np.concatenate(speeding)).astype(np.int64)
+        return {
+            "bucket_start": merged_keys * bucket_seconds,
+            "total": total,
+            "speeding": speeding_total,
+            "rate": speeding_total / np.maximum(total, 1),
+        }
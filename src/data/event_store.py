@@ -0,0 +1,178 @@
+import os
+import json
+import numpy as np
+
+from models.vehicle import CountEvent, SPEED_STATUSES
+
+
+class EventStore:
+    # columnas y tipos del almacenamiento columnar
+    COLUMNS = {
+        "track_id": np.int64,
+        "timestamp": np.float64,
+        "lane": np.int16,
+        "type": np.uint8,
+        "speed": np.float32,
+        "confidence": np.float32,
+        "status": np.uint8,
+    }
+    STATUSES = list(SPEED_STATUSES)
+
+    def __init__(self, initial_capacity: int = 4096):
+        """
+        Columnar store for counted events.
+
+        Each field is kept in its own contiguous NumPy array and categorical fields
+        (vehicle type, status) are stored as small integer codes, so filtering and
+        sorting over hundreds of thousands of events are vectorized operations.
+
+        Args:
+            initial_capacity (int): Number of rows allocated up front. Grows by doubling.
+        """
+        self.size = 0
+        self.columns = {name: np.empty(initial_capacity, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        self.vehicle_types = []
+        self._type_codes = {}
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, n: int):
+        """Ensure capacity for `n` more rows."""
+        capacity = len(self.columns["track_id"])
+        if self.size + n <= capacity:
+            return
+        new_capacity = max(capacity * 2, self.size + n)
+        for name, column in self.columns.items():
+            grown = np.empty(new_capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def type_code(self, vehicle_type: str) -> int:
+        """Return the integer code of a vehicle type, registering it if new."""
+        if vehicle_type not in self._type_codes:
+            self._type_codes[vehicle_type] = len(self.vehicle_types)
+            self.vehicle_types.append(vehicle_type)
+        return self._type_codes[vehicle_type]
+
+    def append(self, events: list[CountEvent]):
+        """Append a batch of events."""
+        n = len(events)
+        if n == 0:
+            return
+        self._reserve(n)
+
+        start, end = self.size, self.size + n
+        cols = self.columns
+        cols["track_id"][start:end] = [e.track_id for e in events]
+        cols["timestamp"][start:end] = [e.timestamp for e in events]
+        cols["lane"][start:end] = [e.lane for e in events]
+        cols["type"][start:end] = [self.type_code(e.vehicle_type) for e in events]
+        cols["speed"][start:end] = [e.speed for e in events]
+        cols["confidence"][start:end] = [e.confidence for e in events]
+        cols["status"][start:end] = [e.status_code for e in events]
+        self.size = end
+
+    def column(self, name: str) -> np.ndarray:
+        """Return a view of the filled part of a column."""
+        return self.columns[name][:self.size]
+
+    @property
+    def latest_timestamp(self) -> float | None:
+        """Most recent event time (epoch or video clock), None when empty."""
+        return float(self.column("timestamp").max()) if self.size else None
+
+    def query(self, lane: int = None, vehicle_type: str = None, status: str = None,
+              time_range: tuple[float, float] = None, sort_by: str = None, descending: bool = False,
+              start: int = 0) -> np.ndarray:
+        """
+        Select and order events with vectorized masks.
+
+        Args:
+            lane (int): Lane number (1-based) or None for all lanes.
+            vehicle_type (str): Vehicle class name or None.
+            status (str): Speed status or None.
+            time_range (tuple[float, float]): (start, end) epoch seconds, either may be None.
+            sort_by (str): Column name to sort by, None keeps insertion order.
+            descending (bool): Sort direction.
+            start (int): Only consider rows from this index on (e.g. the events appended
+                since a previous query).
+
+        Returns:
+            np.ndarray: Row indices of the matching events, in display order.
+        """
+        start = min(start, self.size)
+        rows = slice(start, self.size)
+        mask = np.ones(self.size - start, dtype=bool)
+        if lane is not None:
+            mask &= self.columns["lane"][rows] == lane
+        if vehicle_type is not None:
+            if vehicle_type not in self._type_codes:
+                return np.empty(0, dtype=np.int64)
+            mask &= self.columns["type"][rows] == self._type_codes[vehicle_type]
+        if status is not None:
+            mask &= self.columns["status"][rows] == self.STATUSES.index(status)
+        if time_range is not None:
+            t_start, t_end = time_range
+            timestamps = self.columns["timestamp"][rows]
+            if t_start is not None:
+                mask &= timestamps >= t_start
+            if t_end is not None:
+                mask &= timestamps <= t_end
+
+        indices = np.flatnonzero(mask) + start
+        if sort_by is not None and len(indices):
+            values = self.column(sort_by)[indices]
+            if sort_by == "type":
+                # ordenar por nombre y no por código
+                names_order = np.argsort(np.argsort(self.vehicle_types)) if self.vehicle_types else np.empty(0, dtype=np.int64)
+                values = names_order[values]
+            order = np.argsort(values, kind="stable")
+            if descending:
+                order = order[::-1]
+            indices = indices[order]
+        return indices
+
+    def get_row(self, index: int) -> dict:
+        """Return a single event with decoded categorical fields."""
+        cols = self.columns
+        return {
+            "track_id": int(cols["track_id"][index]),
+            "timestamp": float(cols["timestamp"][index]),
+            "lane": int(cols["lane"][index]),
+            "type": self.vehicle_types[cols["type"][index]],
+            "speed": float(cols["speed"][index]),
+            "confidence": float(cols["confidence"][index]),
+            "status": self.STATUSES[cols["status"][index]],
+        }
+
+    def save(self, directory: str):
+        """
+        Save the store as one .npy file per column plus a meta.json with the categories.
+        The files can be memory-mapped by `load`.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in self.COLUMNS:
+            np.save(os.path.join(directory, f"{name}.npy"), self.column(name))
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"size": self.size, "vehicle_types": self.vehicle_types, "statuses": self.STATUSES}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "EventStore":
+        """
+        Load a store saved with `save`.
+
+        Args:
+            directory (str): Directory with the column files.
+            mmap (bool): Memory-map the columns instead of reading them (read-only store).
+        """
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+
+        store = cls(initial_capacity=0)
+        mmap_mode = "r" if mmap else None
+        store.columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in cls.COLUMNS}
+        store.size = meta["size"]
+        for vehicle_type in meta["vehicle_types"]:
+            store.type_code(vehicle_type)
+        return store
@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import logging as log
+
+import cv2
+import numpy as np
+
+from core.analysis_pipeline import AnalysisPipeline
+from core.segment_processing import run_segmented
+from core.geometry_artifacts import load_geometry_artifacts
+from core.occupancy import OccupancyMap
+from utils.file_manager import load_checkpoint, save_checkpoint
+from utils.event_sinks import create_sink
+from utils.metrics_server import MetricsServer, PipelineMetrics
+from utils.memory_monitor import rss_bytes
+from utils.config_manager import ProjectConfig, camera_pipeline_options, read_camera_config
+
+log.basicConfig(level=log.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+def load_config(path: str, camera: str = None) -> tuple[list, dict]:
+    """
+    Load lanes and homography from a JSON file:
+    {"lanes": [[[x, y], ...], ...], "homography": {"image_points": [...], "real_width_m": w, "real_length_m": l},
+     "tracker": {...}, "tiling": {...}}  (optional pipeline options, see load_pipeline_options)
+    or from camera `camera` (default the active one) of a project file (see utils.config_manager).
+    """
+    config = read_camera_config(path, camera)
+    lanes = [[tuple(p) for p in lane] for lane in config["lanes"]]
+    homography = config.get("homography", {})
+    if "image_points" in homography:
+        homography["image_points"] = [tuple(p) for p in homography["image_points"]]
+    return lanes, homography
+
+
+def load_pipeline_options(path: str, camera: str = None) -> dict:
+    """AnalysisPipeline options of a camera config (see utils.config_manager.camera_pipeline_options)."""
+    return camera_pipeline_options(read_camera_config(path, camera))
+
+
+def load_project_artifacts(path: str, lanes: list, homography: dict, camera: str = None) -> dict | None:
+    """Cached derived geometry (<config>_cache/) of a camera with a known "frame_size", otherwise None."""
+    frame_size = read_camera_config(path, camera).get("frame_size")
+    if not frame_size:
+        return None
+    return load_geometry_artifacts(ProjectConfig(path).artifact_cache, lanes, homography, frame_size)
+
+
+def save_occupancy(occupancy: OccupancyMap, path: str, frame: np.ndarray = None):
+    """Export the occupancy maps (.npz) and, with a frame, the heatmap over it (.png)."""
+    occupancy.save(path)
+    if frame is not None:
+        cv2.imwrite(f"{os.path.splitext(path)[0]}.png", occupancy.render_overlay(frame))
+    log.info(f"Ocupación guardada en {path}")
+
+
+def run(source, lane_polygons: list, homography_config: dict, events_out: str = None,
+        stats_out: str = None, stats_interval: float = 10.0, checkpoint_path: str = None,
+        checkpoint_interval: float = 60.0, occupancy_out: str = None, **pipeline_options) -> dict:
+    """
+    Analyze a video source without GUI.
+
+    With `checkpoint_path` the full analysis state is saved every `checkpoint_interval`
+    seconds (and on Ctrl+C); running the same command again resumes from the last
+    checkpoint. Video files are then analyzed on video time (frame / fps) so a resumed job
+    produces the same events and statistics as an uninterrupted one. Checkpoints are only
+    taken between frames: Ctrl+C lets the current frame finish first (a second Ctrl+C stops
+    at once, keeping the previous checkpoint).
+
+    Args:
+        source: Video file or camera index.
+        lane_polygons (list): Lane polygons in pixel coordinates.
+        homography_config (dict): Homography points and real distances.
+        events_out (str): Optional event log file (.csv, .db/.sqlite).
+        stats_out (str): Optional JSON lines file with periodic statistics (cumulative and rolling windows).
+        stats_interval (float): Seconds between statistics lines.
+        checkpoint_path (str): Optional checkpoint file.
+        checkpoint_interval (float): Wall-clock seconds between checkpoints.
+        occupancy_out (str): Optional .npz with the occupancy heatmaps and lane density series
+            (see core.occupancy); a .png of the heatmap over the last frame is written next to it.
+        **pipeline_options: tracker, tracker_params, inference_mode, tiling_params, adaptive_params,
+            geometry_artifacts, metrics, event_sinks, clip_params, video_output_params, crop_params, occupancy_params,
+            congestion_params (see AnalysisPipeline).
+
+    Returns:
+        dict: Final statistics.
+    """
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        log.error(f"No se pudo abrir la fuente de video: {source}")
+        return {}
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    adaptive_params = pipeline_options.get("adaptive_params")
+    if adaptive_params is not None and not adaptive_params.get("source_fps"):
+        pipeline_options["adaptive_params"] = {**adaptive_params, "source_fps": fps}
+    if occupancy_out and pipeline_options.get("occupancy_params") is None:
+        pipeline_options["occupancy_params"] = {}
+    video_output_params = pipeline_options.get("video_output_params")
+    if video_output_params is not None and not video_output_params.get("fps"):
+        pipeline_options["video_output_params"] = {**video_output_params, "fps": fps}
+
+    checkpoint = load_checkpoint(checkpoint_path) if checkpoint_path else None
+    if checkpoint and checkpoint.get("source") != str(source):
+        log.warning(f"El checkpoint {checkpoint_path} pertenece a otra fuente, se ignora")
+        checkpoint = None
+    video_clock = checkpoint_path is not None and isinstance(source, str)
+
+    frame_idx = checkpoint["frame_idx"] if checkpoint else 0
+    start_time = checkpoint["start_time"] if checkpoint else time.time()
+    if checkpoint and video_clock:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+
+    pipeline = AnalysisPipeline(lane_polygons, homography_config, events_out, checkpointing=checkpoint_path is not None,
+                                resume_state=checkpoint["pipeline"] if checkpoint else None, **pipeline_options)
+    stats_file = open(stats_out, "a", encoding="utf-8") if stats_out else None
+    if stats_file and checkpoint and checkpoint.get("stats_offset") is not None:
+        stats_file.truncate(checkpoint["stats_offset"])
+    if checkpoint:
+        log.info(f"Reanudando desde el fotograma {frame_idx} ({checkpoint_path})")
+
+    def now() -> float:
+        return start_time + frame_idx / fps if video_clock else time.time()
+
+    def write_stats(frame_idx: int):
+        stats = pipeline.counter.get_statistics()
+        stats.pop("log_preview", None)
+        if pipeline.occupancy:
+            stats["occupancy"] = pipeline.occupancy.lane_summary()
+        if pipeline.congestion:
+            stats["congestion"] = pipeline.congestion.get_statistics()
+        stats["memory"] = {"rss_mb": round(rss_bytes() / (1024 * 1024), 1), **pipeline.memory_stats()}
+        if stats_file:
+            stats_file.write(json.dumps({"time": now(), "frame": frame_idx, **stats}) + "\n")
+            stats_file.flush()
+        return stats
+
+    def write_checkpoint():
+        save_checkpoint(checkpoint_path, {
+            "source": str(source),
+            "frame_idx": frame_idx,
+            "start_time": start_time,
+            "last_stats_time": last_stats_time,
+            "stats_offset": stats_file.tell() if stats_file else None,
+            "pipeline": pipeline.get_state(),
+        })
+
+    # Ctrl+C durante un fotograma dejaría el estado a medio aplicar: solo se marca y el
+    # checkpoint se guarda al terminar el fotograma
+    stop_requested = False
+
+    def on_interrupt(signum, stack):
+        nonlocal stop_requested
+        if stop_requested:
+            raise KeyboardInterrupt
+        stop_requested = True
+        log.info("Interrupción recibida: se guarda el estado al terminar el fotograma en curso")
+
+    previous_handler = None
+    if checkpoint_path and threading.current_thread() is threading.main_thread():
+        previous_handler = signal.signal(signal.SIGINT, on_interrupt)
+
+    prev_time = now()
+    last_stats_time = checkpoint["last_stats_time"] if checkpoint else prev_time
+    last_checkpoint = time.time()
+    finished = False
+    frame = None
+    try:
+        while True:
+            ret, next_frame = cap.read()
+            if not ret:
+                finished = True
+                break
+
+            frame = next_frame
+            current_time = now()
+            delta_t = 1.0 / fps if video_clock else current_time - prev_time
+            prev_time = current_time
+
+            pipeline.process_frame(frame, delta_t, current_time if video_clock else None)
+            frame_idx += 1
+
+            if current_time - last_stats_time >= stats_interval:
+                write_stats(frame_idx)
+                last_stats_time = current_time
+
+            if stop_requested:
+                log.info("Análisis interrumpido")
+                write_checkpoint()
+                break
+
+            if checkpoint_path and time.time() - last_checkpoint >= checkpoint_interval:
+                write_checkpoint()
+                last_checkpoint = time.time()
+    except KeyboardInterrupt:
+        log.info("Análisis interrumpido")
+        if checkpoint_path:
+            log.info(f"Se conserva el último checkpoint completo ({checkpoint_path})")
+    finally:
+        if previous_handler is not None:
+            signal.signal(signal.SIGINT, previous_handler)
+        stats = write_stats(frame_idx)
+        if occupancy_out and pipeline.occupancy:
+            save_occupancy(pipeline.occupancy, occupancy_out, frame)
+        pipeline.close()
+        cap.release()
+        if stats_file:
+            stats_file.close()
+
+    if finished and checkpoint_path and os.path.exists(checkpoint_path):
+        # trabajo completo: no hay nada que reanudar
+        os.remove(checkpoint_path)
+
+    log.info(f"{frame_idx} fotogramas procesados, conteo total: {stats['global'].get('vehicle_counts', {})}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Análisis de tráfico sin interfaz gráfica")
+    parser.add_argument("source", help="Archivo de video o índice de cámara")
+    parser.add_argument("--config", required=True, help="JSON con carriles y homografía, o archivo de proyecto")
+    parser.add_argument("--camera", help="Cámara del proyecto (por defecto la activa)")
+    parser.add_argument("--events-out", help="Registro de eventos (.csv, .db, .parquet)")
+    parser.add_argument("--stats-out", help="Estadísticas periódicas en formato JSON lines")
+    parser.add_argument("--stats-interval", type=float, help="Segundos entre estadísticas (por defecto 10)")
+    parser.add_argument("--tracker", choices=AnalysisPipeline.TRACKERS, help="Tracker (por defecto el de la configuración)")
+    parser.add_argument("--tiled", action="store_true", help="Inferencia por tiles sobre los carriles")
+    parser.add_argument("--adaptive", action="store_true", help="Ajustar modelo y resolución a la carga")
+    parser.add_argument("--congestion", action="store_true", help="Estimar cola, vehículos detenidos y demora por carril")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos en paralelo por segmentos (solo archivos)")
+    parser.add_argument("--overlap", type=float, default=2.0, help="Segundos de solape entre segmentos")
+    parser.add_argument("--checkpoint", help="Archivo de checkpoint: guarda el estado y reanuda desde él")
+    parser.add_argument("--checkpoint-interval", type=float, default=60.0, help="Segundos entre checkpoints")
+    parser.add_argument("--sink", action="append", default=[],
+                        help="Destino de eventos en tiempo real (file://, unix://, tcp://, http://), repetible")
+    parser.add_argument("--clips-dir", help="Guardar clips de los excesos de velocidad en esta carpeta")
+    parser.add_argument("--crops-dir", help="Guardar un recorte de cada vehículo contado en esta carpeta (packs con índice)")
+    parser.add_argument("--occupancy-out", help="Mapa de ocupación y densidad por carril (.npz, con una imagen .png)")
+    parser.add_argument("--video-out", help="Video anotado de salida (carriles, cajas, IDs y velocidades)")
+    parser.add_argument("--video-size", help="Tamaño máximo del video anotado, p. ej. 1280x720 (por defecto el de la fuente)")
+    parser.add_argument("--video-step", type=int, default=1, help="Escribir uno de cada N fotogramas")
+    parser.add_argument("--video-codec", default="mp4v", help="FourCC del video anotado (mp4v, avc1, XVID, MJPG)")
+    parser.add_argument("--metrics-port", type=int, help="Servir métricas Prometheus en http://<host>:<puerto>/metrics")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="Dirección del servidor de métricas")
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    segmented = args.workers > 1 and isinstance(source, str)
+    if segmented:
+        # el procesamiento por segmentos solo escribe eventos y estadísticas finales
+        unsupported = [flag for flag, value in (("--checkpoint", args.checkpoint), ("--occupancy-out", args.occupancy_out),
+                                                ("--stats-interval", args.stats_interval), ("--adaptive", args.adaptive),
+                                                ("--congestion", args.congestion), ("--clips-dir", args.clips_dir),
+                                                ("--crops-dir", args.crops_dir), ("--video-out", args.video_out),
+                                                ("--metrics-port", args.metrics_port)) if value not in (None, False)]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} no se puede usar con --workers > 1")
+    lanes, homography = load_config(args.config, args.camera)
+    options = load_pipeline_options(args.config, args.camera)
+    artifacts = load_project_artifacts(args.config, lanes, homography, args.camera)
+    if artifacts is not None:
+        options["geometry_artifacts"] = artifacts
+    if args.tracker:
+        options["tracker"] = args.tracker
+    if args.tiled:
+        options["inference_mode"] = "tiled"
+    if args.adaptive:
+        options.setdefault("adaptive_params", {})
+    if args.congestion:
+        options.setdefault("congestion_params", {})
+    if args.sink:
+        options["event_sinks"] = options.get("event_sinks", []) + [create_sink(url) for url in args.sink]
+    if args.clips_dir:
+        options["clip_params"] = {**options.get("clip_params", {}), "output_dir": args.clips_dir}
+    if args.crops_dir:
+        options["crop_params"] = {**options.get("crop_params", {}), "directory": args.crops_dir}
+    if args.video_out:
+        size = tuple(int(v) for v in args.video_size.lower().split("x")) if args.video_size else None
+        options["video_output_params"] = {"path": args.video_out, "output_size": size, "frame_step": args.video_step,
+                                          "codec": args.video_codec}
+    metrics_server = None
+    if args.metrics_port is not None:
+        options["metrics"] = PipelineMetrics()
+        metrics_server = MetricsServer(options["metrics"], args.metrics_host, args.metrics_port)
+        metrics_server.start()
+    if segmented:
+        try:
+            run_segmented(source, lanes, homography, args.events_out, args.stats_out, args.workers,
+                          overlap_seconds=args.overlap, **options)
+        except ValueError as e:
+            parser.error(str(e))  # opciones de la configuración de la cámara
+    else:
+        run(source, lanes, homography, args.events_out, args.stats_out,
+            args.stats_interval if args.stats_interval is not None else 10.0,
+            args.checkpoint, args.checkpoint_interval, args.occupancy_out, **options)
+    if metrics_server:
+        metrics_server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,13 @@
+from __future__ import annotations
+
 import numpy as np
 
-from typing import Tuple
+from typing import Tuple, TYPE_CHECKING
 from collections import defaultdict
 from abc import ABC, abstractmethod
-from ultralytics.engine.results import Results
+
+if TYPE_CHECKING:
+    from ultralytics.engine.results import Results
 
 
 class CountingVehiclesInterface(ABC):
@@ -1,12 +1,76 @@
+from __future__ import annotations
+
 import numpy as np
 
-from ultralytics import YOLO
+from typing import TYPE_CHECKING
 from abc import ABC, abstractmethod
-from ultralytics.engine.results import Results
+
+if TYPE_CHECKING:  # solo para anotaciones: el análisis de detecciones no necesita ultralytics
+    from ultralytics.engine.results import Results
 
 
 class VehicleDetectionInterface(ABC):
     """Abstract base class for detection vehicles in a frame."""
     @abstractmethod
     def inference(self, image: np.ndarray, classes_to_detect: list[int] = None) -> tuple[list[Results], dict[int, str]]:
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    @abstractmethod
+    def detect(self, image: np.ndarray, classes_to_detect: list[int] = None) -> tuple[list[Results], dict[int, str]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def detect_batch(self, images: list[np.ndarray], classes_to_detect: list[int] = None, imgsz: int = 640) -> tuple[list[Results], dict[int, str]]:
+        raise NotImplementedError
+
+
+class FrameDetections:
+    """
+    Detections of one frame as contiguous NumPy arrays.
+
+    Built once per frame (a single device -> host transfer) and shared by counting,
+    speed estimation, rendering and recording, so no stage touches the model tensors.
+    """
+    __slots__ = ("boxes", "track_ids", "class_ids", "confidences", "anchors", "class_names")
+
+    def __init__(self, boxes: np.ndarray, track_ids: np.ndarray | None, class_ids: np.ndarray,
+                 confidences: np.ndarray, class_names: dict[int, str] = None):
+        """
+        Args:
+            boxes (np.ndarray): (N, 4) float32 boxes in xyxy pixel coordinates.
+            track_ids (np.ndarray | None): (N,) int64 tracker IDs, None when the frame is not tracked.
+            class_ids (np.ndarray): (N,) int64 class IDs.
+            confidences (np.ndarray): (N,) float32 confidences.
+            class_names (dict[int, str]): Class ID -> name.
+        """
+        self.boxes = np.ascontiguousarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.track_ids = None if track_ids is None else np.ascontiguousarray(track_ids, dtype=np.int64)
+        self.class_ids = np.ascontiguousarray(class_ids, dtype=np.int64)
+        self.confidences = np.ascontiguousarray(confidences, dtype=np.float32)
+        self.class_names = class_names or {}
+        # punto de anclaje: centro inferior de la caja (contacto con la calzada)
+        self.anchors = np.empty((len(self.boxes), 2), dtype=np.float32)
+        self.anchors[:, 0] = (self.boxes[:, 0] + self.boxes[:, 2]) / 2
+        self.anchors[:, 1] = self.boxes[:, 3]
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @property
+    def has_ids(self) -> bool:
+        return self.track_ids is not None and len(self.track_ids) > 0
+
+    @classmethod
+    def empty(cls, class_names: dict[int, str] = None) -> "FrameDetections":
+        return cls(np.empty((0, 4), dtype=np.float32), None, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), class_names)
+
+    @classmethod
+    def from_results(cls, results: Results, class_names: dict[int, str] = None) -> "FrameDetections":
+        """Build the frame detections from an ultralytics result with one transfer of boxes.data."""
+        # data: [x1, y1, x2, y2, (track_id), conf, cls]
+        data = results.boxes.data.cpu().numpy()
+        if data.shape[1] == 7:
+            track_ids = data[:, 4]
+        else:
+            track_ids = None
+        return cls(data[:, :4], track_ids, data[:, -1], data[:, -2], class_names)
@@ -0,0 +1,23 @@
+import numpy as np
+from shapely.geometry import LineString
+
+
+class Lane:
+    """Lane geometry: polygon in pixel coordinates and its counting line."""
+    __slots__ = ("index", "polygon", "counting_line")
+
+    def __init__(self, index: int, polygon: np.ndarray, counting_line: LineString):
+        """
+        Args:
+            index (int): 0-based lane index.
+            polygon (np.ndarray): (N, 2) int32 polygon.
+            counting_line (LineString): Line a trajectory must cross to be counted.
+        """
+        self.index = index
+        self.polygon = polygon
+        self.counting_line = counting_line
+
+    @property
+    def number(self) -> int:
+        """1-based lane number shown to the user."""
+        return self.index + 1
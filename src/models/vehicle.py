@@ -0,0 +1,111 @@
+from datetime import datetime
+
+
+SPEED_STATUSES = ("Normal", "Lento", "Exceso de Velocidad")
+
+# columnas del registro de eventos en disco
+EVENT_LOG_FIELDS = ["track_id", "timestamp", "lane", "type", "speed", "confidence", "status"]
+
+
+def format_timestamp(timestamp: float, fmt: str = "%H:%M:%S") -> str:
+    """Epoch seconds -> local time text."""
+    return datetime.fromtimestamp(timestamp).strftime(fmt)
+
+
+def format_speed(speed: float) -> str:
+    """km/h -> text, '-' when the speed is unknown."""
+    return f"{speed:.1f}" if speed == speed and speed >= 0 else "-"
+
+
+def format_confidence(confidence: float) -> str:
+    """0..1 -> percentage text."""
+    return f"{confidence * 100:.0f}%"
+
+
+class CountEvent:
+    """A counted vehicle. Stores raw numbers; formatting is done by the UI / export."""
+    __slots__ = ("track_id", "timestamp", "lane", "class_id", "vehicle_type", "speed", "confidence", "status",
+                 "counted_speed")
+
+    def __init__(self, track_id: int, timestamp: float, lane: int, class_id: int, vehicle_type: str,
+                 speed: float, confidence: float, status: str, counted_speed: float = None):
+        """
+        Args:
+            track_id (int): Tracker ID of the vehicle.
+            timestamp (float): Epoch seconds of the crossing.
+            lane (int): Lane number (1-based).
+            class_id (int): Detector class ID.
+            vehicle_type (str): Class name.
+            speed (float): Speed in km/h (nan when unknown).
+            confidence (float): Detection confidence in [0, 1].
+            status (str): One of SPEED_STATUSES.
+            counted_speed (float): Speed added to the counters when the event was counted, default
+                `speed` (the pipeline refines `speed` with the same frame afterwards).
+        """
+        self.track_id = track_id
+        self.timestamp = timestamp
+        self.lane = lane
+        self.class_id = class_id
+        self.vehicle_type = vehicle_type
+        self.speed = speed
+        self.confidence = confidence
+        self.status = status
+        self.counted_speed = speed if counted_speed is None else counted_speed
+
+    def __repr__(self):
+        return (f"CountEvent(track_id={self.track_id}, lane={self.lane}, type={self.vehicle_type}, "
+                f"speed={self.speed:.1f}, status={self.status})")
+
+    @property
+    def status_code(self) -> int:
+        """Index of the status in SPEED_STATUSES."""
+        return SPEED_STATUSES.index(self.status)
+
+    def to_row(self) -> list:
+        """Raw values in the order of the event log columns (see EVENT_LOG_FIELDS)."""
+        return [self.track_id, self.timestamp, self.lane, self.vehicle_type, self.speed, self.confidence, self.status]
+
+    @classmethod
+    def from_row(cls, row: dict) -> "CountEvent":
+        """Build an event from a row read back from an event log (values may be strings)."""
+        timestamp = row["timestamp"]
+        try:
+            timestamp = float(timestamp)
+        except (TypeError, ValueError):
+            timestamp = datetime.fromisoformat(timestamp).timestamp()
+        speed = row.get("speed")
+        return cls(
+            track_id=int(row["track_id"]),
+            timestamp=timestamp,
+            lane=int(row["lane"]),
+            class_id=int(row.get("class_id", -1) or -1),
+            vehicle_type=row["type"],
+            speed=float(speed) if speed not in (None, "", "-") else float("nan"),
+            confidence=float(row.get("confidence") or 0),
+            status=row["status"],
+        )
+
+
+class Vehicle:
+    """Per-track state used by the line crossing logic."""
+    __slots__ = ("track_id", "class_id", "prev_anchor", "anchor", "last_seen")
+
+    def __init__(self, track_id: int, class_id: int, anchor: tuple[float, float], timestamp: float):
+        self.track_id = track_id
+        self.class_id = class_id
+        self.prev_anchor = None
+        self.anchor = anchor
+        self.last_seen = timestamp
+
+    def update(self, anchor: tuple[float, float], timestamp: float):
+        """Move the vehicle to a new anchor point (bottom center of its box)."""
+        self.prev_anchor = self.anchor
+        self.anchor = anchor
+        self.last_seen = timestamp
+
+    @property
+    def trajectory(self) -> tuple | None:
+        """Last displacement ((x0, y0), (x1, y1)), None until two positions are known."""
+        if self.prev_anchor is None:
+            return None
+        return self.prev_anchor, self.anchor
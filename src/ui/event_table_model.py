@@ -0,0 +1,137 @@
+import numpy as np
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+from data.event_store import EventStore
+from models.vehicle import format_timestamp, format_speed, format_confidence
+
+
+class EventTableModel(QAbstractTableModel):
+    HEADERS = ["Hora", "Carril", "Tipo", "Velocidad", "Confianza", "Estado"]
+    FIELDS = ["timestamp", "lane", "type", "speed", "confidence", "status"]
+
+    def __init__(self, store: EventStore, batch_size: int = 500, parent=None):
+        """
+        Table model over an EventStore.
+
+        The model only holds an index array (the filtered/sorted view of the store) and
+        exposes it in batches through canFetchMore/fetchMore, so the view creates rows
+        lazily while scrolling. Without a sort, new events only filter the appended rows
+        and extend the index array, so a refresh costs O(new events).
+
+        Args:
+            store (EventStore): Columnar event store.
+            batch_size (int): Rows loaded per fetchMore call.
+        """
+        super().__init__(parent)
+        self.store = store
+        self.batch_size = batch_size
+        self.filters = {}
+        self.sort_field = None
+        self.descending = False
+        self._view = np.empty(0, dtype=np.int64)  # filas visibles en [:_size], crece duplicando
+        self._size = 0
+        self._indexed = 0  # filas del store ya consideradas por la vista
+        self._loaded = 0
+
+    # --- QAbstractTableModel ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+
+        row = self._view[index.row()]
+        field = self.FIELDS[index.column()]
+        value = self.store.columns[field][row]
+
+        if field == "timestamp":
+            return format_timestamp(value)
+        if field == "type":
+            return self.store.vehicle_types[value]
+        if field == "status":
+            return EventStore.STATUSES[value]
+        if field == "speed":
+            return format_speed(value)
+        if field == "confidence":
+            return format_confidence(value)
+        return str(value)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < self._size
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        remaining = self._size - self._loaded
+        to_fetch = min(self.batch_size, remaining)
+        if to_fetch <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + to_fetch - 1)
+        self._loaded += to_fetch
+        self.endInsertRows()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_field = self.FIELDS[column] if column >= 0 else None
+        self.descending = order == Qt.DescendingOrder
+        self.refresh(reset=True)
+
+    # --- vista ---
+    def set_filters(self, lane: int = None, vehicle_type: str = None, status: str = None, time_range: tuple = None):
+        """Apply new filters (None disables a filter) and rebuild the view."""
+        self.filters = {"lane": lane, "vehicle_type": vehicle_type, "status": status, "time_range": time_range}
+        self.refresh(reset=True)
+
+    def refresh(self, reset: bool = False):
+        """
+        Update the view after new events or a filter/sort change.
+
+        In insertion order only the events appended since the last refresh are filtered
+        and added at the end. With a sort the view is recomputed; if the previous view is
+        still a prefix of it the loaded rows are kept. New rows are fetched on demand (or
+        right away if the whole view was already loaded); otherwise the model is reset.
+        """
+        if not reset and self.sort_field is None:
+            self._append(self.store.query(start=self._indexed, **self.filters))
+            self._indexed = len(self.store)
+            return
+
+        view = self.store.query(sort_by=self.sort_field, descending=self.descending, **self.filters)
+        self._indexed = len(self.store)
+
+        is_append = (not reset and len(view) >= self._size
+                     and np.array_equal(view[:self._loaded], self._view[:self._loaded]))
+        if is_append:
+            was_fully_loaded = self._loaded == self._size
+            self._view, self._size = view, len(view)
+            if was_fully_loaded:
+                self.fetchMore()
+            return
+
+        self.beginResetModel()
+        self._view, self._size = view, len(view)
+        self._loaded = min(self.batch_size, len(view))
+        self.endResetModel()
+
+    def _append(self, rows: np.ndarray):
+        """Add rows at the end of the view, growing the index array by doubling."""
+        if not len(rows):
+            return
+        was_fully_loaded = self._loaded == self._size
+        new_size = self._size + len(rows)
+        if new_size > len(self._view):
+            grown = np.empty(max(2 * len(self._view), new_size), dtype=np.int64)
+            grown[:self._size] = self._view[:self._size]
+            self._view = grown
+        self._view[self._size:new_size] = rows
+        self._size = new_size
+        if was_fully_loaded:
+            self.fetchMore()
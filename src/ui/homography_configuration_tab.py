@@ -1,46 +1,8 @@
 from PySide6.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QGroupBox, QLabel, QFormLayout, QLineEdit, QFrame, QSpinBox
-from PySide6.QtCore import Qt, Signal, QPoint, QPointF
-from PySide6.QtGui import QImage, QPixmap, QPainter, QColor, QPen, QFont, QPolygonF
+from PySide6.QtCore import Qt, Signal, QPoint, QPointF, QTimer
+from PySide6.QtGui import QImage, QPixmap, QColor, QPen, QFont, QPolygonF
 
-
-class ClickableLabel(QLabel):
-    pointModified = Signal(int, QPoint) # point_global_idx, new_pos
-
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.points_data = []
-        self.pixmap_size = QPoint(0,0)
-
-    def set_points_data(self, points):
-        self.points_data = points
-
-    def set_pixmap_size(self, size):
-        self.pixmap_size = size
-
-    def mousePressEvent(self, event):
-        if not self.pixmap(): return
-        
-        widget_pos = event.pos()
-        pixmap_w, pixmap_h = self.pixmap_size.x(), self.pixmap_size.y()
-        if pixmap_w == 0 or pixmap_h == 0: return
-
-        scaled_pixmap = self.pixmap().scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        offset_x = (self.width() - scaled_pixmap.width()) / 2
-        offset_y = (self.height() - scaled_pixmap.height()) / 2
-        img_x = (widget_pos.x() - offset_x) * pixmap_w / scaled_pixmap.width()
-        img_y = (widget_pos.y() - offset_y) * pixmap_h / scaled_pixmap.height()
-        click_pos = QPoint(int(img_x), int(img_y))
-
-        min_dist = float('inf')
-        closest_point_idx = -1
-        for i, point in enumerate(self.points_data):
-            dist = (click_pos - point).manhattanLength()
-            if dist < min_dist and dist < 1000:
-                min_dist = dist
-                closest_point_idx = i
-        
-        if closest_point_idx != -1:
-            self.pointModified.emit(closest_point_idx, click_pos)
+from .overlay_preview import OverlayPreview
 
 
 class HomographyConfigurationTab(QWidget):
@@ -58,6 +20,12 @@ class HomographyConfigurationTab(QWidget):
         self.width_lineedit = QLineEdit("3.5")
         self.length_lineedit = QLineEdit("10.0")
         
+        # bursts of spinbox / drag edits are merged into one redraw per UI frame
+        self.redraw_timer = QTimer(self)
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.setInterval(16)
+        self.redraw_timer.timeout.connect(self.redraw_lines)
+        
         main_layout = QHBoxLayout(self)
         
         # left panel
@@ -89,8 +57,9 @@ class HomographyConfigurationTab(QWidget):
         preview_label = QLabel("Aquí se mostrarán los puntos:<br><span style='color:red;'>● Puntos Verticales</span><br><span style='color:blue;'>● Puntos Horizontales</span>")
         preview_label.setAlignment(Qt.AlignTop)
         
-        self.preview_area = ClickableLabel()
-        self.preview_area.pointModified.connect(self.update_point_from_click)
+        self.preview_area = OverlayPreview()
+        self.preview_area.set_overlay_painter(self._draw_points)
+        self.preview_area.pointModified.connect(lambda _, point_idx, pos: self.update_point_from_click(point_idx, pos))
         self.preview_area.setFrameShape(QFrame.Box)
         self.preview_area.setMinimumSize(1280, 720)
         self.preview_area.setStyleSheet("background-color: black; color: white;")
@@ -112,7 +81,7 @@ class HomographyConfigurationTab(QWidget):
             # Campo de distancia con QLineEdit
             dist_input = QLineEdit()
             dist_input.setPlaceholderText("e.g., 5.5")
-            dist_input.textChanged.connect(self.redraw_lines)
+            dist_input.textChanged.connect(self.schedule_redraw)
             self.all_inputs.append(dist_input)
             self.distance_lineedits.append(dist_input)
             form_layout.addRow(f"Distancia Real {i+1} (m):", dist_input)
@@ -128,8 +97,8 @@ class HomographyConfigurationTab(QWidget):
         coord_layout.addWidget(QLabel("Y:"))
         coord_layout.addWidget(y_spin)
         
-        x_spin.valueChanged.connect(self.redraw_lines)
-        y_spin.valueChanged.connect(self.redraw_lines)
+        x_spin.valueChanged.connect(self.schedule_redraw)
+        y_spin.valueChanged.connect(self.schedule_redraw)
         
         return x_spin, y_spin, coord_layout
     
@@ -142,16 +111,22 @@ class HomographyConfigurationTab(QWidget):
             points.append(QPoint(x,y))
         return points
     
+    def schedule_redraw(self):
+        """Request a redraw; several requests before the timer fires produce one redraw."""
+        self.redraw_timer.start()
+    
     def redraw_lines(self):
         if not self.base_pixmap: return
         
+        self.preview_area.set_points_data([self.get_all_points()])
+        # solo se repinta la capa de puntos sobre el pixmap ya escalado
+        self.preview_area.update()
+        self.validate_config()
+    
+    def _draw_points(self, painter, scale):
+        """Overlay painter of the preview (image coordinates)."""
         scale_factor, line_thickness, font_size = self._get_dynamic_scale()
-
-        pixmap_to_draw = self.base_pixmap.copy()
-        painter = QPainter(pixmap_to_draw)
-        
-        points = self.get_all_points()
-        self.preview_area.set_points_data(points)
+        points = self.preview_area.points_data[0] if self.preview_area.points_data else []
         
         if len(points) == 4:
             polygon = QPolygonF([QPointF(p) for p in points])
@@ -164,10 +139,6 @@ class HomographyConfigurationTab(QWidget):
             for i, point in enumerate(points):
                 painter.drawEllipse(point, point_radius, point_radius)
                 painter.drawText(point.x() + 10, point.y(), f"P{i+1}")
-
-        painter.end()
-        self.preview_area.setPixmap(pixmap_to_draw.scaled(self.preview_area.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
-        self.validate_config()
     
     def update_spinbox_limits(self):
         for i, spinbox in enumerate(self.coord_spinboxes):
@@ -189,7 +160,7 @@ class HomographyConfigurationTab(QWidget):
         self.frame_height = height
         
         self.base_pixmap = QPixmap.fromImage(image)
-        self.preview_area.set_pixmap_size(QPoint(width, height))
+        self.preview_area.set_base_pixmap(self.base_pixmap)
         
         self.update_spinbox_limits()
         self.redraw_lines()
@@ -206,7 +177,7 @@ class HomographyConfigurationTab(QWidget):
         self.coord_spinboxes[base_spinbox_idx].blockSignals(False)
         self.coord_spinboxes[base_spinbox_idx+1].blockSignals(False)
         
-        self.redraw_lines()
+        self.schedule_redraw()
         
     def get_homography_data(self) -> dict:
         """Recopila y devuelve todos los datos de configuración de homografía."""
@@ -221,6 +192,20 @@ class HomographyConfigurationTab(QWidget):
             "real_length_m": float(self.length_lineedit.text() or 0)
         }
     
+    def set_homography_data(self, config: dict):
+        """Load points and real distances, e.g. from a project file."""
+        for i, (x, y) in enumerate(config.get("image_points", [])[:4]):
+            for spinbox, value in ((self.coord_spinboxes[i * 2], x), (self.coord_spinboxes[i * 2 + 1], y)):
+                spinbox.blockSignals(True)
+                spinbox.setMaximum(max(spinbox.maximum(), int(value)))
+                spinbox.setValue(int(value))
+                spinbox.blockSignals(False)
+        if config.get("real_width_m"):
+            self.width_lineedit.setText(str(config["real_width_m"]))
+        if config.get("real_length_m"):
+            self.length_lineedit.setText(str(config["real_length_m"]))
+        self.schedule_redraw()
+        
     def _get_dynamic_scale(self):
         """Calcula un factor de escala para el dibujo basado en el ancho del frame."""
         if self.frame_width == 0:
@@ -1,62 +1,8 @@
 from PySide6.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QGroupBox, QLabel, QSpinBox, QFormLayout, QScrollArea, QFrame
-from PySide6.QtGui import QImage, QPixmap, QPainter, QColor, QPolygonF, QPen
-from PySide6.QtCore import Qt, Signal, QPointF, QPoint
+from PySide6.QtGui import QImage, QPixmap, QColor, QPolygonF, QPen
+from PySide6.QtCore import Qt, Signal, QPointF, QPoint, QTimer
 
-
-class ClickableLabel(QLabel):
-    pointModified = Signal(int, int, QPoint)
-    
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.points_data = []
-        self.pixmap_size = QPoint(0,0)
-        
-    def set_points_data(self, points):
-        """Set points data and update the label."""
-        self.points_data = points
-        
-    def set_pixmap_size(self, size):
-        """Set the size of the pixmap to scale points correctly."""
-        self.pixmap_size = size
-        
-    def mousePressEvent(self, event):
-        if not self.pixmap():
-            return
-        
-        # escale
-        widget_pos = event.pos()
-        pixmap_w = self.pixmap_size.x()
-        pixmap_h = self.pixmap_size.y()
-        
-        if pixmap_w == 0 or pixmap_h == 0:
-            return
-        
-        # aspect ratio
-        scaled_pixmap = self.pixmap().scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        offset_x = (self.width() - scaled_pixmap.width()) / 2
-        offset_y = (self.height() - scaled_pixmap.height()) / 2
-        
-        img_x = (widget_pos.x() - offset_x) * pixmap_w / scaled_pixmap.width()
-        img_y = (widget_pos.y() - offset_y) * pixmap_h / scaled_pixmap.height()
-        
-        click_pos = QPoint(int(img_x), int(img_y))
-        
-        # find nearest point
-        min_dist = float('inf')
-        closest_lane = -1
-        closest_point_idx = -1
-        
-        for lane_idx, lane_points in enumerate(self.points_data):
-            for point_idx, point in enumerate(lane_points):
-                dist = (click_pos - point).manhattanLength()
-                if dist < min_dist and dist < 1000:
-                    min_dist = dist
-                    closest_lane = lane_idx
-                    closest_point_idx = point_idx
-                    
-        if closest_lane != -1:
-            # emit signal with lane index, point index and position
-            self.pointModified.emit(closest_lane, closest_point_idx, click_pos)
+from .overlay_preview import OverlayPreview
 
 
 class LaneConfigurationTab(QWidget):
@@ -79,6 +25,12 @@ class LaneConfigurationTab(QWidget):
             QColor(155, 89, 182, 90),  # Morado
         ]
         
+        # bursts of spinbox / drag edits are merged into one redraw per UI frame
+        self.redraw_timer = QTimer(self)
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.setInterval(16)
+        self.redraw_timer.timeout.connect(self.redraw_lanes)
+        
         # Layout principal
         main_layout = QHBoxLayout(self)
         
@@ -110,7 +62,8 @@ class LaneConfigurationTab(QWidget):
         right_panel = QGroupBox("Vista Previa de Carriles")
         right_layout = QVBoxLayout(right_panel)
         
-        self.preview_area = ClickableLabel("Aquí se mostrará la vista previa de los carriles.")
+        self.preview_area = OverlayPreview("Aquí se mostrará la vista previa de los carriles.")
+        self.preview_area.set_overlay_painter(self._draw_lanes)
         self.preview_area.pointModified.connect(self.update_point_from_click)
         self.preview_area.setFrameShape(QFrame.Box)
         self.preview_area.setAlignment(Qt.AlignCenter)
@@ -143,20 +96,25 @@ class LaneConfigurationTab(QWidget):
             return [[(p.x(), p.y()) for p in lane] for lane in all_points]
         return all_points
     
+    def schedule_redraw(self):
+        """Request a redraw; several requests before the timer fires produce one redraw."""
+        self.redraw_timer.start()
+        
     def redraw_lanes(self):
         """Redraw lanes on the preview area based on current points."""
         if not self.base_pixmap:
             return
         
-        line_thickness, point_radius = self._get_dynamic_scale()
+        self.preview_area.set_points_data(self.get_all_lane_points())
+        # solo se repinta la capa de carriles sobre el pixmap ya escalado
+        self.preview_area.update()
+        self.validate_config()
         
-        pixmap_to_draw = self.base_pixmap.copy()
-        painter = QPainter(pixmap_to_draw)
+    def _draw_lanes(self, painter, scale):
+        """Overlay painter of the preview (image coordinates)."""
+        line_thickness, point_radius = self._get_dynamic_scale()
         
-        all_lane_points = self.get_all_lane_points()
-        self.preview_area.set_points_data(all_lane_points)
-
-        for i, lane_points in enumerate(all_lane_points):
+        for i, lane_points in enumerate(self.preview_area.points_data):
             if len(lane_points) == 4:
                 polygon = QPolygonF([QPointF(p) for p in lane_points])
                 color = self.lane_colors[i % len(self.lane_colors)]
@@ -172,10 +130,19 @@ class LaneConfigurationTab(QWidget):
                 painter.setBrush(Qt.white)
                 for point in lane_points:
                     painter.drawEllipse(point, point_radius, point_radius)
-
-        painter.end()
-        self.preview_area.setPixmap(pixmap_to_draw.scaled(self.preview_area.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
-        self.validate_config()
+        
+    def set_lanes(self, lanes: list):
+        """Load lane polygons (lists of (x, y), 4 points each), e.g. from a project file."""
+        self.spin_num_lanes.setValue(len(lanes))
+        for i, lane in enumerate(lanes):
+            for j, (x, y) in enumerate(lane[:4]):
+                for spinbox, value in ((self.lane_spinboxes[i * 8 + j * 2], x), (self.lane_spinboxes[i * 8 + j * 2 + 1], y)):
+                    spinbox.blockSignals(True)
+                    # sin fuente cargada los límites aún no se conocen
+                    spinbox.setMaximum(max(spinbox.maximum(), int(value)))
+                    spinbox.setValue(int(value))
+                    spinbox.blockSignals(False)
+        self.schedule_redraw()
         
     def update_lane_inputs(self, num_lanes):
         # clean layout
@@ -203,8 +170,8 @@ class LaneConfigurationTab(QWidget):
                 self.lane_spinboxes.extend([x_spin, y_spin])
                 
                 # connect validation
-                x_spin.valueChanged.connect(self.redraw_lanes)
-                y_spin.valueChanged.connect(self.redraw_lanes)
+                x_spin.valueChanged.connect(self.schedule_redraw)
+                y_spin.valueChanged.connect(self.schedule_redraw)
                 lane_form.addRow(f"Punto {j+1}:", coord_layout)
                 
             self.lanes_layout.addWidget(lane_box)
@@ -233,7 +200,7 @@ class LaneConfigurationTab(QWidget):
         self.frame_height = height
         
         self.base_pixmap = QPixmap.fromImage(image)
-        self.preview_area.set_pixmap_size(QPoint(width, height))
+        self.preview_area.set_base_pixmap(self.base_pixmap)
         
         self.update_spinbox_limits()
         self.redraw_lanes()
@@ -253,7 +220,7 @@ class LaneConfigurationTab(QWidget):
         self.lane_spinboxes[base_idx + 1].blockSignals(False)
         
         # redraw lanes
-        self.redraw_lanes()
+        self.schedule_redraw()
         
     def _get_dynamic_scale(self):
         if self.frame_width == 0: return 2, 5 # Defaults
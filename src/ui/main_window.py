@@ -1,4 +1,6 @@
-from PySide6.QtWidgets import QMainWindow, QTabWidget, QVBoxLayout, QWidget, QStatusBar
+import os
+import logging as log
+from PySide6.QtWidgets import QMainWindow, QTabWidget, QVBoxLayout, QWidget, QStatusBar, QFileDialog
 from PySide6.QtGui import QAction
 from PySide6.QtCore import Signal
 
@@ -6,6 +8,8 @@ from .video_analysis_tab import VideoAnalysisTab
 from .lane_configuration_tab import LaneConfigurationTab
 from .homography_configuration_tab import HomographyConfigurationTab
 from .metrics_tab import MetricsTab
+from core.geometry_artifacts import load_geometry_artifacts
+from utils.config_manager import ProjectConfig, camera_pipeline_options, camera_settings
 
 class MainWindow(QMainWindow):
     configStatusChanged = Signal(bool)
@@ -61,6 +65,9 @@ class MainWindow(QMainWindow):
         file_menu.addAction(save_project)
         file_menu.addSeparator()
         file_menu.addAction(export_data)
+        load_project.triggered.connect(self.load_project)
+        save_project.triggered.connect(self.save_project)
+        export_data.triggered.connect(self.metrics_tab.export_to_csv)
         
         # config menu
         config_menu = menu_bar.addMenu("Configuración")
@@ -84,7 +91,6 @@ class MainWindow(QMainWindow):
         # first frame
         self.video_tab.firstFrameReady.connect(self.lane_tab.update_preview_image)
         self.video_tab.firstFrameReady.connect(self.homography_tab.update_preview_image)
-        self.video_tab.firstFrameReady.connect(lambda img, w, h: self.video_tab.update_video_frame(img))
         
         # config validation
         self.lane_tab.configChanged.connect(self.on_lane_config_changed)
@@ -101,10 +107,14 @@ class MainWindow(QMainWindow):
     def on_lane_config_changed(self, is_valid):
         self.is_lane_config_valid = is_valid
         self._check_overall_config()
+        if is_valid:
+            self.video_tab.schedule_live_config()
     
     def on_homography_config_changed(self, is_valid):
         self.is_homography_config_valid = is_valid
         self._check_overall_config()
+        if is_valid:
+            self.video_tab.schedule_live_config()
         
     def on_video_source_changed(self, has_source):
         self.has_video_source = has_source
@@ -114,4 +124,62 @@ class MainWindow(QMainWindow):
         """check all validations."""
         is_ready = self.is_lane_config_valid and self.is_homography_config_valid and self.has_video_source
         self.configStatusChanged.emit(is_ready)
-        
\ No newline at end of file
+        
+    def _camera_name(self) -> str:
+        source = self.video_tab.video_source_path
+        return os.path.basename(str(source)) if source is not None else "camara"
+        
+    def save_project(self):
+        """Save lanes, homography and camera settings, and cache the derived geometry."""
+        path, _ = QFileDialog.getSaveFileName(self, "Guardar Proyecto", "", "Proyecto (*.json)")
+        if not path:
+            return
+        try:
+            project = ProjectConfig.load(path) if os.path.exists(path) else ProjectConfig(path)
+            lanes = self.lane_tab.get_all_lane_points(as_tuples=True)
+            homography = self.homography_tab.get_homography_data()
+            frame_size = (self.lane_tab.frame_width, self.lane_tab.frame_height) if self.lane_tab.frame_width else None
+            
+            artifacts_key = None
+            if frame_size:
+                artifacts = load_geometry_artifacts(project.artifact_cache, lanes, homography, frame_size)
+                artifacts_key = str(artifacts["key"])
+                self.video_tab.video_processor.set_geometry_artifacts(artifacts)
+            
+            source = self.video_tab.video_source_path
+            project.set_camera(self._camera_name(), lanes, homography, source=source if isinstance(source, str) else None,
+                               frame_size=frame_size, settings=camera_settings(self.video_tab.video_processor.pipeline_options),
+                               artifacts_key=artifacts_key)
+            project.save(path)
+            self.status_bar.showMessage(f"Proyecto guardado: {path}", 5000)
+        except (OSError, ValueError) as e:
+            log.error(f"No se pudo guardar el proyecto: {e}")
+            self.status_bar.showMessage(f"Error al guardar el proyecto: {e}")
+        
+    def load_project(self):
+        """Load the active camera of a project: source, lanes, homography, settings and cached geometry."""
+        path, _ = QFileDialog.getOpenFileName(self, "Cargar Proyecto", "", "Proyecto (*.json)")
+        if not path:
+            return
+        try:
+            project = ProjectConfig.load(path)
+            camera = project.get_camera()
+        except (OSError, ValueError, KeyError) as e:
+            log.error(f"No se pudo cargar el proyecto: {e}")
+            self.status_bar.showMessage(f"Error al cargar el proyecto: {e}")
+            return
+        
+        # la fuente primero: el primer fotograma fija los límites de las coordenadas
+        source = camera.get("source")
+        if source and os.path.exists(source):
+            self.video_tab.process_new_source(source)
+        
+        self.lane_tab.set_lanes(camera["lanes"])
+        self.homography_tab.set_homography_data(camera["homography"])
+        
+        processor = self.video_tab.video_processor
+        processor.pipeline_options = camera_pipeline_options(camera)
+        if camera.get("frame_size"):
+            processor.set_geometry_artifacts(
+                load_geometry_artifacts(project.artifact_cache, camera["lanes"], camera["homography"], camera["frame_size"]))
+        self.status_bar.showMessage(f"Proyecto cargado: {path} ({project.active_camera})", 5000)
@@ -1,6 +1,11 @@
 import csv
 from datetime import datetime
-from PySide6.QtWidgets import (QWidget, QVBoxLayout, QGroupBox, QFormLayout, QLabel, QScrollArea, QPushButton, QTableWidget, QTableWidgetItem, QFileDialog, QHeaderView)
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGroupBox, QFormLayout, QLabel, QScrollArea, QPushButton, QTableView, QFileDialog, QHeaderView, QComboBox)
+from PySide6.QtCore import Qt
+
+from data.event_store import EventStore
+from models.vehicle import format_timestamp, format_speed, format_confidence
+from .event_table_model import EventTableModel
 
 
 class MetricsTab(QWidget):
@@ -9,6 +14,12 @@ class MetricsTab(QWidget):
         
         self.stats_data = {}
         self.vehicle_types = ["car", "motorcycle", "bus", "truck", "bicycle"]
+        self.rolling_windows = {"5min": "Últimos 5 min", "1h": "Última hora"}
+        self.time_windows = {"Toda la sesión": None, "Últimos 5 min": 5 * 60, "Última hora": 60 * 60, "Últimas 24 h": 24 * 60 * 60}
+        
+        # registro completo de la sesión
+        self.event_store = EventStore()
+        self.event_model = EventTableModel(self.event_store)
         
         main_layout = QVBoxLayout(self)
         self.export_button = QPushButton("📄 Exportar a .csv")
@@ -23,7 +34,8 @@ class MetricsTab(QWidget):
         scroll_area.setWidget(content_widget)
         
         main_layout.addWidget(self.export_button)
-        main_layout.addWidget(scroll_area)
+        main_layout.addWidget(scroll_area, 1)
+        main_layout.addWidget(self._create_event_browser(), 1)
         
         # Contenedores para las UI de las métricas
         self.lane_widgets = {}
@@ -31,6 +43,57 @@ class MetricsTab(QWidget):
         
         self.update_metrics_display(1)
         
+    def _create_event_browser(self) -> QGroupBox:
+        """Tabla virtualizada del registro de eventos con filtros."""
+        browser_box = QGroupBox("Registro de Eventos")
+        browser_layout = QVBoxLayout(browser_box)
+        
+        # filtros
+        filters_layout = QHBoxLayout()
+        self.lane_filter = QComboBox()
+        self.lane_filter.addItem("Todos")
+        self.type_filter = QComboBox()
+        self.type_filter.addItems(["Todos"] + self.vehicle_types)
+        self.status_filter = QComboBox()
+        self.status_filter.addItems(["Todos"] + EventStore.STATUSES)
+        self.window_filter = QComboBox()
+        self.window_filter.addItems(list(self.time_windows.keys()))
+        
+        for label, combo in [("Carril:", self.lane_filter), ("Tipo:", self.type_filter),
+                             ("Estado:", self.status_filter), ("Periodo:", self.window_filter)]:
+            filters_layout.addWidget(QLabel(label))
+            filters_layout.addWidget(combo)
+            combo.currentIndexChanged.connect(self.apply_event_filters)
+        filters_layout.addStretch()
+        
+        # tabla
+        self.event_table = QTableView()
+        self.event_table.setModel(self.event_model)
+        self.event_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.event_table.setSortingEnabled(True)
+        self.event_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.event_table.verticalHeader().setVisible(False)
+        
+        browser_layout.addLayout(filters_layout)
+        browser_layout.addWidget(self.event_table)
+        return browser_box
+    
+    def apply_event_filters(self):
+        """Aplica los filtros seleccionados sobre el registro de eventos."""
+        lane = self.lane_filter.currentText()
+        v_type = self.type_filter.currentText()
+        status = self.status_filter.currentText()
+        window = self.time_windows.get(self.window_filter.currentText())
+        # "ahora" es el último evento: con reloj de video los eventos no llevan la hora actual
+        latest = self.event_store.latest_timestamp
+        
+        self.event_model.set_filters(
+            lane=int(lane) if lane != "Todos" else None,
+            vehicle_type=v_type if v_type != "Todos" else None,
+            status=status if status != "Todos" else None,
+            time_range=(latest - window, None) if window and latest is not None else None,
+        )
+        
     def update_metrics_display(self, num_lanes):
         # clean lanes
         while self.metrics_layout.count():
@@ -49,7 +112,9 @@ class MetricsTab(QWidget):
                 "counts": {v_type: QLabel("0") for v_type in self.vehicle_types},
                 "dist": {
                     "slow": QLabel("0"), "normal": QLabel("0"), "fast": QLabel("0")
-                }
+                },
+                "rolling": {window: QLabel("-") for window in self.rolling_windows},
+                "congestion": {"queue": QLabel("-"), "stopped": QLabel("-"), "delay": QLabel("-")},
             }
             form.addRow("Velocidad Promedio:", widgets["avg_speed"])
             form.addRow("Velocidad Mín/Máx:", widgets["min_speed"])
@@ -64,6 +129,15 @@ class MetricsTab(QWidget):
             form.addRow("  - Normales (40-60 km/h):", widgets["dist"]["normal"])
             form.addRow("  - Rápidos (>60 km/h):", widgets["dist"]["fast"])
             
+            form.addRow(QLabel("<b>Tráfico Reciente (flujo · velocidad · exceso):</b>"))
+            for window, title in self.rolling_windows.items():
+                form.addRow(f"  - {title}:", widgets["rolling"][window])
+            
+            form.addRow(QLabel("<b>Congestión:</b>"))
+            form.addRow("  - Cola (actual / máx.):", widgets["congestion"]["queue"])
+            form.addRow("  - Detenidos / en el carril:", widgets["congestion"]["stopped"])
+            form.addRow("  - Demora media por vehículo:", widgets["congestion"]["delay"])
+            
             self.metrics_layout.addWidget(lane_box)
             self.lane_widgets[i] = widgets
 
@@ -73,59 +147,82 @@ class MetricsTab(QWidget):
         self.global_widgets = {
             "avg_speed": QLabel("- km/h"),
             "counts": {v_type: QLabel("0") for v_type in self.vehicle_types},
-            "preview_table": QTableWidget()
         }
-        self.global_widgets["preview_table"].setRowCount(5)
-        self.global_widgets["preview_table"].setColumnCount(6)
-        self.global_widgets["preview_table"].setHorizontalHeaderLabels(["Hora", "Carril", "Tipo", "Velocidad", "Confianza", "Estado"])
-        self.global_widgets["preview_table"].horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
 
         global_form.addRow("Velocidad Promedio Total:", self.global_widgets["avg_speed"])
         global_form.addRow(QLabel("<b>Conteo Total de Vehículos:</b>"))
         for v_type in self.vehicle_types:
             global_form.addRow(f"  - {v_type.capitalize()}:", self.global_widgets["counts"][v_type])
-        global_form.addRow(QLabel("<b>Vista Previa de Datos a Exportar:</b>"))
-        global_form.addRow(self.global_widgets["preview_table"])
         
         self.metrics_layout.addWidget(global_box)
         self.metrics_layout.addStretch()
+        
+        # filtro de carril
+        self.lane_filter.blockSignals(True)
+        self.lane_filter.clear()
+        self.lane_filter.addItems(["Todos"] + [str(i+1) for i in range(num_lanes)])
+        self.lane_filter.blockSignals(False)
                             
+    @staticmethod
+    def _set_text(label: QLabel, text: str):
+        """Actualiza el texto solo si cambió, para evitar repintados innecesarios."""
+        if label.text() != text:
+            label.setText(text)
+    
     def update_statistics(self, stats: dict):
-        """Recibe el paquete completo de estadísticas y actualiza toda la UI."""
-        self.stats_data = stats
-        self.export_button.setEnabled(bool(stats.get("log_preview")))
-
-        # Actualizar métricas por carril
-        for lane_idx, lane_stats in stats.get("lanes", {}).items():
-            if lane_idx in self.lane_widgets:
-                widgets = self.lane_widgets[lane_idx]
-                widgets["avg_speed"].setText(f"{lane_stats['avg_speed']:.1f} km/h")
-                widgets["min_speed"].setText(f"{lane_stats['min_speed']:.1f} / {lane_stats['max_speed']:.1f} km/h")
-                for v_type, count in lane_stats["vehicle_counts"].items():
-                    if v_type in widgets["counts"]: widgets["counts"][v_type].setText(str(count))
-                widgets["dist"]["slow"].setText(str(lane_stats["speed_dist"]["slow"]))
-                widgets["dist"]["normal"].setText(str(lane_stats["speed_dist"]["normal"]))
-                widgets["dist"]["fast"].setText(str(lane_stats["speed_dist"]["fast"]))
-        
-        # Actualizar métricas globales
-        glob_stats = stats.get("global", {})
-        if glob_stats:
-            self.global_widgets["avg_speed"].setText(f"{glob_stats['avg_speed']:.1f} km/h")
-            for v_type, count in glob_stats["vehicle_counts"].items():
-                if v_type in self.global_widgets["counts"]: self.global_widgets["counts"][v_type].setText(str(count))
+        """
+        Recibe un delta de estadísticas (carriles modificados + eventos nuevos)
+        y actualiza solo los widgets afectados en un único repintado.
+        """
+        self.stats_data.update(stats)
+        new_events = stats.get("newly_counted", [])
+        
+        self.setUpdatesEnabled(False)
+        try:
+            # Actualizar métricas por carril
+            for lane_idx, lane_stats in stats.get("lanes", {}).items():
+                if lane_idx in self.lane_widgets:
+                    widgets = self.lane_widgets[lane_idx]
+                    self._set_text(widgets["avg_speed"], f"{lane_stats['avg_speed']:.1f} km/h")
+                    self._set_text(widgets["min_speed"], f"{lane_stats['min_speed']:.1f} / {lane_stats['max_speed']:.1f} km/h")
+                    for v_type, count in lane_stats["vehicle_counts"].items():
+                        if v_type in widgets["counts"]: self._set_text(widgets["counts"][v_type], str(count))
+                    for key in ("slow", "normal", "fast"):
+                        self._set_text(widgets["dist"][key], str(lane_stats["speed_dist"][key]))
+            
+            # Actualizar métricas de ventana deslizante
+            for window, lanes in stats.get("rolling", {}).items():
+                for lane_idx, metrics in lanes.items():
+                    if lane_idx in self.lane_widgets and window in self.lane_widgets[lane_idx]["rolling"]:
+                        self._set_text(self.lane_widgets[lane_idx]["rolling"][window],
+                                       f"{metrics['flow_rate']:.0f} veh/h · {metrics['mean_speed']:.1f} km/h · {metrics['speeding_share'] * 100:.0f}%")
+            
+            # Actualizar congestión (cola, detenidos y demora)
+            for lane_idx, congestion in stats.get("congestion", {}).items():
+                if lane_idx in self.lane_widgets:
+                    widgets = self.lane_widgets[lane_idx]["congestion"]
+                    self._set_text(widgets["queue"], f"{congestion['queue_length_m']:.0f} m / {congestion['max_queue_length_m']:.0f} m")
+                    self._set_text(widgets["stopped"], f"{congestion['stopped']} / {congestion['vehicles']}")
+                    self._set_text(widgets["delay"], f"{congestion['avg_delay_s']:.1f} s ({congestion['completed_vehicles']} veh.)")
+            
+            # Actualizar métricas globales
+            glob_stats = stats.get("global", {})
+            if glob_stats:
+                self._set_text(self.global_widgets["avg_speed"], f"{glob_stats['avg_speed']:.1f} km/h")
+                for v_type, count in glob_stats["vehicle_counts"].items():
+                    if v_type in self.global_widgets["counts"]: self._set_text(self.global_widgets["counts"][v_type], str(count))
 
-        # Actualizar tabla de vista previa
-        table = self.global_widgets["preview_table"]
-        log_preview = stats.get("log_preview", [])
-        table.setRowCount(len(log_preview))
-        for row, event in enumerate(log_preview):
-            for col, key in enumerate(["timestamp", "lane", "type", "speed", "confidence", "status"]):
-                table.setItem(row, col, QTableWidgetItem(str(event.get(key, ''))))
+            # Añadir los eventos nuevos al registro de la sesión
+            if new_events:
+                self.event_store.append(new_events)
+                self.event_model.refresh()
+                self.export_button.setEnabled(True)
+        finally:
+            self.setUpdatesEnabled(True)
                 
     def export_to_csv(self):
-        """Guarda el registro completo de eventos en un archivo CSV."""
-        if not self.stats_data.get("full_log"): # Comprobar que hay datos para exportar
-            # O usar `counter.full_event_log` si se pasa el objeto entero
+        """Guarda el registro completo de eventos de la sesión en un archivo CSV."""
+        if not len(self.event_store): # Comprobar que hay datos para exportar
             return
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -136,14 +233,15 @@ class MetricsTab(QWidget):
         if filePath:
             try:
                 with open(filePath, 'w', newline='', encoding='utf-8') as csvfile:
-                    # Usar los encabezados del primer evento si existen
-                    if self.stats_data["full_log"]:
-                        headers = self.stats_data["full_log"][0].keys()
-                        writer = csv.DictWriter(csvfile, fieldnames=headers)
-                        writer.writeheader()
-                        writer.writerows(self.stats_data["full_log"])
+                    writer = csv.writer(csvfile)
+                    writer.writerow(EventTableModel.HEADERS)
+                    for row in range(len(self.event_store)):
+                        event = self.event_store.get_row(row)
+                        writer.writerow([
+                            format_timestamp(event["timestamp"], "%Y-%m-%d %H:%M:%S"),
+                            event["lane"], event["type"],
+                            format_speed(event["speed"]),
+                            format_confidence(event["confidence"]), event["status"],
+                        ])
             except IOError as e:
                 print(f"Error al guardar el archivo: {e}")
-
-
-
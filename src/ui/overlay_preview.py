@@ -0,0 +1,113 @@
+from PySide6.QtWidgets import QLabel
+from PySide6.QtGui import QPixmap, QPainter, QTransform
+from PySide6.QtCore import Qt, Signal, QPoint, QPointF
+
+
+class OverlayPreview(QLabel):
+    pointModified = Signal(int, int, QPoint)  # group_idx, point_idx, new_pos (image coordinates)
+
+    def __init__(self, text: str = "", parent=None, pick_radius: int = 20):
+        """
+        Preview of the first frame with an editable overlay of point groups (lanes, homography points).
+
+        The frame is scaled to the widget size once (on a new image or a resize) and cached;
+        a repaint only draws the cached pixmap and the overlay, which is painted in image
+        coordinates through a transform so editors never touch full resolution pixmaps.
+        Repaints are requested with update(), so any number of edits between two UI frames
+        produce a single paint.
+
+        A vertex can be dragged with the mouse: pressing within `pick_radius` display pixels
+        of it (or, as before, clicking anywhere near it) moves it and pointModified is
+        emitted on every mouse move until the button is released.
+
+        Args:
+            text (str): Placeholder shown until an image is set.
+            pick_radius (int): Display pixels around a vertex that start a drag.
+        """
+        super().__init__(text, parent)
+        self.points_data = []
+        self.pick_radius = pick_radius
+        self.overlay_painter = None
+        self.base_pixmap = None
+        self._display_pixmap = None
+        self._scale = 1.0
+        self._offset = QPointF(0, 0)
+        self._dragging = None
+
+    def set_points_data(self, points: list):
+        """Editable points: a list of groups, each a list of QPoint in image coordinates."""
+        self.points_data = points
+
+    def set_overlay_painter(self, callback):
+        """callback(painter, scale): draws the overlay with `painter` in image coordinates."""
+        self.overlay_painter = callback
+
+    def set_base_pixmap(self, pixmap: QPixmap):
+        self.base_pixmap = pixmap
+        self._rebuild_display_pixmap()
+        self.update()
+
+    def _rebuild_display_pixmap(self):
+        if self.base_pixmap is None or self.base_pixmap.isNull() or self.width() <= 0 or self.height() <= 0:
+            self._display_pixmap = None
+            return
+        # único escalado de la imagen completa: solo al cambiar imagen o tamaño
+        self._display_pixmap = self.base_pixmap.scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        self._scale = self._display_pixmap.width() / self.base_pixmap.width()
+        self._offset = QPointF((self.width() - self._display_pixmap.width()) / 2,
+                               (self.height() - self._display_pixmap.height()) / 2)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._rebuild_display_pixmap()
+
+    def paintEvent(self, event):
+        if self._display_pixmap is None:
+            super().paintEvent(event)
+            return
+
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.black)
+        painter.drawPixmap(self._offset, self._display_pixmap)
+        if self.overlay_painter:
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setTransform(QTransform(self._scale, 0, 0, self._scale, self._offset.x(), self._offset.y()))
+            self.overlay_painter(painter, self._scale)
+        painter.end()
+
+    def _to_image(self, widget_pos: QPoint) -> QPoint:
+        x = (widget_pos.x() - self._offset.x()) / self._scale
+        y = (widget_pos.y() - self._offset.y()) / self._scale
+        return QPoint(int(x), int(y))
+
+    def _closest_point(self, image_pos: QPoint, max_dist: float) -> tuple[int, int] | None:
+        closest, min_dist = None, max_dist
+        for group_idx, group in enumerate(self.points_data):
+            for point_idx, point in enumerate(group):
+                dist = (image_pos - point).manhattanLength()
+                if dist < min_dist:
+                    min_dist = dist
+                    closest = (group_idx, point_idx)
+        return closest
+
+    def mousePressEvent(self, event):
+        if self._display_pixmap is None or event.button() != Qt.LeftButton:
+            return
+        image_pos = self._to_image(event.position().toPoint())
+
+        # vértice bajo el cursor; si no hay, el más cercano (comportamiento del clic original)
+        closest = self._closest_point(image_pos, 2 * self.pick_radius / self._scale) or self._closest_point(image_pos, 1000)
+        if closest is not None:
+            self._dragging = closest
+            self.pointModified.emit(*closest, image_pos)
+
+    def mouseMoveEvent(self, event):
+        if self._dragging is None:
+            return
+        image_pos = self._to_image(event.position().toPoint())
+        image_pos.setX(min(max(image_pos.x(), 0), self.base_pixmap.width()))
+        image_pos.setY(min(max(image_pos.y(), 0), self.base_pixmap.height()))
+        self.pointModified.emit(*self._dragging, image_pos)
+
+    def mouseReleaseEvent(self, event):
+        self._dragging = None
@@ -1,10 +1,13 @@
+import os
 import logging as log
+from datetime import datetime
 from collections import deque
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QGroupBox, QLabel, QFrame, QGridLayout, QFileDialog
-from PySide6.QtCore import Qt, Signal
+from PySide6.QtCore import Qt, Signal, QTimer
 from PySide6.QtGui import QPixmap, QImage
 
 from core.video_processor import VideoProcessor
+from models.vehicle import format_speed, format_confidence
 
 
 class VideoAnalysisTab(QWidget):
@@ -12,11 +15,23 @@ class VideoAnalysisTab(QWidget):
     firstFrameReady = Signal(QImage, int, int)
     newDataAvailable = Signal(dict, list)
     
-    def __init__(self):
+    def __init__(self, display_fps: float = 25.0):
         super().__init__()
         
         self.video_source_path = None
         self.video_processor = VideoProcessor()
+        self.events_output_dir = "reports"
+        
+        # display refresh decoupled from the analysis rate
+        self.display_timer = QTimer(self)
+        self.display_timer.timeout.connect(self.refresh_display)
+        self.set_display_fps(display_fps)
+        
+        # live reconfiguration: bursts of edits are merged into one update
+        self.live_config_timer = QTimer(self)
+        self.live_config_timer.setSingleShot(True)
+        self.live_config_timer.setInterval(250)
+        self.live_config_timer.timeout.connect(self.apply_live_config)
         self.recent_detections = deque(maxlen=3)
         self.detection_labels = []
         
@@ -93,7 +108,6 @@ class VideoAnalysisTab(QWidget):
         self.btn_start_analysis.clicked.connect(self.start_analysis)
         self.btn_stop_analysis.clicked.connect(self.stop_analysis)
         
-        self.video_processor.frameReady.connect(self.update_video_frame)
         self.video_processor.finished.connect(self.on_analysis_finished)
         
     def load_video(self):
@@ -112,13 +126,17 @@ class VideoAnalysisTab(QWidget):
         self.status_bar.showMessage(f"Cargando fuente: {source}...")
         
         # Obtenemos el primer frame de forma síncrona
-        first_frame, width, height = VideoProcessor.get_first_frame(source)
+        first_frame = VideoProcessor.get_first_frame(source)
         
-        if first_frame:
+        if first_frame is not None:
+            height, width = first_frame.shape[:2]
             self.videoSourceChanged.emit(True)
             self.status_bar.showMessage(f"Fuente cargada ({width}x{height}): {source}")
+            # vista previa por el mismo camino de render que el análisis
+            self.video_processor.show_preview(first_frame)
+            self.refresh_display()
             # Emitimos la señal con el frame para las otras pestañas
-            self.firstFrameReady.emit(first_frame, width, height)
+            self.firstFrameReady.emit(VideoProcessor.to_qimage(first_frame), width, height)
         else:
             self.videoSourceChanged.emit(False)
             self.status_bar.showMessage(f"Error al cargar la fuente: {source}")
@@ -126,14 +144,8 @@ class VideoAnalysisTab(QWidget):
     def start_analysis(self):
         """start processing video"""
         if self.video_source_path is not None:
-            # 1. get points from lane configuration tab
-            lane_qpoints = self.window().lane_tab.get_all_lane_points()
-            homography_config = self.window().homography_tab.get_homography_data()
-            
-            # 2. convert points
-            lane_tuples = []
-            for lane in lane_qpoints:
-                lane_tuples.append([(p.x(), p.y()) for p in lane])
+            # 1. get lanes and homography from the configuration tabs
+            lane_tuples, homography_config = self._collect_config()
 
             log.info(f"Lane points (converted to tuples): {lane_tuples}")
             log.info(f"Homography config: {homography_config}")
@@ -141,9 +153,35 @@ class VideoAnalysisTab(QWidget):
             self.video_processor.set_analysis_config(lane_tuples, homography_config)
             
             self.video_processor.set_video_source(self.video_source_path)
+            
+            # 3. stream events to disk during the session
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            self.video_processor.set_event_output(os.path.join(self.events_output_dir, f"eventos_{timestamp}.csv"))
+            
             self.video_processor.start()
+            self.display_timer.start()
             self.set_controls_for_analysis(is_running=True)
             
+    def _collect_config(self) -> tuple[list, dict]:
+        """Lane polygons (as tuples) and homography data from the configuration tabs."""
+        lane_qpoints = self.window().lane_tab.get_all_lane_points()
+        homography_config = self.window().homography_tab.get_homography_data()
+        lane_tuples = [[(p.x(), p.y()) for p in lane] for lane in lane_qpoints]
+        return lane_tuples, homography_config
+        
+    def schedule_live_config(self):
+        """Called on every configuration edit; pushes it to the running analysis after a short pause."""
+        if self.video_processor.isRunning():
+            self.live_config_timer.start()
+        
+    def apply_live_config(self):
+        """Send the current lanes and homography to the running analysis (applied at the next frame)."""
+        if not self.video_processor.isRunning():
+            return
+        lane_tuples, homography_config = self._collect_config()
+        self.video_processor.update_config(lane_tuples, homography_config)
+        self.status_bar.showMessage("Configuración actualizada en el análisis en curso", 3000)
+        
     def stop_analysis(self):
         """stop processing"""
         self.video_processor.stop()
@@ -151,6 +189,8 @@ class VideoAnalysisTab(QWidget):
         
     def on_analysis_finished(self):
         """exect when the video finished"""
+        self.display_timer.stop()
+        self.refresh_display()
         self.set_controls_for_analysis(is_running=False)
         self.videoSourceChanged.emit(False)
         self.video_source_path = None
@@ -159,10 +199,15 @@ class VideoAnalysisTab(QWidget):
         """Slot enable/disable start button."""
         self.btn_start_analysis.setEnabled(is_ready)
         
-    def update_video_frame(self, image):
-        """show QImage received from QLabel."""
-        pixmap = QPixmap.fromImage(image)
-        self.video_area.setPixmap(pixmap.scaled(self.video_area.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+    def set_display_fps(self, fps: float):
+        """Set how many times per second the video area is refreshed."""
+        self.display_timer.setInterval(max(1, int(1000 / fps)))
+        
+    def refresh_display(self):
+        """Render the latest analyzed frame at the size of the video area."""
+        image = self.video_processor.get_display_frame(self.video_area.width(), self.video_area.height())
+        if image is not None:
+            self.video_area.setPixmap(QPixmap.fromImage(image))
         
     def set_controls_for_analysis(self, is_running: bool):
         """Habilita o deshabilita los botones según el estado del análisis."""
@@ -173,7 +218,10 @@ class VideoAnalysisTab(QWidget):
         
     def on_new_analysis_data(self, stats: dict):
         """Recibe datos del procesador, actualiza la UI local y emite una señal."""
-        new_events = stats.get("newly_counted", []) # Suponiendo que el paquete de stats contiene esta clave
+        new_events = stats.get("newly_counted", [])
+        if not new_events:
+            return
+        
         for event in new_events:
             self.recent_detections.appendleft(event)
         
@@ -181,11 +229,10 @@ class VideoAnalysisTab(QWidget):
         for i in range(3):
             if i < len(self.recent_detections):
                 event = self.recent_detections[i]
-                # Las claves ahora coinciden con lo que espera la UI
-                self.detection_labels[i]["type"].setText(f"<b>Vehículo:</b> {event['type']}")
-                self.detection_labels[i]["confidence"].setText(f"<b>Confianza:</b> {event['confidence']}")
-                self.detection_labels[i]["speed"].setText(f"<b>Velocidad:</b> {event['speed']} km/h")
-                self.detection_labels[i]["lane"].setText(f"<b>Carril:</b> {event['lane']}")
+                self.detection_labels[i]["type"].setText(f"<b>Vehículo:</b> {event.vehicle_type}")
+                self.detection_labels[i]["confidence"].setText(f"<b>Confianza:</b> {format_confidence(event.confidence)}")
+                self.detection_labels[i]["speed"].setText(f"<b>Velocidad:</b> {format_speed(event.speed)} km/h")
+                self.detection_labels[i]["lane"].setText(f"<b>Carril:</b> {event.lane}")
             else:
                 # Limpiar cajas no usadas
                 self.detection_labels[i]["type"].setText("<b>Vehículo:</b> -")
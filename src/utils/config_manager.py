@@ -0,0 +1,174 @@
+import os
+import json
+import logging as log
+
+from .file_manager import ArtifactCache
+from .event_sinks import create_sink
+
+PROJECT_VERSION = 1
+
+
+def camera_pipeline_options(camera: dict) -> dict:
+    """
+    AnalysisPipeline options of a camera config:
+    "tracker": {"type": "bytetrack", "track_buffer": 30, ...} selects the tracker and its parameters,
+    "tiling": {"tile_size": 640, "overlap": 0.2, ...} enables tiled inference over the lanes,
+    "adaptive": {"levels": [["yolo11n.pt", 480], ...], "min_level": 0, "log_path": ...} enables
+    model / input size switching under load,
+    "sinks": ["tcp://127.0.0.1:5555", {"url": "http://collector/events", "batch_size": 200}, ...]
+    delivers the counted events to other systems (see utils.event_sinks.create_sink),
+    "clips": {"output_dir": "clips", "pre_seconds": 3, ...} records speeding evidence (see core.clip_recorder),
+    "video_output": {"path": "out.mp4", "output_size": [1280, 720], "frame_step": 2, ...} writes an annotated
+    video (see core.video_output),
+    "crops": {"directory": "crops", "max_pack_mb": 256, ...} keeps one crop per counted vehicle (see data.crop_store),
+    "occupancy": {"cell_size": 8, "bin_seconds": 60, ...} accumulates the occupancy heatmap and lane density
+    (see core.occupancy),
+    "congestion": {"stop_speed_kmh": 5, "max_gap_m": 10, ...} estimates queue length, stopped vehicles and delay
+    per lane (see core.congestion).
+    """
+    tracker = dict(camera.get("tracker", {}))
+    options = {"tracker": tracker.pop("type", "ultralytics"), "tracker_params": tracker}
+    if "tiling" in camera:
+        options.update(inference_mode="tiled", tiling_params=dict(camera["tiling"]))
+    if "adaptive" in camera:
+        options["adaptive_params"] = dict(camera["adaptive"])
+    if camera.get("sinks"):
+        options["event_sinks"] = [
+            create_sink(sink) if isinstance(sink, str) else create_sink(**sink) for sink in camera["sinks"]
+        ]
+    if "clips" in camera:
+        options["clip_params"] = dict(camera["clips"])
+    if "video_output" in camera:
+        video = dict(camera["video_output"])
+        if video.get("output_size"):
+            video["output_size"] = tuple(video["output_size"])
+        options["video_output_params"] = video
+    if "occupancy" in camera:
+        options["occupancy_params"] = dict(camera["occupancy"])
+    if "congestion" in camera:
+        options["congestion_params"] = dict(camera["congestion"])
+    if "crops" in camera:
+        options["crop_params"] = dict(camera["crops"])
+    return options
+
+
+def camera_settings(pipeline_options: dict) -> dict:
+    """Inverse of camera_pipeline_options: the "tracker", "tiling", "adaptive", "sinks", "clips", "video_output",
+    "occupancy", "congestion" and "crops" entries of a camera."""
+    settings = {}
+    if pipeline_options.get("tracker"):
+        settings["tracker"] = {"type": pipeline_options["tracker"], **(pipeline_options.get("tracker_params") or {})}
+    if pipeline_options.get("inference_mode") == "tiled":
+        settings["tiling"] = dict(pipeline_options.get("tiling_params") or {})
+    if pipeline_options.get("adaptive_params") is not None:
+        adaptive = dict(pipeline_options["adaptive_params"])
+        adaptive.pop("source_fps", None)  # depende de la fuente, se lee al abrirla
+        settings["adaptive"] = adaptive
+    if pipeline_options.get("event_sinks"):
+        settings["sinks"] = [sink.url for sink in pipeline_options["event_sinks"]]
+    if pipeline_options.get("clip_params") is not None:
+        settings["clips"] = dict(pipeline_options["clip_params"])
+    if pipeline_options.get("video_output_params") is not None:
+        settings["video_output"] = dict(pipeline_options["video_output_params"])
+    if pipeline_options.get("occupancy_params") is not None:
+        settings["occupancy"] = dict(pipeline_options["occupancy_params"])
+    if pipeline_options.get("congestion_params") is not None:
+        settings["congestion"] = dict(pipeline_options["congestion_params"])
+    if pipeline_options.get("crop_params") is not None:
+        settings["crops"] = dict(pipeline_options["crop_params"])
+    return settings
+
+
+def read_camera_config(path: str, camera: str = None) -> dict:
+    """
+    Camera entry of a project file, or the whole file for a single camera config
+    ({"lanes": ..., "homography": ..., ...}).
+    """
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    if "cameras" not in config:
+        return config
+    project = ProjectConfig.from_dict(config, path)
+    return project.get_camera(camera)
+
+
+class ProjectConfig:
+    def __init__(self, path: str = None):
+        """
+        Project file: lane polygons, homography points and distances and per-camera settings.
+
+        {"version": 1, "active_camera": name, "cameras": {name: {"source": ..., "frame_size": [w, h],
+         "lanes": [[[x, y], ...], ...], "homography": {...}, "tracker": {...}, "tiling": {...},
+         "adaptive": {...}, "artifacts": key}}}
+
+        Derived geometry (see core.geometry_artifacts) is kept in an ArtifactCache folder next
+        to the project file, referenced by its content hash.
+
+        Args:
+            path (str): Project file (.json).
+        """
+        self.path = path
+        self.cameras = {}
+        self.active_camera = None
+
+    @classmethod
+    def from_dict(cls, data: dict, path: str = None) -> "ProjectConfig":
+        if data.get("version") != PROJECT_VERSION:
+            raise ValueError(f"Versión de proyecto no soportada: {data.get('version')}")
+        project = cls(path)
+        project.cameras = dict(data.get("cameras", {}))
+        project.active_camera = data.get("active_camera")
+        return project
+
+    @classmethod
+    def load(cls, path: str) -> "ProjectConfig":
+        with open(path, encoding="utf-8") as f:
+            project = cls.from_dict(json.load(f), path)
+        log.info(f"Proyecto cargado: {path} ({len(project.cameras)} cámaras)")
+        return project
+
+    def save(self, path: str = None):
+        """Write the project (next to the target and renamed, so a failed write keeps the previous file)."""
+        self.path = path or self.path
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": PROJECT_VERSION, "active_camera": self.active_camera, "cameras": self.cameras},
+                      f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        log.info(f"Proyecto guardado: {self.path}")
+
+    @property
+    def artifact_cache(self) -> ArtifactCache:
+        """Cache of derived geometry of this project (<project>_cache/)."""
+        return ArtifactCache(f"{os.path.splitext(self.path)[0]}_cache")
+
+    def set_camera(self, name: str, lanes: list, homography: dict, source=None, frame_size: tuple = None,
+                   settings: dict = None, artifacts_key: str = None):
+        """Add or replace a camera and make it the active one."""
+        camera = {
+            "source": source,
+            "frame_size": list(frame_size) if frame_size else None,
+            "lanes": [[list(p) for p in lane] for lane in lanes],
+            "homography": {**homography, "image_points": [list(p) for p in homography.get("image_points", [])]},
+            **(settings or {}),
+        }
+        if artifacts_key:
+            camera["artifacts"] = artifacts_key
+        self.cameras[name] = camera
+        self.active_camera = name
+
+    def get_camera(self, name: str = None) -> dict:
+        """Camera `name` (default the active one) with points as tuples."""
+        name = name or self.active_camera or next(iter(self.cameras), None)
+        if name not in self.cameras:
+            raise KeyError(f"Cámara no encontrada en el proyecto: {name}")
+        camera = dict(self.cameras[name])
+        camera["lanes"] = [[tuple(p) for p in lane] for lane in camera.get("lanes", [])]
+        homography = dict(camera.get("homography", {}))
+        if "image_points" in homography:
+            homography["image_points"] = [tuple(p) for p in homography["image_points"]]
+        camera["homography"] = homography
+        return camera
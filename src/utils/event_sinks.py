@@ -0,0 +1,386 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import logging as log
+from collections import deque
+from urllib.parse import urlsplit
+
+from models.vehicle import CountEvent
+
+
+def event_to_record(event: CountEvent) -> dict:
+    """JSON-friendly dict of an event (unknown speed -> null)."""
+    return {
+        "track_id": int(event.track_id),
+        "timestamp": float(event.timestamp),
+        "lane": int(event.lane),
+        "class_id": int(event.class_id),
+        "type": event.vehicle_type,
+        "speed": float(event.speed) if event.speed == event.speed else None,
+        "confidence": float(event.confidence),
+        "status": event.status,
+    }
+
+
+class EventSink:
+    def __init__(self, url: str, batch_size: int = 100, flush_interval: float = 0.5, max_queue: int = 10000,
+                 max_retries: int = 5, retry_delay: float = 0.5, max_retry_delay: float = 10.0,
+                 drop_oldest: bool = True):
+        """
+        Destination of counted events, driven by EventDispatcher on its asyncio loop.
+
+        Events are queued per sink (at most `max_queue`) and sent in batches of up to
+        `batch_size`, or whatever is queued once the oldest event waited `flush_interval`.
+        A failed batch is retried with exponential backoff and dropped after `max_retries`.
+        While a sink is slow or down its queue fills and then drops events (the oldest
+        ones by default); the other sinks and the analysis are never blocked.
+
+        Subclasses implement `send(records)` and optionally `open()` / `reset()` / `close()`.
+
+        Args:
+            url (str): Destination, also the sink name in statistics and metrics.
+            batch_size (int): Maximum events per send.
+            flush_interval (float): Maximum seconds an event waits to be batched.
+            max_queue (int): Events kept while the destination does not keep up.
+            max_retries (int): Retries of a failed batch before dropping it.
+            retry_delay (float): Delay before the first retry, doubled on each attempt.
+            max_retry_delay (float): Upper limit of the retry delay.
+            drop_oldest (bool): On overflow drop the oldest queued events (True) or the new ones.
+        """
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.drop_oldest = drop_oldest
+
+        # (enqueue_time, record); solo se modifica desde el loop del dispatcher
+        self.pending = deque()
+        self.sent = 0
+        self.dropped = 0
+        self.failed_attempts = 0
+        self._inflight = 0
+        self._inflight_since = None
+        self._wakeup = None
+
+    def offer(self, records: list[dict], enqueued_at: float):
+        for record in records:
+            if len(self.pending) >= self.max_queue:
+                self.dropped += 1
+                if not self.drop_oldest:
+                    continue
+                self.pending.popleft()
+            self.pending.append((enqueued_at, record))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    @property
+    def lag(self) -> float:
+        """Seconds the oldest undelivered event has been waiting (0 when idle)."""
+        oldest = self._inflight_since
+        if oldest is None and self.pending:
+            oldest = self.pending[0][0]
+        return max(0.0, time.time() - oldest) if oldest is not None else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self.pending) + self._inflight,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed_attempts": self.failed_attempts,
+            "lag_s": round(self.lag, 3),
+        }
+
+    async def open(self):
+        pass
+
+    async def send(self, records: list[dict]):
+        raise NotImplementedError
+
+    async def reset(self):
+        """Drop the connection after a failure; the next send reconnects."""
+        pass
+
+    async def close(self):
+        pass
+
+    @staticmethod
+    def encode_lines(records: list[dict]) -> bytes:
+        return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+
+
+class RotatingFileSink(EventSink):
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, backup_count: int = 5, **kwargs):
+        """
+        JSON lines file rotated at `max_bytes` (path.1 ... path.<backup_count>).
+        Writes run in a worker thread so disk latency does not hold the other sinks.
+        """
+        super().__init__(kwargs.pop("url", f"file://{os.path.abspath(path)}"), **kwargs)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+    async def send(self, records: list[dict]):
+        await asyncio.to_thread(self._write, self.encode_lines(records))
+
+    def _write(self, data: bytes):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+class _StreamSink(EventSink):
+    """JSON lines over a persistent stream connection, reconnected after a failure."""
+
+    def __init__(self, url: str, connect_timeout: float = 5.0, **kwargs):
+        super().__init__(url, **kwargs)
+        self.connect_timeout = connect_timeout
+        self._reader = None
+        self._writer = None
+
+    async def _connect(self):
+        raise NotImplementedError
+
+    async def send(self, records: list[dict]):
+        # el destino no responde nada: un EOF en la lectura indica que cerró la conexión
+        if self._writer is None or self._writer.is_closing() or self._reader.at_eof():
+            await self.close()
+            self._reader, self._writer = await asyncio.wait_for(self._connect(), self.connect_timeout)
+        self._writer.write(self.encode_lines(records))
+        await self._writer.drain()
+
+    async def reset(self):
+        await self.close()
+
+    async def close(self):
+        writer, self._writer, self._reader = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+
+class UnixSocketSink(_StreamSink):
+    def __init__(self, path: str, **kwargs):
+        """JSON lines to a Unix domain stream socket."""
+        super().__init__(kwargs.pop("url", f"unix://{path}"), **kwargs)
+        self.path = path
+
+    async def _connect(self):
+        return await asyncio.open_unix_connection(self.path)
+
+
+class TcpSink(_StreamSink):
+    def __init__(self, host: str, port: int, **kwargs):
+        """JSON lines over TCP, e.g. to the line protocol input of a local message broker."""
+        super().__init__(kwargs.pop("url", f"tcp://{host}:{port}"), **kwargs)
+        self.host = host
+        self.port = port
+
+    async def _connect(self):
+        return await asyncio.open_connection(self.host, self.port)
+
+
+class HttpSink(EventSink):
+    def __init__(self, url: str, timeout: float = 10.0, headers: dict = None, **kwargs):
+        """POST of each batch as a JSON array to an HTTP collector; any non-2xx answer is a failure."""
+        super().__init__(url, **kwargs)
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.use_ssl = parts.scheme == "https"
+        self.port = parts.port or (443 if self.use_ssl else 80)
+        self.target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+        self.headers = headers or {}
+
+    async def send(self, records: list[dict]):
+        await asyncio.wait_for(self._post(json.dumps(records, ensure_ascii=False).encode("utf-8")), self.timeout)
+
+    async def _post(self, body: bytes):
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.use_ssl or None)
+        try:
+            headers = {
+                "Host": f"{self.host}:{self.port}",
+                "Content-Type": "application/json",
+                "Content-Length": str(len(body)),
+                "Connection": "close",
+                **self.headers,
+            }
+            head = f"POST {self.target} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+            status_line = await reader.readline()
+            status = int(status_line.split()[1]) if len(status_line.split()) > 1 else 0
+            if not 200 <= status < 300:
+                raise ConnectionError(f"HTTP {status} de {self.url}")
+        finally:
+            writer.close()
+
+
+def create_sink(url: str, **kwargs) -> EventSink:
+    """
+    Sink for a destination URL: file:///path/events.jsonl (or a plain path), unix:///path/socket,
+    tcp://host:port, http(s)://host:port/path. Keyword arguments go to the sink (batching, retries...).
+    """
+    parts = urlsplit(url)
+    if parts.scheme in ("", "file") or len(parts.scheme) == 1:  # una letra: unidad de Windows
+        return RotatingFileSink(parts.path if parts.scheme == "file" else url, **kwargs)
+    if parts.scheme == "unix":
+        return UnixSocketSink(parts.path, **kwargs)
+    if parts.scheme == "tcp":
+        return TcpSink(parts.hostname, parts.port, **kwargs)
+    if parts.scheme in ("http", "https"):
+        return HttpSink(url, **kwargs)
+    raise ValueError(f"Destino de eventos no soportado: {url}")
+
+
+class EventDispatcher:
+    def __init__(self, sinks: list[EventSink], drain_timeout: float = 5.0):
+        """
+        Delivers counted events to several sinks from an asyncio loop in a background thread.
+
+        `publish` only hands the events to the loop (call_soon_threadsafe) and returns, so the
+        analysis thread never waits for a destination. Each sink has its own queue and task.
+
+        Args:
+            sinks (list[EventSink]): Destinations.
+            drain_timeout (float): Seconds `close` waits for the queued events to be delivered.
+        """
+        self.sinks = list(sinks)
+        self.drain_timeout = drain_timeout
+        self._loop = None
+        self._stopping = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="EventDispatcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+
+    def publish(self, events: list[CountEvent]):
+        """Hand events to every sink without blocking."""
+        if not events or self._loop is None:
+            return
+        records = [event_to_record(event) for event in events]
+        try:
+            self._loop.call_soon_threadsafe(self._offer, records, time.time())
+        except RuntimeError:
+            pass  # loop cerrado: el dispatcher ya se detuvo
+
+    def _offer(self, records: list[dict], enqueued_at: float):
+        for sink in self.sinks:
+            sink.offer(records, enqueued_at)
+
+    def stats(self) -> dict:
+        """Per-sink queued, sent, dropped, failed attempts and lag (seconds)."""
+        return {sink.url: sink.stats() for sink in self.sinks}
+
+    def close(self):
+        """Deliver what is queued (up to `drain_timeout`) and stop the loop."""
+        if self._loop is None or not self._thread.is_alive():
+            return
+        self._loop.call_soon_threadsafe(self._stopping.set)
+        self._thread.join()
+        for url, stats in self.stats().items():
+            log.info(f"Destino de eventos {url}: {stats['sent']} enviados, {stats['dropped']} descartados")
+
+    def _run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        for sink in self.sinks:
+            sink._wakeup = asyncio.Event()
+        self._ready.set()
+
+        tasks = [asyncio.create_task(self._run_sink(sink)) for sink in self.sinks]
+        await self._stopping.wait()
+        for sink in self.sinks:
+            sink._wakeup.set()
+        _, not_done = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        for task in not_done:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for sink in self.sinks:
+            if sink.pending:
+                log.warning(f"Destino de eventos {sink.url}: {len(sink.pending)} eventos sin entregar al cerrar")
+                sink.dropped += len(sink.pending)
+                sink.pending.clear()
+            try:
+                await sink.close()
+            except Exception as e:
+                log.error(f"Error al cerrar el destino de eventos {sink.url}: {e}")
+
+    async def _run_sink(self, sink: EventSink):
+        try:
+            await sink.open()
+        except Exception as e:
+            log.error(f"No se pudo abrir el destino de eventos {sink.url}: {e}")
+
+        while True:
+            if not sink.pending:
+                if self._stopping.is_set():
+                    return
+                sink._wakeup.clear()
+                await sink._wakeup.wait()
+                continue
+
+            # esperar a completar un lote, como mucho flush_interval desde el evento más antiguo
+            while len(sink.pending) < sink.batch_size and not self._stopping.is_set():
+                remaining = sink.flush_interval - (time.time() - sink.pending[0][0])
+                if remaining <= 0:
+                    break
+                sink._wakeup.clear()
+                try:
+                    await asyncio.wait_for(sink._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            count = min(sink.batch_size, len(sink.pending))
+            sink._inflight_since = sink.pending[0][0]
+            sink._inflight = count
+            batch = [sink.pending.popleft()[1] for _ in range(count)]
+            try:
+                await self._deliver(sink, batch)
+            except asyncio.CancelledError:
+                sink.dropped += len(batch)  # cierre con el lote aún sin entregar
+                raise
+            sink._inflight = 0
+            sink._inflight_since = None
+
+    async def _deliver(self, sink: EventSink, batch: list[dict]):
+        for attempt in range(sink.max_retries + 1):
+            try:
+                await sink.send(batch)
+                sink.sent += len(batch)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                sink.failed_attempts += 1
+                await sink.reset()
+                if attempt == sink.max_retries:
+                    log.warning(f"Destino de eventos {sink.url}: lote de {len(batch)} eventos descartado ({e})")
+                    break
+                await asyncio.sleep(min(sink.retry_delay * 2 ** attempt, sink.max_retry_delay))
+        sink.dropped += len(batch)
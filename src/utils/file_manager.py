@@ -0,0 +1,340 @@
+import os
+import csv
+import gzip
+import json
+import time
+import hashlib
+import queue
+import pickle
+import sqlite3
+import threading
+import logging as log
+
+import numpy as np
+
+from models.vehicle import CountEvent, EVENT_LOG_FIELDS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # parquet es opcional
+    pa = None
+    pq = None
+
+
+class CsvEventBackend:
+    """Append-only CSV file. The header is written only when the file is new."""
+    supports_resume = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self.writer = None
+
+    def open(self, resume_offset: int = None):
+        if resume_offset is not None and os.path.exists(self.path):
+            # descartar las filas escritas después del checkpoint
+            with open(self.path, "r+b") as f:
+                f.truncate(resume_offset)
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, "a", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        if is_new:
+            self.writer.writerow(EVENT_LOG_FIELDS)
+
+    def write_rows(self, rows: list[list]):
+        # formato de exportación: timestamp con precisión de microsegundos, velocidad y confianza numéricas
+        self.writer.writerows(
+            [track_id, f"{timestamp:.6f}", lane, v_type, f"{speed:.2f}" if speed == speed else "", f"{conf:.3f}", status]
+            for track_id, timestamp, lane, v_type, speed, conf, status in rows
+        )
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def position(self) -> int:
+        """Byte offset of the end of the written rows."""
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+class SqliteEventBackend:
+    """SQLite table, one transaction per batch."""
+    supports_resume = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = None
+
+    def open(self, resume_offset: int = None):
+        # la conexión se crea en el hilo del escritor
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS events (track_id INTEGER, timestamp REAL, lane INTEGER, "
+            "type TEXT, speed REAL, confidence REAL, status TEXT)"
+        )
+        if resume_offset is not None:
+            self.connection.execute("DELETE FROM events WHERE rowid > ?", (resume_offset,))
+        self.connection.commit()
+
+    def write_rows(self, rows: list[list]):
+        with self.connection:
+            self.connection.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def flush(self):
+        pass  # cada lote ya se confirma en su transacción
+
+    def position(self) -> int:
+        """rowid of the last written row."""
+        return self.connection.execute("SELECT COALESCE(MAX(rowid), 0) FROM events").fetchone()[0]
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+
+
+class ParquetEventBackend:
+    """Parquet file, one row group per batch. Requires pyarrow."""
+    supports_resume = False  # el pie del archivo solo se escribe al cerrar
+
+    def __init__(self, path: str):
+        if pq is None:
+            raise ImportError("pyarrow es necesario para guardar eventos en formato Parquet")
+        self.path = path
+        self.schema = pa.schema([
+            ("track_id", pa.int64()), ("timestamp", pa.float64()), ("lane", pa.int32()),
+            ("type", pa.string()), ("speed", pa.float32()), ("confidence", pa.float32()), ("status", pa.string()),
+        ])
+        self.writer = None
+        self.rows = 0
+
+    def open(self, resume_offset: int = None):
+        self.writer = pq.ParquetWriter(self.path, self.schema)
+
+    def write_rows(self, rows: list[list]):
+        columns = list(zip(*rows))
+        table = pa.Table.from_arrays([pa.array(col, type=field.type) for col, field in zip(columns, self.schema)], schema=self.schema)
+        self.writer.write_table(table)
+        self.rows += len(rows)
+
+    def flush(self):
+        pass  # los row groups se escriben completos en write_rows
+
+    def position(self) -> int:
+        return self.rows
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+class _FlushRequest:
+    """Queue marker: the writer flushes everything before it and reports the backend position."""
+    __slots__ = ("done", "position")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.position = None
+
+
+class EventWriter:
+    BACKENDS = {
+        ".csv": CsvEventBackend,
+        ".db": SqliteEventBackend,
+        ".sqlite": SqliteEventBackend,
+        ".parquet": ParquetEventBackend,
+    }
+
+    def __init__(self, path: str, batch_size: int = 256, flush_interval: float = 2.0, max_queue: int = 10000,
+                 resume_offset: int = None):
+        """
+        Stream counted events to disk from a background thread.
+
+        `write` only enqueues the events and never blocks the caller; the writer thread
+        groups them in batches of `batch_size` (or whatever arrived within `flush_interval`
+        seconds) and writes each batch to the backend chosen by the file extension.
+
+        Args:
+            path (str): Output file (.csv, .db/.sqlite or .parquet).
+            batch_size (int): Maximum number of events per write.
+            flush_interval (float): Maximum seconds an event waits before being flushed.
+            max_queue (int): Maximum pending batches; new events are dropped when full.
+            resume_offset (int): Position returned by `checkpoint`; rows written after it are
+                discarded so a resumed job continues the same log.
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in self.BACKENDS:
+            raise ValueError(f"Formato de salida no soportado: {extension}")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.backend = self.BACKENDS[extension](path)
+        if resume_offset is not None and not self.backend.supports_resume:
+            raise ValueError(f"El formato {extension} no permite reanudar un registro de eventos")
+        self.resume_offset = resume_offset
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.rows_written = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="EventWriter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def write(self, events: list[CountEvent]):
+        """Enqueue events for writing without blocking."""
+        if not events:
+            return
+        rows = [event.to_row() for event in events]
+        try:
+            self.queue.put_nowait(rows)
+        except queue.Full:
+            self.dropped += len(rows)
+            log.warning(f"Cola de escritura llena, {len(rows)} eventos descartados")
+
+    def checkpoint(self, timeout: float = 30.0) -> int:
+        """
+        Wait until every event enqueued so far is written.
+
+        Returns:
+            int: Backend position (CSV byte offset, SQLite rowid, Parquet rows) to pass as
+            `resume_offset` when resuming from this point.
+        """
+        request = _FlushRequest()
+        self.queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError(f"El escritor de eventos no respondió en {timeout} s")
+        return request.position
+
+    def close(self):
+        """Flush the pending events and stop the writer thread."""
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        self.backend.open(self.resume_offset)
+        pending = []
+        last_flush = time.monotonic()
+        running = True
+
+        while running:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            request = None
+            try:
+                rows = self.queue.get(timeout=timeout)
+                if rows is None:
+                    running = False
+                elif isinstance(rows, _FlushRequest):
+                    request = rows
+                else:
+                    pending.extend(rows)
+            except queue.Empty:
+                pass
+
+            is_due = time.monotonic() - last_flush >= self.flush_interval
+            if pending and (len(pending) >= self.batch_size or is_due or not running or request):
+                try:
+                    for i in range(0, len(pending), self.batch_size):
+                        self.backend.write_rows(pending[i:i + self.batch_size])
+                    self.backend.flush()
+                    self.rows_written += len(pending)
+                except Exception as e:
+                    log.error(f"Error al escribir eventos en {self.path}: {e}")
+                pending = []
+            if is_due or not pending:
+                last_flush = time.monotonic()
+            if request:
+                request.position = self.backend.position()
+                request.done.set()
+
+        self.backend.close()
+        log.info(f"Registro de eventos cerrado: {self.path} ({self.rows_written} eventos)")
+
+
+CHECKPOINT_VERSION = 2  # 2: agregados de velocidad por carril en lugar de listas
+
+
+def save_checkpoint(path: str, state: dict):
+    """
+    Write a job checkpoint (compressed pickle of plain values and NumPy arrays).
+
+    The file is written next to the target and renamed, so a crash during the write
+    leaves the previous checkpoint intact.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wb", compresslevel=3) as f:
+        pickle.dump({"version": CHECKPOINT_VERSION, **state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str) -> dict | None:
+    """Read a checkpoint written by save_checkpoint, None if it does not exist or is not readable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, "rb") as f:
+            state = pickle.load(f)
+    except Exception as e:
+        log.error(f"No se pudo leer el checkpoint {path}: {e}")
+        return None
+    if state.get("version") != CHECKPOINT_VERSION:
+        log.error(f"Versión de checkpoint no soportada: {state.get('version')}")
+        return None
+    return state
+
+
+class ArtifactCache:
+    def __init__(self, directory: str):
+        """
+        Derived geometry artifacts (NumPy arrays) stored by content hash.
+
+        The key is a hash of the inputs the artifacts are computed from, so an entry is
+        reused as long as the inputs do not change and stale entries are never read.
+
+        Args:
+            directory (str): Folder of the cache (one compressed .npz per key).
+        """
+        self.directory = directory
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Content hash of JSON-serializable inputs (tuples and lists hash the same)."""
+        payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=float)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def load(self, key: str) -> dict | None:
+        """Arrays stored under `key`, None if there is no entry or it is not readable."""
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return {name: data[name] for name in data.files}
+        except Exception as e:
+            log.error(f"No se pudo leer el artefacto {path}: {e}")
+            return None
+
+    def save(self, key: str, arrays: dict):
+        """Store `arrays` under `key` (written next to the target and renamed)."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.path(key)}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, self.path(key))
@@ -0,0 +1,44 @@
+from collections import deque
+
+import numpy as np
+import psutil
+
+
+def rss_bytes() -> int:
+    """Resident memory of this process."""
+    return psutil.Process().memory_info().rss
+
+
+class MemoryMonitor:
+    def __init__(self, max_samples: int = 1440):
+        """
+        History of the process RSS and of the sizes of in-process structures.
+
+        Each sample is (time, rss, sizes) where sizes is a dict such as
+        AnalysisPipeline.memory_stats(); `growth` fits a line over the recent samples to
+        tell steady state from a leak.
+
+        Args:
+            max_samples (int): Samples kept (oldest are discarded).
+        """
+        self.samples = deque(maxlen=max_samples)
+
+    def sample(self, timestamp: float, sizes: dict = None) -> dict:
+        """Record the current RSS and `sizes`. Returns the sample as a dict."""
+        sample = {"time": timestamp, "rss_mb": rss_bytes() / (1024 * 1024), **(sizes or {})}
+        self.samples.append(sample)
+        return sample
+
+    def growth(self, key: str = "rss_mb", since: float = None) -> float:
+        """
+        Least squares slope of `key` per hour over the samples taken from `since` (time of
+        the samples), 0 with fewer than 3 samples.
+        """
+        points = [(s["time"], s[key]) for s in self.samples if key in s and (since is None or s["time"] >= since)]
+        if len(points) < 3:
+            return 0.0
+        times, values = np.array(points, dtype=np.float64).T
+        if np.ptp(times) <= 0:
+            return 0.0
+        slope = np.polyfit(times - times[0], values, 1)[0]
+        return float(slope * 3600.0)
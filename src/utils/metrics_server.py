@@ -0,0 +1,180 @@
+import time
+import bisect
+import threading
+import logging as log
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# límites (segundos) de los histogramas de latencia por etapa
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class PipelineMetrics:
+    def __init__(self, fps_smoothing: float = 0.1):
+        """
+        Counters of one analysis pipeline, exposed in Prometheus text format.
+
+        The analysis thread is the only writer: updates are plain attribute / list / dict
+        operations (atomic under the GIL), so recording a frame never takes a lock. The
+        scrape thread copies the values it reads; a scrape may mix values of two consecutive
+        frames, which is fine for monitoring. Values that live elsewhere (queue depths,
+        adaptive level) are read through gauges evaluated at scrape time.
+
+        Args:
+            fps_smoothing (float): EMA factor of the processing rate.
+        """
+        self.fps_smoothing = fps_smoothing
+        self.frames = 0
+        self.fps = 0.0
+        self.active_tracks = 0
+        self.stages = {}
+        self.vehicles = defaultdict(int)     # (lane, vehicle_type) -> count
+        self.speed_sum = defaultdict(float)  # lane -> km/h
+        self.speed_count = defaultdict(int)
+        self._gauges = {}
+        self._last_frame = None
+
+    def observe_stage(self, stage: str, seconds: float):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = _Histogram(LATENCY_BUCKETS)
+        histogram.observe(seconds)
+
+    def frame_done(self, active_tracks: int):
+        """Call once per analyzed frame."""
+        now = time.perf_counter()
+        if self._last_frame is not None and now > self._last_frame:
+            rate = 1.0 / (now - self._last_frame)
+            self.fps = rate if self.frames <= 1 else self.fps + self.fps_smoothing * (rate - self.fps)
+        self._last_frame = now
+        self.frames += 1
+        self.active_tracks = active_tracks
+
+    def record_events(self, events: list):
+        """Count events (CountEvent) per lane and type and accumulate their speeds."""
+        for event in events:
+            self.vehicles[(event.lane, event.vehicle_type)] += 1
+            if event.speed == event.speed:  # NaN: sin velocidad
+                self.speed_sum[event.lane] += event.speed
+                self.speed_count[event.lane] += 1
+
+    def register_gauge(self, name: str, help_text: str, callback, labels: dict = None):
+        """Gauge read at scrape time: callback() -> number."""
+        self._gauges[(name, tuple(sorted((labels or {}).items())))] = (help_text, callback)
+
+    def render(self) -> str:
+        """All metrics in Prometheus exposition format (text 0.0.4)."""
+        lines = [
+            "# HELP traffic_frames_total Frames analyzed.",
+            "# TYPE traffic_frames_total counter",
+            f"traffic_frames_total {self.frames}",
+            "# HELP traffic_fps Processing rate (frames per second, smoothed).",
+            "# TYPE traffic_fps gauge",
+            f"traffic_fps {self.fps:.3f}",
+            "# HELP traffic_active_tracks Tracked vehicles in the last frame.",
+            "# TYPE traffic_active_tracks gauge",
+            f"traffic_active_tracks {self.active_tracks}",
+        ]
+
+        lines += ["# HELP traffic_stage_latency_seconds Processing time per pipeline stage.",
+                  "# TYPE traffic_stage_latency_seconds histogram"]
+        for stage, histogram in list(self.stages.items()):
+            # copia de los buckets: +Inf y _count salen de la misma copia y son coherentes
+            counts, total = list(histogram.counts), histogram.sum
+            count = sum(counts)
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'traffic_stage_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'traffic_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'traffic_stage_latency_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'traffic_stage_latency_seconds_count{{stage="{stage}"}} {count}')
+
+        lines += ["# HELP traffic_vehicles_total Vehicles counted per lane and type.",
+                  "# TYPE traffic_vehicles_total counter"]
+        for (lane, vehicle_type), count in sorted(dict(self.vehicles).items()):
+            lines.append(f'traffic_vehicles_total{{lane="{lane}",type="{_escape(vehicle_type)}"}} {count}')
+
+        speed_sum, speed_count = dict(self.speed_sum), dict(self.speed_count)
+        lines += ["# HELP traffic_vehicle_speed_kmh Speed of the counted vehicles per lane.",
+                  "# TYPE traffic_vehicle_speed_kmh summary"]
+        for lane in sorted(speed_count):
+            lines.append(f'traffic_vehicle_speed_kmh_sum{{lane="{lane}"}} {speed_sum.get(lane, 0.0):.3f}')
+            lines.append(f'traffic_vehicle_speed_kmh_count{{lane="{lane}"}} {speed_count[lane]}')
+
+        described = set()
+        for (name, labels), (help_text, callback) in sorted(dict(self._gauges).items()):
+            try:
+                value = float(callback())
+            except Exception as e:
+                log.debug(f"Métrica {name} no disponible: {e}")
+                continue
+            if name not in described:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+                described.add(name)
+            label_text = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels)
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsServer:
+    def __init__(self, metrics: PipelineMetrics, host: str = "127.0.0.1", port: int = 9100):
+        """
+        HTTP endpoint (GET /metrics) for Prometheus, served from a daemon thread.
+
+        Args:
+            metrics (PipelineMetrics): Metrics to expose.
+            host (str): Listen address.
+            port (int): Listen port, 0 picks a free one (see `port`).
+        """
+        self.metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] != "/metrics":
+                    handler.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass  # sin registro por petición
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        log.info(f"Métricas disponibles en http://{self._server.server_address[0]}:{self.port}/metrics")
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# los módulos se importan como en la aplicación (cwd = src)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: long running test (deselect with -m 'not slow')")
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from core.congestion import CongestionEstimator
+from core.homography_manager import HomographyManager
+
+WIDTH, HEIGHT = 1280, 720
+FPS = 10.0
+# el fotograma completo: 3.5 m por carril de ancho y 60 m de largo (12 píxeles por metro en vertical)
+HOMOGRAPHY = {"image_points": [(0, 0), (WIDTH, 0), (WIDTH, HEIGHT), (0, HEIGHT)], "real_width_m": 7.0, "real_length_m": 60.0}
+LANES = [[(0, 0), (640, 0), (640, HEIGHT), (0, HEIGHT)], [(640, 0), (WIDTH, 0), (WIDTH, HEIGHT), (640, HEIGHT)]]
+
+
+def make_estimator(**params) -> CongestionEstimator:
+    return CongestionEstimator(LANES, HomographyManager(HOMOGRAPHY), **params)
+
+
+def run(estimator: CongestionEstimator, track_ids: np.ndarray, positions, seconds: float, start: float = 0.0,
+        seed: int = 0) -> float:
+    """Feed `seconds` of frames; `positions(t)` gives the (N, 2) anchors at time t. Returns the end time."""
+    rng = np.random.default_rng(seed)
+    frames = int(seconds * FPS)
+    for frame in range(frames):
+        t = start + frame / FPS
+        anchors = positions(t) + rng.normal(0, 1.0, (len(track_ids), 2))  # ruido de detección de ~1 px
+        estimator.update(track_ids, anchors.astype(np.float32), 1 / FPS, t, (HEIGHT, WIDTH, 3))
+    return start + frames / FPS
+
+
+def test_stationary_vehicles_form_a_queue():
+    estimator = make_estimator()
+    # tres vehículos detenidos en el carril 0 a 20, 100 y 180 px de la línea de detención (1.7, 8.3 y 15 m)
+    track_ids = np.array([1, 2, 3])
+    stationary = np.array([[320, 700], [320, 620], [320, 540]], dtype=np.float64)
+    end = run(estimator, track_ids, lambda t: stationary, seconds=5.0)
+
+    lane = estimator.get_statistics()[0]
+    assert lane["stopped"] == 3
+    assert lane["vehicles"] == 3
+    assert lane["queue_length_m"] == pytest.approx(15.0, abs=0.5)
+    assert lane["max_queue_length_m"] >= lane["queue_length_m"]
+    assert estimator.get_statistics()[1]["queue_length_m"] == 0.0
+
+    # se van: sin verlos durante track_timeout (se revisa cada track_timeout) su demora pasa al carril
+    run(estimator, np.empty(0, dtype=np.int64), lambda t: np.empty((0, 2)), seconds=5.0, start=end)
+    lane = estimator.get_statistics()[0]
+    assert lane["completed_vehicles"] == 3
+    assert lane["stopped_vehicles"] == 3
+    # 5 s detenidos, el primer segundo sin velocidad medida
+    assert lane["avg_delay_s"] == pytest.approx(4.0, abs=0.3)
+
+
+def test_gap_breaks_the_queue():
+    estimator = make_estimator(max_gap_m=10.0)
+    # el tercero está 30 m detrás del segundo: no forma parte de la cola
+    track_ids = np.array([1, 2, 3])
+    stationary = np.array([[320, 700], [320, 620], [320, 260]], dtype=np.float64)
+    run(estimator, track_ids, lambda t: stationary, seconds=3.0)
+
+    lane = estimator.get_statistics()[0]
+    assert lane["stopped"] == 3
+    assert lane["queue_length_m"] == pytest.approx(100 / 12, abs=0.5)
+
+
+def test_free_flow_has_no_queue_or_delay():
+    estimator = make_estimator(free_flow_kmh=50.0)
+    # 60 km/h hacia la cámara: 16.7 m/s = 200 px/s
+    track_ids = np.array([1, 2])
+
+    def moving(t):
+        return np.array([[320, 40 + 200 * t], [960, 100 + 200 * t]])
+
+    run(estimator, track_ids, moving, seconds=3.0)
+    stats = estimator.get_statistics()
+    assert all(lane["stopped"] == 0 and lane["queue_length_m"] == 0.0 for lane in stats.values())
+    assert estimator.slot_speed[[estimator._slots[1], estimator._slots[2]]] == pytest.approx(60.0, abs=3.0)
+    assert estimator.slot_delay.max() == 0.0
+
+
+def test_state_restores_with_another_lane_count():
+    estimator = make_estimator()
+    track_ids = np.array([1, 2])
+    stationary = np.array([[320, 700], [960, 700]], dtype=np.float64)
+    end = run(estimator, track_ids, lambda t: stationary, seconds=3.0)
+    run(estimator, np.empty(0, dtype=np.int64), lambda t: np.empty((0, 2)), seconds=5.0, start=end)
+    state = estimator.get_state()
+
+    single_lane = CongestionEstimator(LANES[:1], HomographyManager(HOMOGRAPHY))
+    single_lane.set_state(state)
+    assert single_lane.num_lanes == 1
+    assert single_lane.get_statistics()[0]["completed_vehicles"] == 1
+    assert single_lane.get_statistics()[0]["avg_delay_s"] == pytest.approx(estimator.get_statistics()[0]["avg_delay_s"])
+
+    three_lanes = CongestionEstimator(LANES + [[(0, 0), (10, 0), (10, 10), (0, 10)]], HomographyManager(HOMOGRAPHY))
+    three_lanes.set_state(state)
+    assert [lane["completed_vehicles"] for lane in three_lanes.get_statistics().values()] == [1, 1, 0]
@@ -0,0 +1,106 @@
+import os
+import time
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from data.data_explorer import TrafficDataExplorer, _count_keys
+from data.event_store import EventStore
+from models.vehicle import CountEvent, SPEED_STATUSES
+
+VEHICLE_TYPES = ("car", "bus", "truck", "motorcycle")
+BENCH_EVENTS = int(os.environ.get("EXPLORER_BENCH_EVENTS", 10_000_000))  # por sesión, 3 sesiones
+
+
+def make_events(rng: np.random.Generator, count: int, start: float, types: tuple = VEHICLE_TYPES) -> list[CountEvent]:
+    speeds = rng.uniform(5, 130, count)
+    speeds[rng.random(count) < 0.05] = np.nan
+    return [CountEvent(i, start + float(rng.uniform(0, 86400)), int(rng.integers(1, 5)), 2, types[int(rng.integers(0, len(types)))],
+                       float(speeds[i]), 0.9, SPEED_STATUSES[int(rng.integers(0, 3))]) for i in range(count)]
+
+
+def columnar_store(rng: np.random.Generator, count: int, start: float) -> EventStore:
+    """Store filled column by column (building tens of millions of CountEvent objects would take minutes)."""
+    store = EventStore(initial_capacity=0)
+    store.columns = {
+        "track_id": np.arange(count, dtype=np.int64),
+        "timestamp": np.sort(start + rng.uniform(0, 86400, count)),
+        "lane": rng.integers(1, 5, count).astype(np.int16),
+        "type": rng.integers(0, len(VEHICLE_TYPES), count).astype(np.uint8),
+        "speed": rng.uniform(5, 130, count).astype(np.float32),
+        "confidence": np.full(count, 0.9, dtype=np.float32),
+        "status": rng.integers(0, 3, count).astype(np.uint8),
+    }
+    store.size = count
+    for vehicle_type in VEHICLE_TYPES:
+        store.type_code(vehicle_type)
+    return store
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    rng = np.random.default_rng(0)
+    explorer = TrafficDataExplorer(str(tmp_path))
+    events = []
+    for camera, types in (("norte", VEHICLE_TYPES), ("sur", VEHICLE_TYPES[::-1])):  # códigos de tipo distintos por sesión
+        session_events = make_events(rng, 3000, 1_700_000_000.0, types)
+        store = EventStore()
+        store.append(session_events)
+        explorer.add_session(store, camera, "s1")
+        events += session_events
+    return explorer, events
+
+
+def check_against_reference(explorer: TrafficDataExplorer, events: list[CountEvent]):
+    result = explorer.counts_per_lane(bucket_seconds=900)
+    expected = Counter((int(e.timestamp // 900) * 900, e.lane) for e in events)
+    assert {(int(b), int(l)): int(c) for b, l, c in zip(result["bucket_start"], result["lane"], result["count"])} == expected
+
+    result = explorer.speeding_rate(bucket_seconds=3600)
+    totals = Counter(int(e.timestamp // 3600) * 3600 for e in events)
+    speeding = Counter(int(e.timestamp // 3600) * 3600 for e in events if e.status == "Exceso de Velocidad")
+    assert result["bucket_start"].tolist() == sorted(totals)
+    assert result["total"].tolist() == [totals[b] for b in sorted(totals)]
+    assert result["speeding"].tolist() == [speeding[b] for b in sorted(totals)]
+
+    result = explorer.speed_percentiles_per_class(percentiles=(50, 85))
+    for vehicle_type in VEHICLE_TYPES:
+        speeds = np.array([e.speed for e in events if e.vehicle_type == vehicle_type and e.speed == e.speed])
+        assert result[vehicle_type]["count"] == len(speeds)
+        for p in (50, 85):
+            assert result[vehicle_type][f"p{p}"] == pytest.approx(np.percentile(speeds, p), abs=0.2)
+
+
+def test_queries_match_reference(sessions):
+    explorer, events = sessions
+    check_against_reference(explorer, events)
+
+
+def test_outlier_timestamp_falls_back_to_sorting(sessions):
+    explorer, events = sessions
+    # un reloj erróneo estira la sesión siglos: el índice denso necesitaría miles de millones de entradas
+    outlier = CountEvent(0, 5e12, 1, 2, "car", 50.0, 0.9, "Normal")
+    store = EventStore()
+    store.append(events[:10] + [outlier])
+    explorer.add_session(store, "roto", "s1")
+    check_against_reference(explorer, events + events[:10] + [outlier])
+
+    # el recuento denso de este rango reservaría terabytes
+    keys, counts = _count_keys(np.array([0, 7, 7, 10**12 - 1]), 10**12)
+    assert keys.tolist() == [0, 7, 10**12 - 1] and counts.tolist() == [1, 2, 1]
+
+
+@pytest.mark.slow
+def test_queries_under_a_second_on_tens_of_millions(tmp_path):
+    rng = np.random.default_rng(1)
+    explorer = TrafficDataExplorer(str(tmp_path))
+    for i in range(3):
+        explorer.add_session(columnar_store(rng, BENCH_EVENTS, 1_700_000_000.0 + i * 86400), f"cam{i}", "s1")
+
+    for query in (explorer.counts_per_lane, explorer.speeding_rate, explorer.speed_percentiles_per_class):
+        query()  # páginas del mmap en caché
+        start = time.perf_counter()
+        query()
+        elapsed = time.perf_counter() - start
+        assert elapsed < 1.0, f"{query.__name__}: {elapsed:.2f} s con {3 * BENCH_EVENTS} eventos"
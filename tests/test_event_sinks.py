@@ -0,0 +1,200 @@
+import json
+import time
+import asyncio
+import threading
+
+import pytest
+
+from models.vehicle import CountEvent
+from utils.event_sinks import EventDispatcher, HttpSink, RotatingFileSink, TcpSink, create_sink
+
+
+def make_events(count: int, start: int = 0) -> list[CountEvent]:
+    return [CountEvent(start + i, 1_700_000_000.0 + i, 1, 2, "car", 50.0, 0.9, "Normal") for i in range(count)]
+
+
+class StandInServer:
+    """asyncio.start_server on its own loop and thread, as a local destination for the sinks."""
+
+    def __init__(self, handler):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(asyncio.start_server(handler, "127.0.0.1", 0), self.loop).result(5)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def close(self):
+        async def shutdown():
+            self.server.close()
+            await self.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+
+
+class HttpCollector:
+    """Minimal HTTP collector: records each POSTed batch and answers with the next queued status."""
+
+    def __init__(self, statuses: list[int] = None):
+        self.statuses = list(statuses or [])
+        self.batches = []
+        self.attempt_times = []
+        self.server = StandInServer(self._handle)
+        self.url = f"http://127.0.0.1:{self.server.port}/events"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        head = await reader.readuntil(b"\r\n\r\n")
+        request_line, *header_lines = head.decode("latin-1").split("\r\n")
+        headers = dict(line.split(": ", 1) for line in header_lines if line)
+        body = await reader.readexactly(int(headers["Content-Length"]))
+        self.attempt_times.append(time.monotonic())
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status == 200:
+            assert request_line == "POST /events HTTP/1.1"
+            self.batches.append(json.loads(body))
+        writer.write(f"HTTP/1.1 {status} X\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        writer.close()
+
+
+@pytest.fixture
+def collector():
+    collectors = []
+
+    def create(statuses=None) -> HttpCollector:
+        collectors.append(HttpCollector(statuses))
+        return collectors[-1]
+
+    yield create
+    for item in collectors:
+        item.server.close()
+
+
+def test_http_sink_sends_full_batches_and_drains_on_close(collector):
+    http = collector()
+    sink = HttpSink(http.url, batch_size=100, flush_interval=30.0)
+    dispatcher = EventDispatcher([sink])
+    dispatcher.start()
+    dispatcher.publish(make_events(150))
+    dispatcher.publish(make_events(100, start=150))
+
+    deadline = time.monotonic() + 5
+    while len(http.batches) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # lotes completos sin esperar a flush_interval; el resto queda en cola hasta el cierre
+    assert [len(batch) for batch in http.batches] == [100, 100]
+    assert sink.stats()["queued"] == 50
+
+    dispatcher.close()
+    assert [len(batch) for batch in http.batches] == [100, 100, 50]
+    assert [record["track_id"] for batch in http.batches for record in batch] == list(range(250))
+    assert sink.sent == 250 and sink.dropped == 0
+
+
+def test_http_sink_flushes_partial_batch_after_interval(collector):
+    http = collector()
+    sink = HttpSink(http.url, batch_size=100, flush_interval=0.1)
+    dispatcher = EventDispatcher([sink])
+    dispatcher.start()
+    dispatcher.publish(make_events(3))
+    deadline = time.monotonic() + 5
+    while not http.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [len(batch) for batch in http.batches] == [3]
+    dispatcher.close()
+
+
+def test_failed_batches_are_retried_with_backoff(collector):
+    http = collector(statuses=[500, 503, 200])
+    sink = HttpSink(http.url, batch_size=10, flush_interval=0.0, retry_delay=0.1, max_retry_delay=1.0)
+    dispatcher = EventDispatcher([sink])
+    dispatcher.start()
+    dispatcher.publish(make_events(10))
+    deadline = time.monotonic() + 5
+    while not http.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    dispatcher.close()
+
+    assert sink.failed_attempts == 2
+    assert sink.sent == 10 and sink.dropped == 0
+    first_wait, second_wait = (b - a for a, b in zip(http.attempt_times, http.attempt_times[1:]))
+    assert first_wait >= 0.1 and second_wait >= 0.2  # retry_delay, duplicado en cada intento
+
+
+def test_batch_is_dropped_after_max_retries(collector):
+    http = collector(statuses=[500] * 10)
+    sink = HttpSink(http.url, batch_size=5, flush_interval=0.0, max_retries=2, retry_delay=0.01)
+    dispatcher = EventDispatcher([sink])
+    dispatcher.start()
+    dispatcher.publish(make_events(5))
+    deadline = time.monotonic() + 5
+    while sink.dropped == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    dispatcher.close()
+    assert sink.failed_attempts == 3
+    assert sink.sent == 0 and sink.dropped == 5
+
+
+def test_tcp_sink_delivers_json_lines_and_reconnects():
+    received = []
+    connections = []
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connections.append(writer)
+        while line := await reader.readline():
+            received.append(json.loads(line))
+            if len(received) == 5:
+                break  # el broker corta la conexión: el sink debe reconectar
+        writer.close()
+
+    server = StandInServer(handle)
+    try:
+        sink = TcpSink("127.0.0.1", server.port, batch_size=5, flush_interval=0.0, retry_delay=0.01)
+        dispatcher = EventDispatcher([sink])
+        dispatcher.start()
+        dispatcher.publish(make_events(5))
+        deadline = time.monotonic() + 5
+        while len(received) < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        dispatcher.publish(make_events(5, start=5))
+        deadline = time.monotonic() + 5
+        while len(received) < 10 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        dispatcher.close()
+    finally:
+        server.close()
+
+    assert [record["track_id"] for record in received] == list(range(10))
+    assert received[0]["type"] == "car" and received[0]["speed"] == 50.0
+    assert len(connections) == 2
+
+
+@pytest.mark.parametrize("drop_oldest, expected", [(True, [2, 3, 4]), (False, [0, 1, 2])])
+def test_queue_overflow(drop_oldest, expected):
+    sink = create_sink("tcp://127.0.0.1:9", max_queue=3, drop_oldest=drop_oldest)
+    sink.offer([{"track_id": i} for i in range(5)], time.time())
+    assert [record["track_id"] for _, record in sink.pending] == expected
+    assert sink.dropped == 2
+
+
+def test_file_sink_rotates(tmp_path):
+    path = tmp_path / "events.jsonl"
+    sink = RotatingFileSink(str(path), max_bytes=200, backup_count=2)
+    records = [{"track_id": i, "type": "car"} for i in range(3)]
+    line_bytes = len(sink.encode_lines(records[:1]))
+    for _ in range(8):
+        asyncio.run(sink.send(records))
+
+    files = sorted(p.name for p in tmp_path.iterdir())
+    assert files == ["events.jsonl", "events.jsonl.1", "events.jsonl.2"]
+    for name in files:
+        size = (tmp_path / name).stat().st_size
+        assert 0 < size <= 200 and size % (3 * line_bytes) == 0
+    # lo más reciente queda en el fichero activo
+    assert json.loads(path.read_text().splitlines()[-1])["track_id"] == 2
+
+    sink.backup_count = 0
+    sink._rotate()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["events.jsonl.1", "events.jsonl.2"]
@@ -0,0 +1,93 @@
+import re
+import urllib.error
+import urllib.request
+
+import pytest
+
+from models.vehicle import CountEvent
+from utils.metrics_server import LATENCY_BUCKETS, MetricsServer, PipelineMetrics
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse(text: str) -> dict:
+    """Prometheus text -> {(name, ((label, value), ...)): value}, checking every line is valid."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = SAMPLE.match(line)
+        assert match, f"línea no válida: {line!r}"
+        name, labels, value = match.groups()
+        samples[(name, tuple(sorted(LABEL.findall(labels or ""))))] = float(value)
+    return samples
+
+
+def event(lane: int, vehicle_type: str, speed: float) -> CountEvent:
+    return CountEvent(1, 0.0, lane, 2, vehicle_type, speed, 0.9, "Normal")
+
+
+@pytest.fixture
+def server():
+    metrics = PipelineMetrics()
+    server = MetricsServer(metrics, port=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def scrape(server: MetricsServer, path: str = "/metrics") -> tuple[str, str]:
+    with urllib.request.urlopen(f"http://127.0.0.1:{server.port}{path}", timeout=5) as response:
+        return response.headers["Content-Type"], response.read().decode("utf-8")
+
+
+def test_metrics_endpoint(server):
+    metrics = server.metrics
+    for latency in (0.0005, 0.003, 0.003, 0.2, 5.0):
+        metrics.observe_stage("detect", latency)
+    metrics.observe_stage("count", 0.0001)
+    for _ in range(3):
+        metrics.frame_done(active_tracks=4)
+    metrics.record_events([event(1, "car", 50.0), event(1, "car", 70.0), event(2, 'bus "big"', float("nan"))])
+    queue = [1, 2, 3]
+    metrics.register_gauge("traffic_queue_depth", "Items waiting in a queue.", lambda: len(queue), {"queue": "event_writer"})
+    metrics.register_gauge("traffic_broken", "Raises when read.", lambda: 1 / 0)
+
+    content_type, text = scrape(server)
+    assert content_type.startswith("text/plain; version=0.0.4")
+    samples = parse(text)
+
+    # contadores
+    assert samples[("traffic_frames_total", ())] == 3
+    assert samples[("traffic_active_tracks", ())] == 4
+    assert samples[("traffic_vehicles_total", (("lane", "1"), ("type", "car")))] == 2
+    assert samples[("traffic_vehicles_total", (("lane", "2"), ("type", 'bus \\"big\\"')))] == 1
+    assert samples[("traffic_vehicle_speed_kmh_sum", (("lane", "1"),))] == pytest.approx(120.0)
+    assert samples[("traffic_vehicle_speed_kmh_count", (("lane", "1"),))] == 2
+    assert ("traffic_vehicle_speed_kmh_count", (("lane", "2"),)) not in samples  # sin velocidad conocida
+
+    # histograma: buckets acumulados, monótonos, +Inf == _count, _sum de las observaciones
+    buckets = [samples[("traffic_stage_latency_seconds_bucket", (("le", str(bound)), ("stage", "detect")))]
+               for bound in LATENCY_BUCKETS]
+    inf = samples[("traffic_stage_latency_seconds_bucket", (("le", "+Inf"), ("stage", "detect")))]
+    assert buckets == sorted(buckets)
+    assert buckets[LATENCY_BUCKETS.index(0.001)] == 1
+    assert buckets[LATENCY_BUCKETS.index(0.005)] == 3
+    assert buckets[-1] == 4
+    assert inf == samples[("traffic_stage_latency_seconds_count", (("stage", "detect"),))] == 5
+    assert samples[("traffic_stage_latency_seconds_sum", (("stage", "detect"),))] == pytest.approx(5.2065)
+    assert samples[("traffic_stage_latency_seconds_count", (("stage", "count"),))] == 1
+
+    # gauges leídos al consultar; uno que falla se omite sin romper la respuesta
+    assert samples[("traffic_queue_depth", (("queue", "event_writer"),))] == 3
+    queue.append(4)
+    assert parse(scrape(server)[1])[("traffic_queue_depth", (("queue", "event_writer"),))] == 4
+    assert not any(name == "traffic_broken" for name, _ in samples)
+    assert text.count("# TYPE traffic_queue_depth gauge") == 1
+
+
+def test_unknown_path_is_404(server):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        scrape(server, "/other")
+    assert error.value.code == 404
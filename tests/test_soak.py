@@ -0,0 +1,181 @@
+"""
+Soak test: drive AnalysisPipeline with synthetic traffic for hours of simulated time and fail
+if memory keeps growing.
+
+Vehicles are generated on a few straight lanes with a traffic light (so there are queues and
+stopped vehicles), tracked by the built-in ByteTracker and passed to
+AnalysisPipeline.process_detections: no video and no model, so an hour of traffic runs in
+seconds. Every few simulated minutes the process RSS and the sizes of the pipeline structures
+(AnalysisPipeline.memory_stats) are sampled; after the warm-up the growth per hour is fitted
+and compared with the limits.
+
+    SOAK_HOURS=4 python -m pytest tests/test_soak.py -s
+"""
+import gc
+import os
+
+import numpy as np
+import pytest
+
+from core.analysis_pipeline import AnalysisPipeline
+from models.detection import FrameDetections, VehicleDetectionInterface
+from utils.memory_monitor import MemoryMonitor
+
+CLASS_NAMES = {2: "car", 3: "motorcycle", 5: "bus", 7: "truck"}
+
+SOAK_HOURS = float(os.environ.get("SOAK_HOURS", 1.0))
+FPS = 10.0
+SAMPLE_MINUTES = 2.0
+WARMUP = 0.25  # fracción inicial excluida del ajuste
+MAX_RSS_MB_PER_HOUR = 5.0
+MAX_ENTRIES_PER_HOUR = 50.0
+
+
+class NoDetector(VehicleDetectionInterface):
+    """Stand-in detector: the soak test feeds detections directly, the model is never used."""
+    def inference(self, image, classes_to_detect=None):
+        return iter(()), CLASS_NAMES
+
+    def detect(self, image, classes_to_detect=None):
+        return iter(()), CLASS_NAMES
+
+    def detect_batch(self, images, classes_to_detect=None, imgsz=640):
+        return [], CLASS_NAMES
+
+
+class SyntheticTraffic:
+    def __init__(self, num_lanes: int = 3, frame_size: tuple = (1280, 720), vehicles_per_minute: float = 20.0,
+                 cycle_seconds: float = 90.0, red_seconds: float = 40.0, seed: int = 0):
+        """
+        Vehicles driving down vertical lanes towards a stop line with a traffic light.
+
+        Args:
+            num_lanes (int): Lanes side by side over the frame width.
+            frame_size (tuple): (width, height) in pixels.
+            vehicles_per_minute (float): Arrival rate per lane.
+            cycle_seconds (float): Traffic light cycle.
+            red_seconds (float): Red time at the start of every cycle.
+            seed (int): Random seed.
+        """
+        self.width, self.height = frame_size
+        self.num_lanes = num_lanes
+        self.rate = vehicles_per_minute / 60.0
+        self.cycle_seconds = cycle_seconds
+        self.red_seconds = red_seconds
+        self.rng = np.random.default_rng(seed)
+        self.arrivals = 0
+
+        self.lane_width = self.width / num_lanes
+        self.stop_line = self.height * 0.8
+        self.gap = 70.0  # píxeles entre vehículos detenidos
+        self.lane = np.empty(0, dtype=np.int64)
+        self.y = np.empty(0, dtype=np.float64)
+        self.speed = np.empty(0, dtype=np.float64)  # píxeles / s
+        self.class_id = np.empty(0, dtype=np.int64)
+
+    @property
+    def lane_polygons(self) -> list:
+        w, h = self.lane_width, self.height
+        return [[(int(i * w), 0), (int((i + 1) * w), 0), (int((i + 1) * w), h), (int(i * w), h)] for i in range(self.num_lanes)]
+
+    @property
+    def homography_config(self) -> dict:
+        # el fotograma completo representa 3.5 m por carril de ancho y 60 m de largo
+        w, h = self.width, self.height
+        return {"image_points": [(0, 0), (w, 0), (w, h), (0, h)], "real_width_m": 3.5 * self.num_lanes, "real_length_m": 60.0}
+
+    def step(self, t: float, delta_t: float) -> FrameDetections:
+        """Advance the scene by `delta_t` and return the (untracked) detections of the frame."""
+        arrivals = self.rng.random(self.num_lanes) < self.rate * delta_t
+        if arrivals.any():
+            new_lanes = np.flatnonzero(arrivals)
+            self.arrivals += len(new_lanes)
+            self.lane = np.concatenate([self.lane, new_lanes])
+            self.y = np.concatenate([self.y, np.full(len(new_lanes), -40.0)])
+            self.speed = np.concatenate([self.speed, self.rng.uniform(80, 160, len(new_lanes))])
+            self.class_id = np.concatenate([self.class_id, self.rng.choice(list(CLASS_NAMES), len(new_lanes))])
+
+        # posición límite: el vehículo de delante y, en rojo, la línea de detención
+        target = self.y + self.speed * delta_t
+        red = (t % self.cycle_seconds) < self.red_seconds
+        for lane in range(self.num_lanes):
+            idx = np.flatnonzero(self.lane == lane)
+            idx = idx[np.argsort(-self.y[idx])]
+            limit = np.inf
+            for i in idx:
+                if red and self.y[i] <= self.stop_line:
+                    limit = min(limit, self.stop_line)
+                target[i] = min(target[i], limit)
+                limit = target[i] - self.gap
+        self.y = np.maximum(self.y, target)  # nunca retroceden
+
+        gone = self.y > self.height + 60
+        if gone.any():
+            keep = ~gone
+            self.lane, self.y, self.speed, self.class_id = self.lane[keep], self.y[keep], self.speed[keep], self.class_id[keep]
+
+        cx = (self.lane + 0.5) * self.lane_width + self.rng.normal(0, 1.0, len(self.y))
+        bottom = self.y + self.rng.normal(0, 1.0, len(self.y))
+        boxes = np.stack([cx - 30, bottom - 45, cx + 30, bottom], axis=1)
+        visible = (bottom > 0) & (bottom - 45 < self.height)
+        confidences = self.rng.uniform(0.5, 0.95, int(visible.sum()))
+        return FrameDetections(boxes[visible], None, self.class_id[visible], confidences, CLASS_NAMES)
+
+
+def run_soak(hours: float, traffic: SyntheticTraffic, pipeline: AnalysisPipeline) -> tuple[MemoryMonitor, int]:
+    """Feed `hours` of synthetic traffic. Returns the samples and the number of counted events."""
+    monitor = MemoryMonitor(max_samples=100000)
+    delta_t = 1.0 / FPS
+    total_frames = int(hours * 3600 * FPS)
+    sample_every = max(1, int(SAMPLE_MINUTES * 60 * FPS))
+    frame_shape = (traffic.height, traffic.width, 3)
+    start_time = 1_700_000_000.0
+    counted = 0
+
+    for frame_idx in range(total_frames + 1):
+        t = frame_idx * delta_t
+        detections = pipeline.tracker.update(traffic.step(t, delta_t))
+        counted += len(pipeline.process_detections(detections, delta_t, start_time + t, frame_shape))
+        if frame_idx % sample_every == 0:
+            gc.collect()
+            monitor.sample(t, pipeline.memory_stats())
+    return monitor, counted
+
+
+def growth_failures(monitor: MemoryMonitor, since: float, bounds: dict) -> list[str]:
+    """
+    Structures (and RSS) whose fitted growth after `since` exceeds the limits. Structures
+    with a fixed capacity (`bounds`: name -> maximum entries) only fail above it.
+    """
+    failures = []
+    rss_growth = monitor.growth("rss_mb", since)
+    if rss_growth > MAX_RSS_MB_PER_HOUR:
+        failures.append(f"rss_mb {rss_growth:+.2f} MB/h")
+    for key in monitor.samples[-1]:
+        if key in ("time", "rss_mb"):
+            continue
+        if key in bounds:
+            peak = max(sample.get(key, 0) for sample in monitor.samples)
+            if peak > bounds[key]:
+                failures.append(f"{key} {peak} > {bounds[key]}")
+        else:
+            growth = monitor.growth(key, since)
+            if growth > MAX_ENTRIES_PER_HOUR:
+                failures.append(f"{key} {growth:+.1f} /h")
+    return failures
+
+
+@pytest.mark.slow
+def test_memory_stays_bounded():
+    traffic = SyntheticTraffic(vehicles_per_minute=20.0)
+    pipeline = AnalysisPipeline(traffic.lane_polygons, traffic.homography_config, tracker="bytetrack",
+                                detector=NoDetector(), occupancy_params={}, congestion_params={})
+    try:
+        monitor, counted = run_soak(SOAK_HOURS, traffic, pipeline)
+    finally:
+        pipeline.close()
+
+    # el tráfico sintético se cuenta (si no, no se ejercitaría nada)
+    assert counted > 0.8 * traffic.arrivals
+    bounds = {"full_event_log": pipeline.counter.full_event_log.maxlen}
+    assert growth_failures(monitor, WARMUP * SOAK_HOURS * 3600, bounds) == []